@@ -1,16 +1,35 @@
 # SPDX-FileCopyrightText: The LineageOS Project
 # SPDX-License-Identifier: Apache-2.0
 
+import io
+import multiprocessing
+import os
 import re
 import shutil
-import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional, Set, Tuple
-
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from apk.apk_zip import APKFile
+from apk.arsc_cache import (
+    get_reference_table_path,
+    load_reference_table,
+    save_reference_table,
+)
+from apk.arsc_index import (
+    build_resource_index,
+    get_resource_index_path,
+    load_resource_index,
+    save_resource_index,
+)
 from apk.arsc_parse import arsc_parse, get_resources_referenced_names
 from apk.arsc_resources import ARSCResourcesMap
-from apk.arsc_write import write_resources, write_resources_public_xml
-from apk.axml_parse import AXMLParseError, axml_parse
+from apk.arsc_write import (
+    remove_stale_values,
+    write_resources,
+    write_resources_public_xml,
+)
+from apk.axml_parse import AXMLParseError, AXMLValueCache, axml_parse
 from apk.axml_writer import AXMLWriter
 
 ANDROID_MANIFEST_NAME = 'AndroidManifest.xml'
@@ -38,9 +57,9 @@ def normalize_mnc_qualifier(name: str) -> str:
 
 
 def extract_apk_raw(
-    z: zipfile.ZipFile,
+    apk: APKFile,
     out_path: Path,
-    strings: List[str],
+    strings: Sequence[str],
     resources: ARSCResourcesMap,
     reference_resources: Optional[ARSCResourcesMap] = None,
     package_id_map: Optional[Dict[int, str]] = None,
@@ -50,7 +69,9 @@ def extract_apk_raw(
         strings,
     )
 
-    zip_file_paths = z.namelist()
+    value_cache: AXMLValueCache = {}
+
+    zip_file_paths = apk.namelist()
     for zip_file_path in zip_file_paths:
         file_path = Path(out_path, zip_file_path)
 
@@ -68,12 +89,12 @@ def extract_apk_raw(
 
         file_path.parent.mkdir(parents=True, exist_ok=True)
 
-        data = z.read(zip_file_path)
-
         if not file_path.name.endswith('.xml'):
-            file_path.write_bytes(data)
+            apk.extract_to(zip_file_path, file_path)
             continue
 
+        data = apk.read(zip_file_path)
+
         # TODO: remove apktool compatibility
         is_manifest = file_path.name == ANDROID_MANIFEST_NAME
         skip_elements = None
@@ -98,42 +119,52 @@ def extract_apk_raw(
             xmlns_first = True
             sort_attrs = True
 
+        # Documents are decoded in memory and written at once, files that
+        # are not binary XML are copied as-is
+        o = io.StringIO()
         try:
-            with open(file_path, 'w') as o:
-                writer = AXMLWriter(
-                    o,
-                    pretty=True,
-                    skip_space_before_close=skip_space_before_close,
-                    skip_elements=skip_elements,
-                    skip_attrs_by_elem=skip_attrs_by_elem,
-                    sort_attrs=sort_attrs,
-                    xmlns_first=xmlns_first,
-                )
-                axml_parse(
-                    data,
-                    resources,
-                    reference_resources,
-                    package_id_map,
-                    writer,
-                )
+            writer = AXMLWriter(
+                o,
+                pretty=True,
+                skip_space_before_close=skip_space_before_close,
+                skip_elements=skip_elements,
+                skip_attrs_by_elem=skip_attrs_by_elem,
+                sort_attrs=sort_attrs,
+                xmlns_first=xmlns_first,
+            )
+            axml_parse(
+                data,
+                resources,
+                reference_resources,
+                package_id_map,
+                writer,
+                value_cache,
+            )
         except AXMLParseError:
             file_path.write_bytes(data)
+            continue
+
+        file_path.write_text(o.getvalue())
 
 
 def extract_apk(
     apk_path: Path,
     out_path: Optional[Path] = None,
     reference_resources: Optional[ARSCResourcesMap] = None,
+    resource_ids: Optional[Iterable[int]] = None,
 ):
-    with zipfile.ZipFile(apk_path, 'r') as z:
-        assert 'resources.arsc' in z.namelist()
+    with APKFile(apk_path) as apk:
+        assert 'resources.arsc' in apk.namelist()
 
-        arsc = z.read('resources.arsc')
-        strings, styles, resources, flags, package_id_map = arsc_parse(arsc)
+        arsc = apk.read('resources.arsc')
+        strings, styles, resources, flags, package_id_map = arsc_parse(
+            arsc,
+            resource_ids,
+        )
 
         if out_path is not None:
             extract_apk_raw(
-                z,
+                apk,
                 out_path,
                 strings,
                 resources,
@@ -144,39 +175,170 @@ def extract_apk(
         return strings, styles, resources, flags, package_id_map
 
 
+def extract_apk_resources(
+    apk_path: Path,
+    output_path: Path,
+    framework_resources: ARSCResourcesMap,
+    framework_flags: Dict[int, int],
+    jobs: int = 1,
+):
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    # Values are written in place and only the changed files are replaced,
+    # the other resources are extracted from scratch
+    res_output_path = Path(output_path, 'res')
+    res_output_path.mkdir(parents=True, exist_ok=True)
+    for res_path in res_output_path.iterdir():
+        if res_path.name.startswith('values') and res_path.is_dir():
+            continue
+
+        if res_path.is_dir():
+            shutil.rmtree(res_path)
+        else:
+            res_path.unlink()
+
+    strings, styles, resources, flags, package_id_map = extract_apk(
+        apk_path,
+        output_path,
+        framework_resources,
+    )
+    assert strings is not None
+
+    written_paths = write_resources(
+        strings,
+        styles,
+        package_id_map,
+        resources,
+        framework_resources,
+        framework_flags,
+        res_output_path,
+        jobs=jobs,
+    )
+    written_paths += write_resources_public_xml(
+        resources,
+        framework_resources,
+        flags,
+        res_output_path,
+    )
+    remove_stale_values(res_output_path, written_paths)
+
+
+# Set by extract_apks() before forking the workers, which inherit the parsed
+# framework instead of receiving a pickled copy for each APK
+_worker_framework: Optional[Tuple[ARSCResourcesMap, Dict[int, int]]] = None
+
+
+def _extract_apk_resources_worker(apk_output_path: Tuple[Path, Path]):
+    assert _worker_framework is not None
+    framework_resources, framework_flags = _worker_framework
+
+    apk_path, output_path = apk_output_path
+    extract_apk_resources(
+        apk_path,
+        output_path,
+        framework_resources,
+        framework_flags,
+    )
+
+
+def load_framework(
+    framework_path: Path,
+    cache_dir: Optional[Path] = None,
+):
+    with APKFile(framework_path) as apk:
+        arsc = apk.read('resources.arsc')
+
+    table_path = None
+    if cache_dir is not None:
+        table_path = get_reference_table_path(cache_dir, arsc)
+        table = load_reference_table(table_path)
+        if table is not None:
+            return table
+
+    _, _, resources, flags, _ = arsc_parse(arsc)
+
+    if table_path is not None:
+        save_reference_table(table_path, resources, flags)
+
+    return resources, flags
+
+
+def load_apk_resource_index(
+    apk_path: Path,
+    cache_dir: Optional[Path] = None,
+):
+    with APKFile(apk_path) as apk:
+        arsc = apk.read('resources.arsc')
+
+    index_path = None
+    if cache_dir is not None:
+        index_path = get_resource_index_path(cache_dir, arsc)
+        index = load_resource_index(index_path)
+        if index is not None:
+            return index
+
+    strings, styles, resources, _, package_id_map = arsc_parse(arsc)
+    assert styles is not None
+
+    index = build_resource_index(strings, styles, resources, package_id_map)
+
+    if index_path is not None:
+        save_resource_index(index_path, index)
+
+    return index
+
+
 def extract_apks(
     apk_output_paths: List[Tuple[Path, Path]],
     framework_path: Path,
+    jobs: Optional[int] = None,
+    cache_dir: Optional[Path] = None,
 ):
-    assert isinstance(framework_path, Path)
-    _, _, framework_resources, framework_flags, _ = extract_apk(framework_path)
+    global _worker_framework
 
-    for apk_path, output_path in apk_output_paths:
-        output_path.mkdir(parents=True, exist_ok=True)
-
-        res_output_path = Path(output_path, 'res')
-        shutil.rmtree(res_output_path, ignore_errors=True)
-        res_output_path.mkdir(parents=True, exist_ok=True)
+    assert isinstance(framework_path, Path)
+    framework_resources, framework_flags = load_framework(
+        framework_path,
+        cache_dir,
+    )
 
-        strings, styles, resources, flags, package_id_map = extract_apk(
-            apk_path,
-            output_path,
-            framework_resources,
-        )
-        assert strings is not None
-
-        write_resources(
-            strings,
-            styles,
-            package_id_map,
-            resources,
-            framework_resources,
-            framework_flags,
-            res_output_path,
-        )
-        write_resources_public_xml(
-            resources,
-            framework_resources,
-            flags,
-            res_output_path,
-        )
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    if (
+        jobs <= 1
+        or len(apk_output_paths) <= 1
+        or 'fork' not in multiprocessing.get_all_start_methods()
+    ):
+        # Write the configs of a single APK in parallel instead
+        for apk_path, output_path in apk_output_paths:
+            extract_apk_resources(
+                apk_path,
+                output_path,
+                framework_resources,
+                framework_flags,
+                jobs=jobs,
+            )
+        return
+
+    _worker_framework = (framework_resources, framework_flags)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=min(jobs, len(apk_output_paths)),
+            mp_context=multiprocessing.get_context('fork'),
+        ) as executor:
+            futures = [
+                executor.submit(_extract_apk_resources_worker, apk_output_path)
+                for apk_output_path in apk_output_paths
+            ]
+
+            # Wait in submission order, the error of the first failing APK
+            # is raised no matter which worker finished first
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                executor.shutdown(cancel_futures=True)
+                raise
+    finally:
+        _worker_framework = None
@@ -0,0 +1,850 @@
+# SPDX-FileCopyrightText: The LineageOS Project
+# SPDX-License-Identifier: Apache-2.0
+
+import random
+import struct
+import zipfile
+from ctypes import sizeof
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from apk.resource_types import (
+    RES_STRING_POOL_TYPE,
+    RES_TABLE_PACKAGE_TYPE,
+    RES_TABLE_TYPE,
+    RES_TABLE_TYPE_SPEC_TYPE,
+    RES_TABLE_TYPE_TYPE,
+    RES_XML_CDATA_TYPE,
+    RES_XML_END_ELEMENT_TYPE,
+    RES_XML_END_NAMESPACE_TYPE,
+    RES_XML_RESOURCE_MAP_TYPE,
+    RES_XML_START_ELEMENT_TYPE,
+    RES_XML_START_NAMESPACE_TYPE,
+    RES_XML_TYPE,
+    Res_value,
+    ResStringPool_header,
+    ResTable_config,
+    ResTable_entry,
+    ResTable_map,
+    ResTable_type,
+    ResTable_typeSpec,
+)
+
+# Synthetic resource tables and binary XML documents, laid out the same way
+# as aapt2 does, to benchmark the parser without shipping vendor APKs
+
+ANDROID_URI = 'http://schemas.android.com/apk/res/android'
+
+VALUE_TYPE_NAMES = [
+    'string',
+    'bool',
+    'integer',
+    'color',
+    'dimen',
+    'drawable',
+    'layout',
+]
+BAG_TYPE_NAMES = [
+    'attr',
+    'style',
+    'array',
+    'plurals',
+]
+
+# Non-locale configs come first so that few configs still cover most of
+# the qualifiers, the rest are translations
+CONFIG_QUALIFIERS: List[Dict[str, int]] = [
+    {},
+    {'orientation': ResTable_config.ORIENTATION_LAND},
+    {'density': ResTable_config.DENSITY_XHIGH},
+    {'uiMode': ResTable_config.UI_MODE_NIGHT_YES},
+    {'sdkVersion': 31},
+    {'smallestScreenWidthDp': 600, 'sdkVersion': 13},
+    {'mcc': 310, 'mnc': 4},
+]
+CONFIG_LOCALES = [
+    ('af', ''), ('ar', ''), ('ca', ''), ('cs', ''), ('da', ''),
+    ('de', ''), ('el', ''), ('en', 'AU'), ('en', 'GB'), ('en', 'IN'),
+    ('es', ''), ('es', 'US'), ('fa', ''), ('fi', ''), ('fr', ''),
+    ('fr', 'CA'), ('hi', ''), ('hr', ''), ('hu', ''), ('in', ''),
+    ('it', ''), ('iw', ''), ('ja', ''), ('ko', ''), ('nb', ''),
+    ('nl', ''), ('pl', ''), ('pt', 'BR'), ('pt', 'PT'), ('ro', ''),
+    ('ru', ''), ('sk', ''), ('sv', ''), ('th', ''), ('tr', ''),
+    ('uk', ''), ('vi', ''), ('zh', 'CN'), ('zh', 'HK'), ('zh', 'TW'),
+]  # fmt: skip
+
+# Attributes of the generated layouts, defined by the first attrs of a
+# generated framework
+LAYOUT_ATTRS = [
+    ('id', 0x01010000),
+    ('textSize', 0x01010001),
+    ('enabled', 0x01010002),
+    ('text', 0x01010003),
+    ('layout_width', 0x01010004),
+]
+
+NO_INDEX = 0xFFFFFFFF
+
+# Bag items are named by index for arrays
+RES_ARRAY_ITEM = 0x02000000
+
+
+@dataclass
+class CorpusOptions:
+    packages: int = 1
+    value_types: int = len(VALUE_TYPE_NAMES)
+    bag_types: int = len(BAG_TYPE_NAMES)
+    configs: int = len(CONFIG_QUALIFIERS)
+    entries: int = 200
+    bag_items: int = 4
+    strings: int = 1000
+    utf8: bool = True
+    seed: int = 0
+
+
+def get_type_names(options: CorpusOptions):
+    bag_type_names = BAG_TYPE_NAMES[: options.bag_types]
+    value_type_names = VALUE_TYPE_NAMES[: options.value_types]
+
+    # Attributes come first, same as in the framework
+    return bag_type_names[:1] + value_type_names + bag_type_names[1:]
+
+
+def get_config_count():
+    return len(CONFIG_QUALIFIERS) + len(CONFIG_LOCALES)
+
+
+def check_corpus_options(options: CorpusOptions):
+    # Packages are numbered down from the one of the app, 0x01 belongs to
+    # the framework
+    if not 1 <= options.packages <= 0x7E:
+        raise ValueError(f'Packages must be between 1 and {0x7E}')
+
+    if not 0 <= options.value_types <= len(VALUE_TYPE_NAMES):
+        raise ValueError(
+            f'Value types must be between 0 and {len(VALUE_TYPE_NAMES)}'
+        )
+
+    if not 0 <= options.bag_types <= len(BAG_TYPE_NAMES):
+        raise ValueError(
+            f'Bag types must be between 0 and {len(BAG_TYPE_NAMES)}'
+        )
+
+    if not options.value_types and not options.bag_types:
+        raise ValueError('At least one value or bag type is required')
+
+    if not 1 <= options.configs <= get_config_count():
+        raise ValueError(f'Configs must be between 1 and {get_config_count()}')
+
+    if not 1 <= options.entries <= 0xFFFF:
+        raise ValueError(f'Entries must be between 1 and {0xFFFF}')
+
+    if options.bag_items < 0:
+        raise ValueError('Bag items must not be negative')
+
+    if options.strings < 0:
+        raise ValueError('Strings must not be negative')
+
+
+def make_config(index: int):
+    config = ResTable_config()
+    config.size = sizeof(ResTable_config)
+
+    if index < len(CONFIG_QUALIFIERS):
+        for name, value in CONFIG_QUALIFIERS[index].items():
+            setattr(config, name, value)
+    else:
+        language, country = CONFIG_LOCALES[index - len(CONFIG_QUALIFIERS)]
+        config.language[:] = language.encode()
+        if country:
+            config.country[:] = country.encode()
+
+    return bytes(config)
+
+
+def pad4(data: bytes):
+    return data + b'\0' * (-len(data) % 4)
+
+
+def make_chunk(chunk_type: int, header: bytes, body: bytes):
+    header_size = 8 + len(header)
+    return (
+        struct.pack('<HHI', chunk_type, header_size, header_size + len(body))
+        + header
+        + body
+    )
+
+
+def encode_length8(length: int):
+    if length < 0x80:
+        return bytes([length])
+
+    assert length < 0x8000
+    return bytes([0x80 | (length >> 8), length & 0xFF])
+
+
+def encode_length16(length: int):
+    if length < 0x8000:
+        return struct.pack('<H', length)
+
+    return struct.pack('<HH', 0x8000 | (length >> 16), length & 0xFFFF)
+
+
+def make_string_pool(
+    strings: Sequence[str],
+    utf8: bool,
+    styles: Sequence[Sequence[Tuple[int, int, int]]] = (),
+):
+    string_offsets: List[int] = []
+    strings_data = bytearray()
+    for s in strings:
+        string_offsets.append(len(strings_data))
+        encoded = s.encode('utf-16le')
+        if utf8:
+            encoded_utf8 = s.encode()
+            strings_data += encode_length8(len(encoded) // 2)
+            strings_data += encode_length8(len(encoded_utf8))
+            strings_data += encoded_utf8 + b'\0'
+        else:
+            strings_data += encode_length16(len(encoded) // 2)
+            strings_data += encoded + b'\0\0'
+
+    style_offsets: List[int] = []
+    styles_data = bytearray()
+    for spans in styles:
+        style_offsets.append(len(styles_data))
+        for span in spans:
+            styles_data += struct.pack('<III', *span)
+        styles_data += struct.pack('<I', NO_INDEX)
+    if styles:
+        styles_data += struct.pack('<II', NO_INDEX, NO_INDEX)
+
+    offsets = struct.pack(
+        f'<{len(string_offsets) + len(style_offsets)}I',
+        *string_offsets,
+        *style_offsets,
+    )
+
+    header_size = sizeof(ResStringPool_header)
+    strings_start = header_size + len(offsets)
+    body = offsets + pad4(bytes(strings_data))
+    styles_start = 0
+    if styles:
+        styles_start = header_size + len(body)
+
+    flags = ResStringPool_header.UTF8_FLAG if utf8 else 0
+    header = struct.pack(
+        '<IIIII',
+        len(strings),
+        len(styles),
+        flags,
+        strings_start,
+        styles_start,
+    )
+    return make_chunk(RES_STRING_POOL_TYPE, header, body + styles_data)
+
+
+class TableGenerator:
+    def __init__(
+        self,
+        options: CorpusOptions,
+        package_id: int,
+        string_base: int = 0,
+        seed: int = 0,
+    ):
+        self.options = options
+        self.package_id = package_id
+        self.rng = random.Random(seed)
+
+        # Packages share the global string pool, the strings of this one
+        # start after the strings of the previous ones
+        self.string_base = string_base
+
+        self.type_names = get_type_names(options)
+        self.type_ids = {t: i + 1 for i, t in enumerate(self.type_names)}
+
+        # Text strings first, styled strings have to be at the start of the
+        # pool, then the paths of the files
+        self.strings: List[str] = []
+        self.styles: List[List[Tuple[int, int, int]]] = []
+        self.text_string_count = max(options.strings, 1)
+        styled_count = self.text_string_count // 10
+        for i in range(self.text_string_count):
+            k = i % 4
+            if k == 0:
+                s = f'Text {i} with "quotes" & <tags>'
+            elif k == 1:
+                s = f'Text {i} with accents éàü and 中文'
+            elif k == 2:
+                s = f'Text {i} with a %1$s placeholder'
+            else:
+                s = f'text_{i}'
+            self.strings.append(s)
+            if i < styled_count:
+                self.styles.append([])
+
+        bold_index = len(self.strings)
+        self.strings.append('b')
+        for spans in self.styles:
+            spans.append((bold_index, 0, 3))
+
+        self.file_strings: Dict[Tuple[str, int], int] = {}
+        for type_name, extension in (('drawable', 'png'), ('layout', 'xml')):
+            if type_name not in self.type_ids:
+                continue
+
+            for e in range(options.entries):
+                self.file_strings[(type_name, e)] = len(self.strings)
+                self.strings.append(
+                    f'res/{type_name}/{type_name}_{e}.{extension}'
+                )
+
+    def resource_id(self, type_name: str, entry: int):
+        type_id = self.type_ids[type_name]
+        return (self.package_id << 24) | (type_id << 16) | entry
+
+    def random_reference(self, type_name: str):
+        if type_name not in self.type_ids:
+            return None
+
+        return self.resource_id(
+            type_name,
+            self.rng.randrange(self.options.entries),
+        )
+
+    def text_value(self):
+        index = self.rng.randrange(self.text_string_count)
+        return Res_value.TYPE_STRING, self.string_base + index
+
+    def value(self, type_name: str, entry: int) -> Tuple[int, int]:
+        rng = self.rng
+
+        if type_name in ('drawable', 'layout'):
+            index = self.file_strings[(type_name, entry)]
+            return Res_value.TYPE_STRING, self.string_base + index
+
+        if type_name in ('string', 'color', 'dimen') and rng.random() < 0.1:
+            reference = self.random_reference(type_name)
+            assert reference is not None
+            return Res_value.TYPE_REFERENCE, reference
+
+        if type_name == 'string':
+            return self.text_value()
+
+        if type_name == 'bool':
+            return Res_value.TYPE_INT_BOOLEAN, rng.choice([0, 0xFFFFFFFF])
+
+        if type_name == 'integer':
+            return (
+                rng.choice([Res_value.TYPE_INT_DEC, Res_value.TYPE_INT_HEX]),
+                rng.getrandbits(32),
+            )
+
+        if type_name == 'color':
+            return (
+                rng.choice(
+                    [
+                        Res_value.TYPE_INT_COLOR_ARGB8,
+                        Res_value.TYPE_INT_COLOR_RGB8,
+                    ]
+                ),
+                rng.getrandbits(32),
+            )
+
+        if type_name == 'dimen':
+            k = rng.randrange(3)
+            if k == 0:
+                f = rng.choice([0.5, 1.25, 0.1, 3.0, 1e-3])
+                (data,) = struct.unpack('<I', struct.pack('<f', f))
+                return Res_value.TYPE_FLOAT, data
+            if k == 1:
+                return (
+                    Res_value.TYPE_FRACTION,
+                    (rng.randrange(1, 200) << 8) | rng.randrange(2),
+                )
+            return (
+                Res_value.TYPE_DIMENSION,
+                (rng.randrange(1, 2000) << 8) | rng.randrange(6),
+            )
+
+        assert False, type_name
+
+    def bag(self, type_name: str, entry: int):
+        rng = self.rng
+        count = rng.randrange(self.options.bag_items + 1)
+
+        parent = 0
+        items: List[Tuple[int, int, int]] = []
+
+        if type_name == 'attr':
+            items.append(
+                (
+                    ResTable_map.ATTR_TYPE,
+                    Res_value.TYPE_INT_DEC,
+                    rng.choice(
+                        [
+                            ResTable_map.TYPE_INTEGER,
+                            ResTable_map.TYPE_BOOLEAN,
+                            ResTable_map.TYPE_DIMENSION,
+                            ResTable_map.TYPE_STRING
+                            | ResTable_map.TYPE_REFERENCE,
+                        ]
+                    ),
+                )
+            )
+            return parent, items
+
+        if type_name == 'style':
+            # Only inherit from the previous styles to avoid cycles
+            if entry and rng.random() < 0.5:
+                parent = self.resource_id('style', rng.randrange(entry))
+
+            for _ in range(count):
+                name = self.random_reference('attr')
+                if name is None:
+                    break
+
+                data_type, data = self.value(
+                    rng.choice(['string', 'color', 'dimen']),
+                    0,
+                )
+                items.append((name, data_type, data))
+
+            # Sorted by name, same as aapt2
+            items.sort()
+            return parent, items
+
+        if type_name == 'array':
+            item_type_name = rng.choice(['string', 'integer'])
+            for j in range(count):
+                if item_type_name == 'string':
+                    data_type, data = self.text_value()
+                else:
+                    data_type, data = Res_value.TYPE_INT_DEC, j
+                items.append((RES_ARRAY_ITEM | j, data_type, data))
+            return parent, items
+
+        if type_name == 'plurals':
+            for name in (ResTable_map.ATTR_OTHER, ResTable_map.ATTR_ONE):
+                data_type, data = self.text_value()
+                items.append((name, data_type, data))
+            return parent, items
+
+        assert False, type_name
+
+    def entry(self, type_name: str, entry: int, key: int):
+        if type_name in BAG_TYPE_NAMES:
+            parent, items = self.bag(type_name, entry)
+            data = struct.pack(
+                '<HHIII',
+                16,
+                ResTable_entry.FLAG_COMPLEX,
+                key,
+                parent,
+                len(items),
+            )
+            for name, data_type, value in items:
+                data += struct.pack('<IHBBI', name, 8, 0, data_type, value)
+            return data
+
+        data_type, value = self.value(type_name, entry)
+
+        if key <= 0xFFFF and self.rng.random() < 0.3:
+            return struct.pack(
+                '<HHI',
+                key,
+                ResTable_entry.FLAG_COMPACT | (data_type << 8),
+                value,
+            )
+
+        return struct.pack('<HHIHBBI', 8, 0, key, 8, 0, data_type, value)
+
+    def table_type(
+        self,
+        type_name: str,
+        config: bytes,
+        entry_ids: List[int],
+        key_ids: Dict[Tuple[str, int], int],
+    ):
+        entry_count = self.options.entries
+
+        entries: Dict[int, int] = {}
+        entries_data = bytearray()
+        for e in entry_ids:
+            entries[e] = len(entries_data)
+            entries_data += self.entry(type_name, e, key_ids[(type_name, e)])
+
+        form = self.rng.choice(['normal', 'offset16', 'sparse'])
+        if len(entries_data) // 4 >= ResTable_type.NO_ENTRY16:
+            form = 'normal'
+
+        flags = 0
+        if form == 'offset16':
+            flags = ResTable_type.FLAG_OFFSET16
+            offsets = struct.pack(
+                f'<{entry_count}H',
+                *(
+                    entries[e] // 4
+                    if e in entries
+                    else ResTable_type.NO_ENTRY16
+                    for e in range(entry_count)
+                ),
+            )
+        elif form == 'sparse':
+            flags = ResTable_type.FLAG_SPARSE
+            offsets = b''.join(
+                struct.pack('<HH', e, entries[e] // 4) for e in sorted(entries)
+            )
+        else:
+            offsets = struct.pack(
+                f'<{entry_count}I',
+                *(
+                    entries.get(e, ResTable_type.NO_ENTRY)
+                    for e in range(entry_count)
+                ),
+            )
+
+        offsets = pad4(offsets)
+        header_size = sizeof(ResTable_type)
+        header = (
+            struct.pack(
+                '<BBHII',
+                self.type_ids[type_name],
+                flags,
+                0,
+                entry_count,
+                header_size + len(offsets),
+            )
+            + config
+        )
+        return make_chunk(RES_TABLE_TYPE_TYPE, header, offsets + entries_data)
+
+    def package(self, package_name: str):
+        rng = self.rng
+        entry_count = self.options.entries
+
+        keys: List[str] = []
+        key_ids: Dict[Tuple[str, int], int] = {}
+        for type_name in self.type_names:
+            for e in range(entry_count):
+                key_ids[(type_name, e)] = len(keys)
+                keys.append(f'{type_name}_{e}')
+
+        type_pool = make_string_pool(self.type_names, False)
+        key_pool = make_string_pool(keys, True)
+
+        configs = [make_config(i) for i in range(self.options.configs)]
+
+        body = bytearray()
+        for type_name in self.type_names:
+            spec_flags = [
+                rng.choice([0, ResTable_typeSpec.SPEC_PUBLIC])
+                for _ in range(entry_count)
+            ]
+            body += make_chunk(
+                RES_TABLE_TYPE_SPEC_TYPE,
+                struct.pack(
+                    '<BBHI',
+                    self.type_ids[type_name],
+                    0,
+                    0,
+                    entry_count,
+                ),
+                struct.pack(f'<{entry_count}I', *spec_flags),
+            )
+
+            for config_index, config in enumerate(configs):
+                entry_ids = list(range(entry_count))
+
+                # Strings are translated in every locale, other types only
+                # have some of their entries in some of the configs
+                if config_index:
+                    if type_name != 'string' and rng.random() < 0.5:
+                        continue
+
+                    entry_ids = [e for e in entry_ids if rng.random() < 0.3]
+                    if not entry_ids:
+                        continue
+
+                body += self.table_type(type_name, config, entry_ids, key_ids)
+
+        name = package_name.encode('utf-16le')[:254]
+        name += b'\0' * (256 - len(name))
+        header_size = 8 + 4 + 256 + 4 * 5
+        header = (
+            struct.pack('<I', self.package_id)
+            + name
+            + struct.pack(
+                '<IIIII',
+                header_size,
+                0,
+                header_size + len(type_pool),
+                0,
+                0,
+            )
+        )
+        return make_chunk(
+            RES_TABLE_PACKAGE_TYPE,
+            header,
+            type_pool + key_pool + bytes(body),
+        )
+
+
+def generate_arsc(
+    options: CorpusOptions,
+    package_name: str = 'com.example',
+    package_id: int = 0x7F,
+):
+    strings: List[str] = []
+    styles: List[List[Tuple[int, int, int]]] = []
+    packages = bytearray()
+
+    for i in range(options.packages):
+        generator = TableGenerator(
+            options,
+            package_id - i,
+            string_base=len(strings),
+            seed=options.seed + i,
+        )
+
+        # Styled strings have to be the first ones of the pool
+        if not i:
+            styles = generator.styles
+
+        strings += generator.strings
+
+        name = package_name
+        if i:
+            name += f'.lib{i}'
+
+        packages += generator.package(name)
+
+    return make_chunk(
+        RES_TABLE_TYPE,
+        struct.pack('<I', options.packages),
+        make_string_pool(strings, options.utf8, styles) + bytes(packages),
+    )
+
+
+def generate_axml(
+    strings_utf8: bool,
+    children: int,
+    seed: int,
+    package_id: int = 0x7F,
+    type_ids: Optional[Dict[str, int]] = None,
+    entries: int = 0,
+    manifest_package: Optional[str] = None,
+):
+    rng = random.Random(seed)
+    type_ids = type_ids or {}
+
+    # Attribute names come first in the pool, in the order of the
+    # resource map
+    strings = [name for name, _ in LAYOUT_ATTRS]
+    strings += [
+        'android',
+        ANDROID_URI,
+        'LinearLayout',
+        'TextView',
+        'manifest',
+        'application',
+        'package',
+        'Hello',
+    ]
+    if manifest_package is not None:
+        strings.append(manifest_package)
+    string_ids = {s: i for i, s in enumerate(strings)}
+
+    resource_map = make_chunk(
+        RES_XML_RESOURCE_MAP_TYPE,
+        b'',
+        struct.pack(
+            f'<{len(LAYOUT_ATTRS)}I',
+            *(attr_id for _, attr_id in LAYOUT_ATTRS),
+        ),
+    )
+
+    def node(chunk_type: int, ext: bytes):
+        return make_chunk(chunk_type, struct.pack('<II', 1, NO_INDEX), ext)
+
+    android = string_ids[ANDROID_URI]
+
+    def start(name: str, attrs: List[Tuple[int, str, int, int, int]]):
+        ext = struct.pack(
+            '<IIHHHHHH',
+            NO_INDEX,
+            string_ids[name],
+            20,
+            20,
+            len(attrs),
+            0,
+            0,
+            0,
+        )
+        for ns, attr_name, raw, data_type, data in attrs:
+            ext += struct.pack(
+                '<IIIHBBI',
+                ns,
+                string_ids[attr_name],
+                raw,
+                8,
+                0,
+                data_type,
+                data,
+            )
+        return node(RES_XML_START_ELEMENT_TYPE, ext)
+
+    def end(name: str):
+        return node(
+            RES_XML_END_ELEMENT_TYPE,
+            struct.pack('<II', NO_INDEX, string_ids[name]),
+        )
+
+    def reference(type_name: str):
+        if type_name not in type_ids or not entries:
+            return None
+
+        return (
+            (package_id << 24)
+            | (type_ids[type_name] << 16)
+            | rng.randrange(entries)
+        )
+
+    namespace = struct.pack('<II', string_ids['android'], android)
+    nodes = node(RES_XML_START_NAMESPACE_TYPE, namespace)
+
+    if manifest_package is not None:
+        package = string_ids[manifest_package]
+        nodes += start(
+            'manifest',
+            [
+                (
+                    NO_INDEX,
+                    'package',
+                    package,
+                    Res_value.TYPE_STRING,
+                    package,
+                ),
+            ],
+        )
+        nodes += start(
+            'application',
+            [(android, 'enabled', NO_INDEX, Res_value.TYPE_INT_BOOLEAN, 0)],
+        )
+        nodes += end('application')
+        nodes += end('manifest')
+    else:
+        nodes += start(
+            'LinearLayout',
+            [
+                (
+                    android,
+                    'layout_width',
+                    NO_INDEX,
+                    Res_value.TYPE_INT_DEC,
+                    0xFFFFFFFF,
+                )
+            ],
+        )
+
+        for _ in range(children):
+            attrs: List[Tuple[int, str, int, int, int]] = [
+                (
+                    android,
+                    'textSize',
+                    NO_INDEX,
+                    Res_value.TYPE_DIMENSION,
+                    (rng.randrange(1, 40) << 8) | 2,
+                ),
+                (
+                    android,
+                    'enabled',
+                    NO_INDEX,
+                    Res_value.TYPE_INT_BOOLEAN,
+                    rng.choice([0, 0xFFFFFFFF]),
+                ),
+            ]
+
+            text = reference('string')
+            if text is None:
+                hello = string_ids['Hello']
+                attrs.append(
+                    (android, 'text', hello, Res_value.TYPE_STRING, hello)
+                )
+            else:
+                attrs.append(
+                    (android, 'text', NO_INDEX, Res_value.TYPE_REFERENCE, text)
+                )
+
+            nodes += start('TextView', attrs)
+            if rng.random() < 0.2:
+                nodes += node(
+                    RES_XML_CDATA_TYPE,
+                    struct.pack(
+                        '<IHBBI',
+                        string_ids['Hello'],
+                        8,
+                        0,
+                        Res_value.TYPE_NULL,
+                        0,
+                    ),
+                )
+            nodes += end('TextView')
+
+        nodes += end('LinearLayout')
+
+    nodes += node(RES_XML_END_NAMESPACE_TYPE, namespace)
+
+    return make_chunk(
+        RES_XML_TYPE,
+        b'',
+        make_string_pool(strings, strings_utf8) + resource_map + nodes,
+    )
+
+
+def generate_apk(
+    apk_path: Path,
+    options: CorpusOptions,
+    package_name: str = 'com.example',
+    package_id: int = 0x7F,
+):
+    arsc = generate_arsc(options, package_name, package_id)
+
+    type_names = get_type_names(options)
+    type_ids = {t: i + 1 for i, t in enumerate(type_names)}
+
+    # The table is stored uncompressed, same as for installable APKs
+    with zipfile.ZipFile(apk_path, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr(
+            zipfile.ZipInfo('resources.arsc'),
+            arsc,
+            compress_type=zipfile.ZIP_STORED,
+        )
+        z.writestr(
+            'AndroidManifest.xml',
+            generate_axml(
+                False,
+                0,
+                options.seed,
+                manifest_package=package_name,
+            ),
+        )
+
+        if 'layout' in type_ids:
+            for e in range(options.entries):
+                z.writestr(
+                    f'res/layout/layout_{e}.xml',
+                    generate_axml(
+                        bool(e % 2),
+                        10,
+                        options.seed + e,
+                        package_id,
+                        type_ids,
+                        options.entries,
+                    ),
+                )
+
+        if 'drawable' in type_ids:
+            for e in range(options.entries):
+                z.writestr(f'res/drawable/drawable_{e}.png', b'\x89PNG\r\n')
@@ -0,0 +1,96 @@
+# SPDX-FileCopyrightText: The LineageOS Project
+# SPDX-License-Identifier: Apache-2.0
+
+import mmap
+import shutil
+import struct
+import zipfile
+import zlib
+from pathlib import Path
+from typing import List
+
+# signature, version, flags, compression, time, date, crc32,
+# compressed size, file size, file name length, extra field length
+LOCAL_FILE_HEADER = struct.Struct('<IHHHHHIIIHH')
+LOCAL_FILE_HEADER_SIGNATURE = 0x04034B50
+
+
+class APKFile:
+    # Stored members, such as resources.arsc, are returned as views into the
+    # mapped APK instead of being copied, the mapping stays alive for as long
+    # as any view into it does
+    def __init__(self, apk_path: Path):
+        with open(apk_path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.__data = memoryview(mm)
+        self.__zip = zipfile.ZipFile(apk_path, 'r')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args: object):
+        self.close()
+
+    def close(self):
+        self.__zip.close()
+
+    def namelist(self) -> List[str]:
+        return self.__zip.namelist()
+
+    def __stored_data(self, info: zipfile.ZipInfo):
+        if info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1:
+            return None
+
+        (
+            signature,
+            _,
+            _,
+            _,
+            _,
+            _,
+            _,
+            _,
+            _,
+            name_length,
+            extra_length,
+        ) = LOCAL_FILE_HEADER.unpack_from(self.__data, info.header_offset)
+        if signature != LOCAL_FILE_HEADER_SIGNATURE:
+            raise zipfile.BadZipFile(f'Bad local file header: {info.filename}')
+
+        data_offset = (
+            info.header_offset
+            + LOCAL_FILE_HEADER.size
+            + name_length
+            + extra_length
+        )
+        data = self.__data[data_offset : data_offset + info.file_size]
+        if len(data) != info.file_size:
+            raise zipfile.BadZipFile(f'Truncated file: {info.filename}')
+
+        # Same check as zipfile does when reading the member
+        if zlib.crc32(data) != info.CRC:
+            raise zipfile.BadZipFile(f'Bad CRC-32 for file {info.filename}')
+
+        return data
+
+    def read(self, name: str) -> memoryview:
+        info = self.__zip.getinfo(name)
+
+        data = self.__stored_data(info)
+        if data is not None:
+            return data
+
+        return memoryview(self.__zip.read(info))
+
+    def extract_to(self, name: str, file_path: Path):
+        info = self.__zip.getinfo(name)
+
+        data = self.__stored_data(info)
+        if data is not None:
+            file_path.write_bytes(data)
+            return
+
+        # Decompress in chunks instead of holding the whole member
+        with self.__zip.open(info) as src, open(file_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
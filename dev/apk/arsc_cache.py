@@ -0,0 +1,62 @@
+# SPDX-FileCopyrightText: The LineageOS Project
+# SPDX-License-Identifier: Apache-2.0
+
+import hashlib
+import os
+import pickle
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from apk.arsc_resources import ARSCResourcesMap, ARSCResourceTable
+
+REFERENCE_TABLE_VERSION = 2
+
+
+def get_reference_table_path(cache_dir: Path, arsc: bytes | memoryview):
+    digest = hashlib.sha256(arsc).hexdigest()
+    return Path(cache_dir, f'{digest}.table')
+
+
+def save_reference_table(
+    table_path: Path,
+    resources: ARSCResourcesMap,
+    flags: Dict[int, int],
+):
+    # Resources of a reference table are only looked up by id, and only the
+    # first config is used, the other configs are not stored
+    data = (REFERENCE_TABLE_VERSION, resources.first_configs(), flags)
+
+    # Runs extracting against the same framework can share the cache dir,
+    # replace the file at once so that they never read a partial table
+    table_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = table_path.with_name(f'{table_path.name}.{os.getpid()}.tmp')
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, table_path)
+
+
+def load_reference_table(
+    table_path: Path,
+) -> Optional[Tuple[ARSCResourcesMap, Dict[int, int]]]:
+    try:
+        with open(table_path, 'rb') as f:
+            data = pickle.load(f)
+    except Exception:
+        # Unpickling a stale or corrupt cache can fail in many ways, such as
+        # classes that were renamed since, parse the table again instead
+        return None
+
+    if (
+        not isinstance(data, tuple)
+        or len(data) != 3
+        or data[0] != REFERENCE_TABLE_VERSION
+    ):
+        return None
+
+    _, resources, flags = data
+    if not isinstance(resources, ARSCResourceTable) or not isinstance(
+        flags, dict
+    ):
+        return None
+
+    return resources, flags
@@ -1,312 +1,392 @@
 # SPDX-FileCopyrightText: The LineageOS Project
 # SPDX-License-Identifier: Apache-2.0
 
-from typing import List, Optional, Tuple
+import sys
+from functools import cache
+from typing import Dict, List, Optional
 
-from apk.resource_types import ResTable_config
+from apk.resource_types import RES_TABLE_CONFIG, ResTable_config
 from apk.utils import str_from_c
 
-
-def get_locale_qualifier(config: ResTable_config) -> str:
-    assert not (bytes(config.language)[0] & 0x80), (
+GRAMMATICAL_GENDER_NAMES = {
+    ResTable_config.GRAMMATICAL_GENDER_NEUTER: 'neuter',
+    ResTable_config.GRAMMATICAL_GENDER_FEMININE: 'feminine',
+    ResTable_config.GRAMMATICAL_GENDER_MASCULINE: 'masculine',
+}
+
+LAYOUTDIR_NAMES = {
+    ResTable_config.LAYOUTDIR_LTR: 'ldltr',
+    ResTable_config.LAYOUTDIR_RTL: 'ldrtl',
+}
+
+SCREENSIZE_NAMES = {
+    ResTable_config.SCREENSIZE_SMALL: 'small',
+    ResTable_config.SCREENSIZE_NORMAL: 'normal',
+    ResTable_config.SCREENSIZE_LARGE: 'large',
+    ResTable_config.SCREENSIZE_XLARGE: 'xlarge',
+}
+
+SCREENLONG_NAMES = {
+    ResTable_config.SCREENLONG_NO: 'notlong',
+    ResTable_config.SCREENLONG_YES: 'long',
+}
+
+SCREENROUND_NAMES = {
+    ResTable_config.SCREENROUND_NO: 'notround',
+    ResTable_config.SCREENROUND_YES: 'round',
+}
+
+WIDE_COLOR_GAMUT_NAMES = {
+    ResTable_config.WIDE_COLOR_GAMUT_NO: 'nowidecg',
+    ResTable_config.WIDE_COLOR_GAMUT_YES: 'widecg',
+}
+
+HDR_NAMES = {
+    ResTable_config.HDR_NO: 'lowdr',
+    ResTable_config.HDR_YES: 'highdr',
+}
+
+ORIENTATION_NAMES = {
+    ResTable_config.ORIENTATION_PORT: 'port',
+    ResTable_config.ORIENTATION_LAND: 'land',
+    ResTable_config.ORIENTATION_SQUARE: 'square',
+}
+
+UI_MODE_TYPE_NAMES = {
+    ResTable_config.UI_MODE_TYPE_DESK: 'desk',
+    ResTable_config.UI_MODE_TYPE_CAR: 'car',
+    ResTable_config.UI_MODE_TYPE_TELEVISION: 'television',
+    ResTable_config.UI_MODE_TYPE_APPLIANCE: 'appliance',
+    ResTable_config.UI_MODE_TYPE_WATCH: 'watch',
+    ResTable_config.UI_MODE_TYPE_VR_HEADSET: 'vrheadset',
+}
+
+UI_MODE_NIGHT_NAMES = {
+    ResTable_config.UI_MODE_NIGHT_NO: 'notnight',
+    ResTable_config.UI_MODE_NIGHT_YES: 'night',
+}
+
+DENSITY_NAMES = {
+    ResTable_config.DENSITY_LOW: 'ldpi',
+    ResTable_config.DENSITY_MEDIUM: 'mdpi',
+    ResTable_config.DENSITY_TV: 'tvdpi',
+    ResTable_config.DENSITY_HIGH: 'hdpi',
+    ResTable_config.DENSITY_XHIGH: 'xhdpi',
+    ResTable_config.DENSITY_XXHIGH: 'xxhdpi',
+    ResTable_config.DENSITY_XXXHIGH: 'xxxhdpi',
+    ResTable_config.DENSITY_NONE: 'nodpi',
+    ResTable_config.DENSITY_ANY: 'anydpi',
+}
+
+TOUCHSCREEN_NAMES = {
+    ResTable_config.TOUCHSCREEN_NOTOUCH: 'notouch',
+    ResTable_config.TOUCHSCREEN_FINGER: 'finger',
+    ResTable_config.TOUCHSCREEN_STYLUS: 'stylus',
+}
+
+KEYSHIDDEN_NAMES = {
+    ResTable_config.KEYSHIDDEN_NO: 'keysexposed',
+    ResTable_config.KEYSHIDDEN_YES: 'keyshidden',
+    ResTable_config.KEYSHIDDEN_SOFT: 'keyssoft',
+}
+
+KEYBOARD_NAMES = {
+    ResTable_config.KEYBOARD_NOKEYS: 'nokeys',
+    ResTable_config.KEYBOARD_QWERTY: 'qwerty',
+    ResTable_config.KEYBOARD_12KEY: '12key',
+}
+
+NAVHIDDEN_NAMES = {
+    ResTable_config.NAVHIDDEN_NO: 'navexposed',
+    ResTable_config.NAVHIDDEN_YES: 'navhidden',
+}
+
+NAVIGATION_NAMES = {
+    ResTable_config.NAVIGATION_NONAV: 'nonav',
+    ResTable_config.NAVIGATION_DPAD: 'dpad',
+    ResTable_config.NAVIGATION_TRACKBALL: 'trackball',
+    ResTable_config.NAVIGATION_WHEEL: 'wheel',
+}
+
+
+def get_locale_qualifier(
+    language: bytes,
+    country: bytes,
+    script: bytes,
+    script_was_computed: bool,
+    variant: bytes,
+    numbering: bytes,
+) -> str:
+    assert not (language[0] & 0x80), (
         'Packed 3-letter language codes not implemented'
     )
 
-    assert not (bytes(config.country)[0] & 0x80), (
+    assert not (country[0] & 0x80), (
         'Packed 3-letter region codes not implemented'
     )
 
-    language = str_from_c(config.language)
-    if not language:
+    language_str = str_from_c(language)
+    if not language_str:
         return ''
 
-    region = str_from_c(config.country)
-    script = str_from_c(config.localeScript)
-    variant = str_from_c(config.localeVariant)
-    numbering = str_from_c(config.localeNumberingSystem)
+    region_str = str_from_c(country)
+    script_str = str_from_c(script)
+    variant_str = str_from_c(variant)
+    numbering_str = str_from_c(numbering)
 
-    assert not script or not config.localeScriptWasComputed, (
+    assert not script_str or not script_was_computed, (
         'Computed script handling not implemented'
     )
 
-    if script or variant or numbering:
-        tag = ['b', language]
+    if script_str or variant_str or numbering_str:
+        tag = ['b', language_str]
 
-        if script:
-            tag.append(script)
-        if region:
-            tag.append(region)
-        if variant:
-            tag.append(variant)
-        if numbering:
-            tag.extend(['u', 'nu', numbering])
+        if script_str:
+            tag.append(script_str)
+        if region_str:
+            tag.append(region_str)
+        if variant_str:
+            tag.append(variant_str)
+        if numbering_str:
+            tag.extend(['u', 'nu', numbering_str])
 
         return '+'.join(tag)
 
-    return f'{language}-r{region}' if region else language
+    if region_str:
+        return f'{language_str}-r{region_str}'
+
+    return language_str
 
 
 def decode_config_member(
     parts: List[str],
     value: int,
-    values: List[Tuple[int, str]],
-    mask: Optional[int] = None,
+    names: Dict[int, str],
     ignore_value: Optional[int] = None,
     default_value_format: Optional[str] = None,
 ):
-    if mask is not None:
-        value = value & mask
-
-    if ignore_value is not None and value == ignore_value:
+    if value == ignore_value:
         return
 
-    for match_value, name in values:
-        if value == match_value:
-            parts.append(name)
+    name = names.get(value)
+    if name is None:
+        if default_value_format is None:
             return
 
-    if default_value_format is not None:
         name = default_value_format.format(value)
-        parts.append(name)
 
+    parts.append(name)
+
+
+@cache
+def decode_config_key(config_key: bytes):
+    # Resources of all types and APKs share the same few configs, decode
+    # each of them once, straight from the raw bytes of the config
+    # Configs of older tables are shorter, the missing fields are unset
+    if len(config_key) < RES_TABLE_CONFIG.size:
+        config_key = config_key.ljust(RES_TABLE_CONFIG.size, b'\0')
+
+    (
+        _,
+        mcc,
+        mnc,
+        language,
+        country,
+        orientation,
+        touchscreen,
+        density,
+        keyboard,
+        navigation,
+        input_flags,
+        grammatical_inflection,
+        screen_width,
+        screen_height,
+        sdk_version,
+        minor_version,
+        screen_layout,
+        ui_mode,
+        smallest_screen_width_dp,
+        screen_width_dp,
+        screen_height_dp,
+        locale_script,
+        locale_variant,
+        screen_layout2,
+        color_mode,
+        _,
+        locale_script_was_computed,
+        locale_numbering_system,
+    ) = RES_TABLE_CONFIG.unpack_from(config_key)
 
-def decode_config(config: ResTable_config):
     parts: List[str] = []
 
-    if config.mcc:
-        parts.append(f'mcc{config.mcc:03d}')
+    if mcc:
+        parts.append(f'mcc{mcc:03d}')
 
-    if config.mnc:
-        mnc = config.mnc
+    if mnc:
         if mnc == ResTable_config.MNC_ZERO:
             mnc = 0
 
         parts.append(f'mnc{mnc:02d}')
 
-    locale = get_locale_qualifier(config)
+    locale = get_locale_qualifier(
+        language,
+        country,
+        locale_script,
+        locale_script_was_computed,
+        locale_variant,
+        locale_numbering_system,
+    )
     if locale:
         parts.append(locale)
 
     decode_config_member(
         parts,
-        config.grammaticalInflection,
-        [
-            (ResTable_config.GRAMMATICAL_GENDER_NEUTER, 'neuter'),
-            (ResTable_config.GRAMMATICAL_GENDER_FEMININE, 'feminine'),
-            (ResTable_config.GRAMMATICAL_GENDER_MASCULINE, 'masculine'),
-        ],
-        mask=ResTable_config.GRAMMATICAL_INFLECTION_GENDER_MASK,
+        grammatical_inflection
+        & ResTable_config.GRAMMATICAL_INFLECTION_GENDER_MASK,
+        GRAMMATICAL_GENDER_NAMES,
         ignore_value=0,
     )
 
     decode_config_member(
         parts,
-        config.screenLayout,
-        [
-            (ResTable_config.LAYOUTDIR_LTR, 'ldltr'),
-            (ResTable_config.LAYOUTDIR_RTL, 'ldrtl'),
-        ],
-        mask=ResTable_config.MASK_LAYOUTDIR,
+        screen_layout & ResTable_config.MASK_LAYOUTDIR,
+        LAYOUTDIR_NAMES,
         ignore_value=0,
         default_value_format='layoutDir={}',
     )
 
-    if config.smallestScreenWidthDp:
-        parts.append(f'sw{config.smallestScreenWidthDp}dp')
+    if smallest_screen_width_dp:
+        parts.append(f'sw{smallest_screen_width_dp}dp')
 
-    if config.screenWidthDp:
-        parts.append(f'w{config.screenWidthDp}dp')
+    if screen_width_dp:
+        parts.append(f'w{screen_width_dp}dp')
 
-    if config.screenHeightDp:
-        parts.append(f'h{config.screenHeightDp}dp')
+    if screen_height_dp:
+        parts.append(f'h{screen_height_dp}dp')
 
     decode_config_member(
         parts,
-        config.screenLayout,
-        [
-            (ResTable_config.SCREENSIZE_SMALL, 'small'),
-            (ResTable_config.SCREENSIZE_NORMAL, 'normal'),
-            (ResTable_config.SCREENSIZE_LARGE, 'large'),
-            (ResTable_config.SCREENSIZE_XLARGE, 'xlarge'),
-        ],
-        mask=ResTable_config.MASK_SCREENSIZE,
+        screen_layout & ResTable_config.MASK_SCREENSIZE,
+        SCREENSIZE_NAMES,
         ignore_value=ResTable_config.SCREENSIZE_ANY,
         default_value_format='screenLayoutSize={}',
     )
 
     decode_config_member(
         parts,
-        config.screenLayout,
-        [
-            (ResTable_config.SCREENLONG_NO, 'notlong'),
-            (ResTable_config.SCREENLONG_YES, 'long'),
-        ],
-        mask=ResTable_config.MASK_SCREENLONG,
+        screen_layout & ResTable_config.MASK_SCREENLONG,
+        SCREENLONG_NAMES,
         ignore_value=0,
         default_value_format='screenLayoutLong={}',
     )
 
     decode_config_member(
         parts,
-        config.screenLayout2,
-        [
-            (ResTable_config.SCREENROUND_NO, 'notround'),
-            (ResTable_config.SCREENROUND_YES, 'round'),
-        ],
-        mask=ResTable_config.MASK_SCREENROUND,
+        screen_layout2 & ResTable_config.MASK_SCREENROUND,
+        SCREENROUND_NAMES,
         ignore_value=0,
         default_value_format='screenRound={}',
     )
 
     decode_config_member(
         parts,
-        config.colorMode,
-        [
-            (ResTable_config.WIDE_COLOR_GAMUT_NO, 'nowidecg'),
-            (ResTable_config.WIDE_COLOR_GAMUT_YES, 'widecg'),
-        ],
-        mask=ResTable_config.MASK_WIDE_COLOR_GAMUT,
+        color_mode & ResTable_config.MASK_WIDE_COLOR_GAMUT,
+        WIDE_COLOR_GAMUT_NAMES,
         ignore_value=0,
         default_value_format='wideColorGamut={}',
     )
 
     decode_config_member(
         parts,
-        config.colorMode,
-        [
-            (ResTable_config.HDR_NO, 'lowdr'),
-            (ResTable_config.HDR_YES, 'highdr'),
-        ],
-        mask=ResTable_config.MASK_HDR,
+        color_mode & ResTable_config.MASK_HDR,
+        HDR_NAMES,
         ignore_value=0,
         default_value_format='hdr={}',
     )
 
     decode_config_member(
         parts,
-        config.orientation,
-        [
-            (ResTable_config.ORIENTATION_PORT, 'port'),
-            (ResTable_config.ORIENTATION_LAND, 'land'),
-            (ResTable_config.ORIENTATION_SQUARE, 'square'),
-        ],
+        orientation,
+        ORIENTATION_NAMES,
         ignore_value=ResTable_config.ORIENTATION_ANY,
         default_value_format='orientation={}',
     )
 
     decode_config_member(
         parts,
-        config.uiMode,
-        [
-            (ResTable_config.UI_MODE_TYPE_DESK, 'desk'),
-            (ResTable_config.UI_MODE_TYPE_CAR, 'car'),
-            (ResTable_config.UI_MODE_TYPE_TELEVISION, 'television'),
-            (ResTable_config.UI_MODE_TYPE_APPLIANCE, 'appliance'),
-            (ResTable_config.UI_MODE_TYPE_WATCH, 'watch'),
-            (ResTable_config.UI_MODE_TYPE_VR_HEADSET, 'vrheadset'),
-        ],
-        mask=ResTable_config.MASK_UI_MODE_TYPE,
+        ui_mode & ResTable_config.MASK_UI_MODE_TYPE,
+        UI_MODE_TYPE_NAMES,
         ignore_value=ResTable_config.UI_MODE_TYPE_ANY,
         default_value_format='uiModeType={}',
     )
 
     decode_config_member(
         parts,
-        config.uiMode,
-        [
-            (ResTable_config.UI_MODE_NIGHT_NO, 'notnight'),
-            (ResTable_config.UI_MODE_NIGHT_YES, 'night'),
-        ],
-        mask=ResTable_config.MASK_UI_MODE_NIGHT,
+        ui_mode & ResTable_config.MASK_UI_MODE_NIGHT,
+        UI_MODE_NIGHT_NAMES,
         ignore_value=0,
         default_value_format='uiModeNight={}',
     )
 
     decode_config_member(
         parts,
-        config.density,
-        [
-            (ResTable_config.DENSITY_LOW, 'ldpi'),
-            (ResTable_config.DENSITY_MEDIUM, 'mdpi'),
-            (ResTable_config.DENSITY_TV, 'tvdpi'),
-            (ResTable_config.DENSITY_HIGH, 'hdpi'),
-            (ResTable_config.DENSITY_XHIGH, 'xhdpi'),
-            (ResTable_config.DENSITY_XXHIGH, 'xxhdpi'),
-            (ResTable_config.DENSITY_XXXHIGH, 'xxxhdpi'),
-            (ResTable_config.DENSITY_NONE, 'nodpi'),
-            (ResTable_config.DENSITY_ANY, 'anydpi'),
-        ],
+        density,
+        DENSITY_NAMES,
         ignore_value=ResTable_config.DENSITY_DEFAULT,
         default_value_format='{}dpi',
     )
 
     decode_config_member(
         parts,
-        config.touchscreen,
-        [
-            (ResTable_config.TOUCHSCREEN_NOTOUCH, 'notouch'),
-            (ResTable_config.TOUCHSCREEN_FINGER, 'finger'),
-            (ResTable_config.TOUCHSCREEN_STYLUS, 'stylus'),
-        ],
+        touchscreen,
+        TOUCHSCREEN_NAMES,
         ignore_value=ResTable_config.TOUCHSCREEN_ANY,
         default_value_format='touchscreen={}',
     )
 
     decode_config_member(
         parts,
-        config.inputFlags,
-        [
-            (ResTable_config.KEYSHIDDEN_NO, 'keysexposed'),
-            (ResTable_config.KEYSHIDDEN_YES, 'keyshidden'),
-            (ResTable_config.KEYSHIDDEN_SOFT, 'keyssoft'),
-        ],
-        mask=ResTable_config.MASK_KEYSHIDDEN,
+        input_flags & ResTable_config.MASK_KEYSHIDDEN,
+        KEYSHIDDEN_NAMES,
     )
 
     decode_config_member(
         parts,
-        config.keyboard,
-        [
-            (ResTable_config.KEYBOARD_NOKEYS, 'nokeys'),
-            (ResTable_config.KEYBOARD_QWERTY, 'qwerty'),
-            (ResTable_config.KEYBOARD_12KEY, '12key'),
-        ],
+        keyboard,
+        KEYBOARD_NAMES,
         ignore_value=ResTable_config.KEYBOARD_ANY,
         default_value_format='keyboard={}',
     )
 
     decode_config_member(
         parts,
-        config.inputFlags,
-        [
-            (ResTable_config.NAVHIDDEN_NO, 'navexposed'),
-            (ResTable_config.NAVHIDDEN_YES, 'navhidden'),
-        ],
-        mask=ResTable_config.MASK_NAVHIDDEN,
+        input_flags & ResTable_config.MASK_NAVHIDDEN,
+        NAVHIDDEN_NAMES,
         ignore_value=0,
         default_value_format='inputFlagsNavHidden={}',
     )
 
     decode_config_member(
         parts,
-        config.navigation,
-        [
-            (ResTable_config.NAVIGATION_NONAV, 'nonav'),
-            (ResTable_config.NAVIGATION_DPAD, 'dpad'),
-            (ResTable_config.NAVIGATION_TRACKBALL, 'trackball'),
-            (ResTable_config.NAVIGATION_WHEEL, 'wheel'),
-        ],
+        navigation,
+        NAVIGATION_NAMES,
         ignore_value=ResTable_config.NAVIGATION_ANY,
         default_value_format='navigation={}',
     )
 
-    if config.screenSize:
-        parts.append(f'{config.screenWidth}x{config.screenHeight}')
+    if screen_width or screen_height:
+        parts.append(f'{screen_width}x{screen_height}')
 
-    if config.version:
-        version = f'v{config.sdkVersion}'
-        if config.minorVersion:
-            version += f'.{config.minorVersion}'
+    if sdk_version or minor_version:
+        version = f'v{sdk_version}'
+        if minor_version:
+            version += f'.{minor_version}'
         parts.append(version)
 
-    return '-'.join(parts)
+    # Configs that only differ in fields that are not decoded share the
+    # same qualifiers, and the same string
+    return sys.intern('-'.join(parts))
+
+
+def decode_config(config: ResTable_config):
+    return decode_config_key(bytes(config))
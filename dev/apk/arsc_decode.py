@@ -3,8 +3,9 @@
 
 import math
 import struct
+from functools import cache
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
 
 from apk.arsc_decode_string import (
     StringToken,
@@ -41,6 +42,20 @@ FRACTION_UNITS = {
     Res_value.COMPLEX_UNIT_FRACTION: '%',
     Res_value.COMPLEX_UNIT_FRACTION_PARENT: '%p',
 }
+INT_DATA_TYPES = {
+    Res_value.TYPE_INT_DEC,
+    Res_value.TYPE_INT_HEX,
+    Res_value.TYPE_INT_BOOLEAN,
+}
+PLAIN_DATA_TYPES = INT_DATA_TYPES | {
+    Res_value.TYPE_FLOAT,
+    Res_value.TYPE_DIMENSION,
+    Res_value.TYPE_FRACTION,
+    Res_value.TYPE_INT_COLOR_ARGB8,
+    Res_value.TYPE_INT_COLOR_RGB8,
+    Res_value.TYPE_INT_COLOR_ARGB4,
+    Res_value.TYPE_INT_COLOR_RGB4,
+}
 
 
 def split_resource_id(data: int):
@@ -78,6 +93,103 @@ def bits_to_int32(value: int) -> int:
     return struct.unpack('<i', struct.pack('<I', value))[0]
 
 
+def f32_rounding_interval(bits: int):
+    biased_exponent = (bits >> 23) & 0xFF
+    mantissa = bits & 0x7FFFFF
+
+    if biased_exponent:
+        mantissa |= 1 << 23
+        exponent = biased_exponent - 150
+    else:
+        exponent = -149
+
+    # Bounds of the decimals that read back as the value, as numerators over
+    # a shared denominator, the lower neighbour is closer at powers of two
+    low = 4 * mantissa - 2
+    if mantissa == 1 << 23 and biased_exponent > 1:
+        low += 1
+    high = 4 * mantissa + 2
+    inclusive = mantissa % 2 == 0
+
+    exponent -= 2
+    if exponent >= 0:
+        return low << exponent, high << exponent, 1, inclusive
+
+    return low, high, 1 << -exponent, inclusive
+
+
+def format_g_digits(digits: str, exponent: int):
+    # Same output as format(value, '.{len(digits)}g')
+    if -4 <= exponent < len(digits):
+        if exponent < 0:
+            s = '0.' + '0' * (-exponent - 1) + digits
+        else:
+            s = digits[: exponent + 1] + '.' + digits[exponent + 1 :]
+
+        return s.rstrip('0').rstrip('.')
+
+    mantissa = digits[0]
+    fraction = digits[1:].rstrip('0')
+    if fraction:
+        mantissa += '.' + fraction
+
+    sign = '-' if exponent < 0 else '+'
+    return f'{mantissa}E{sign}{abs(exponent):02d}'
+
+
+@cache
+def stringify_f32(value: float, bits: int):
+    num, den = abs(value).as_integer_ratio()
+
+    exponent = len(str(num // den)) - 1 if num >= den else -1
+    while num * 10**-exponent < den:
+        exponent -= 1
+
+    low, high, bound_den, inclusive = f32_rounding_interval(bits & 0x7FFFFFFF)
+    digits = ''
+
+    # Shortest of the correctly rounded precisions that reads back as the
+    # same float32, compared exactly against its rounding interval
+    for precision in range(1, 10):
+        shift = exponent + 1 - precision
+        if shift >= 0:
+            divisor = den * 10**shift
+            q, r = divmod(num, divisor)
+        else:
+            divisor = den
+            q, r = divmod(num * 10**-shift, divisor)
+
+        # Same round half to even as format()
+        if 2 * r > divisor or (2 * r == divisor and q % 2):
+            q += 1
+
+        digits = str(q)
+        digits_exponent = exponent
+        if len(digits) > precision:
+            q //= 10
+            digits = digits[:precision]
+            digits_exponent += 1
+            shift += 1
+
+        if shift >= 0:
+            candidate = q * 10**shift * bound_den
+            candidate_den = 1
+        else:
+            candidate = q * bound_den
+            candidate_den = 10**-shift
+
+        if inclusive:
+            fits = low * candidate_den <= candidate <= high * candidate_den
+        else:
+            fits = low * candidate_den < candidate < high * candidate_den
+
+        if fits:
+            break
+
+    s = format_g_digits(digits, digits_exponent)
+    return '-' + s if value < 0 else s
+
+
 def stringify_float(value: float):
     bits = f32_to_bits(value)
 
@@ -94,14 +206,7 @@ def stringify_float(value: float):
     if value == float(xi) and abs(xi) < 10**23:
         return f'{xi}.0'
 
-    s = format(value, '.9g')
-    for p in range(1, 9):
-        ps = format(value, f'.{p}g')
-        if f32_to_bits(float(ps)) == bits:
-            s = ps
-            break
-
-    return s.replace('e', 'E')
+    return stringify_f32(value, bits)
 
 
 def decode_complex_unit(
@@ -148,7 +253,7 @@ def get_resource_by_id(
 
     assert found_resources is not None
 
-    return next(iter(found_resources[data].values()))
+    return found_resources.first(data)
 
 
 def decode_resource_reference(
@@ -198,7 +303,7 @@ def get_bag_type(resource: ARSCResourceBag):
 
 def get_bag_values(
     resource: ARSCResourceBag,
-    strings: List[str],
+    strings: Sequence[str],
     package_id_map: Optional[Dict[int, str]] = None,
     resources: Optional[ARSCResourcesMap] = None,
     reference_resources: Optional[ARSCResourcesMap] = None,
@@ -277,7 +382,7 @@ def decode_attr_enum(value: int, values: List[Tuple[str, int]]):
 def decode_attr_value(
     data: int,
     reference_resource_id: int,
-    strings: List[str],
+    strings: Sequence[str],
     package_id_map: Optional[Dict[int, str]] = None,
     resources: Optional[ARSCResourcesMap] = None,
     reference_resources: Optional[ARSCResourcesMap] = None,
@@ -311,10 +416,45 @@ def decode_attr_value(
     return None
 
 
+@cache
+def decode_plain_data(data_type: int, data: int):
+    # Only depend on the raw data, shared by all configs and APKs
+    match data_type:
+        case Res_value.TYPE_INT_DEC:
+            return bits_to_int32(data)
+
+        case Res_value.TYPE_INT_BOOLEAN:
+            return bool(data)
+
+        case Res_value.TYPE_FLOAT:
+            return bits_to_f32(data)
+
+        case Res_value.TYPE_DIMENSION:
+            return decode_dimension(data)
+
+        case Res_value.TYPE_FRACTION:
+            return decode_fraction(data)
+
+        case Res_value.TYPE_INT_COLOR_ARGB8:
+            return f'#{data:08x}'
+
+        case Res_value.TYPE_INT_COLOR_RGB8:
+            return f'#{data:06x}'
+
+        case Res_value.TYPE_INT_COLOR_ARGB4:
+            return f'#{data:04x}'
+
+        case Res_value.TYPE_INT_COLOR_RGB4:
+            return f'#{data:03x}'
+
+        case _:
+            return data
+
+
 def decode_data(
     data_type: int,
     data: int,
-    strings: List[str],
+    strings: Sequence[str],
     styles: Optional[ARSCAllStyles] = None,
     package_id_map: Optional[Dict[int, str]] = None,
     resources: Optional[ARSCResourcesMap] = None,
@@ -323,17 +463,10 @@ def decode_data(
     reference_package_id: Optional[int] = None,
     reference_resource_id: Optional[int] = None,
 ):
-    if data_type in (
-        Res_value.TYPE_INT_DEC,
-        Res_value.TYPE_INT_HEX,
-        Res_value.TYPE_INT_BOOLEAN,
-    ):
-        if data_type == Res_value.TYPE_INT_DEC:
-            data = bits_to_int32(data)
-        elif data_type == Res_value.TYPE_INT_BOOLEAN:
-            data = bool(data)
+    if data_type in PLAIN_DATA_TYPES:
+        data = decode_plain_data(data_type, data)
 
-        if reference_resource_id is not None:
+        if reference_resource_id is not None and data_type in INT_DATA_TYPES:
             decoded_data = decode_attr_value(
                 data,
                 reference_resource_id,
@@ -373,27 +506,6 @@ def decode_data(
         case Res_value.TYPE_STRING:
             return decode_string(data, strings, styles)
 
-        case Res_value.TYPE_FLOAT:
-            return bits_to_f32(data)
-
-        case Res_value.TYPE_DIMENSION:
-            return decode_dimension(data)
-
-        case Res_value.TYPE_FRACTION:
-            return decode_fraction(data)
-
-        case Res_value.TYPE_INT_COLOR_ARGB8:
-            return f'#{data:08x}'
-
-        case Res_value.TYPE_INT_COLOR_RGB8:
-            return f'#{data:06x}'
-
-        case Res_value.TYPE_INT_COLOR_ARGB4:
-            return f'#{data:04x}'
-
-        case Res_value.TYPE_INT_COLOR_RGB4:
-            return f'#{data:03x}'
-
         case _:
             assert False, f'{data_type:x}'
 
@@ -451,7 +563,7 @@ def stringify_data(
 
 def decode_value(
     resource: ARSCResourceValue,
-    strings: List[str],
+    strings: Sequence[str],
     resources: ARSCResourcesMap,
     styles: Optional[ARSCAllStyles] = None,
     package_id_map: Optional[Dict[int, str]] = None,
@@ -473,7 +585,7 @@ def decode_value(
 
 def decode_bag_items(
     resource: ARSCResourceBag,
-    strings: List[str],
+    strings: Sequence[str],
     styles: ARSCAllStyles,
     package_id_map: Dict[int, str],
     resources: ARSCResourcesMap,
@@ -523,7 +635,7 @@ def decode_bag_items(
 
 def get_self_referencing_raw_resource(
     resource: ARSCResource,
-    strings: List[str],
+    strings: Sequence[str],
     resources: ARSCResourcesMap,
 ):
     if not isinstance(resource, ARSCResourceValue):
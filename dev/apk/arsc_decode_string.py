@@ -4,7 +4,7 @@
 import itertools
 import re
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Set, Tuple, Union
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
 
 from apk.arsc_resources import ARSCAllStyles, ARSCStyles
 
@@ -107,7 +107,7 @@ def decode_string_with_styles(value: str, styles: ARSCStyles):
 
 def decode_string(
     data: int,
-    strings: List[str],
+    strings: Sequence[str],
     styles: Optional[ARSCAllStyles] = None,
 ):
     value = strings[data]
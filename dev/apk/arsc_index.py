@@ -0,0 +1,258 @@
+# SPDX-FileCopyrightText: The LineageOS Project
+# SPDX-License-Identifier: Apache-2.0
+
+import hashlib
+import os
+import pickle
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from apk.arsc_config import decode_config_key
+from apk.arsc_decode import (
+    decode_data,
+    is_resource_id_array_item,
+    split_resource_id,
+    stringify_data,
+)
+from apk.arsc_resources import (
+    REFERENCE_DATA_TYPES,
+    ARSCAllStyles,
+    ARSCResourceBag,
+    ARSCResourcesMap,
+    ARSCResourceValue,
+)
+from apk.resource_types import Res_value
+
+RESOURCE_INDEX_VERSION = 1
+
+
+class IndexedValue(NamedTuple):
+    data_type: int
+    data: int
+    # Decoded value, None for references, which are only named when queried
+    # since they can point into other tables
+    text: Optional[str]
+
+
+class IndexedResource(NamedTuple):
+    config: str
+    # Set for values
+    value: Optional[IndexedValue]
+    # Set for bags, parent is 0 if the bag has none
+    parent_resource_id: int
+    items: List[Tuple[int, IndexedValue]]
+
+
+class ResourceIndex:
+    def __init__(self, package_id_map: Dict[int, str]):
+        self.package_id_map = package_id_map
+        # type/name of the resources of the table
+        self.names: Dict[int, str] = {}
+        self.ids: Dict[str, int] = {}
+        self.resources: Dict[int, List[IndexedResource]] = {}
+        # Referencing to referenced resources, and the other way around
+        self.references: Dict[int, List[int]] = {}
+        self.referenced_by: Dict[int, List[int]] = {}
+
+    def find(self, name: str) -> Optional[int]:
+        # Accepts ids and names with an optional sign and package, such as
+        # 0x7f010000, @bool/config_x or android:string/ok
+        if name.startswith('0x'):
+            return int(name, 16)
+
+        name = name.lstrip('@?')
+
+        package_name, sep, type_name = name.rpartition(':')
+
+        resource_id = self.ids.get(type_name)
+        if resource_id is None or not sep:
+            return resource_id
+
+        # The package map also names the packages of other tables, such as
+        # android for apps, only match resources of the named package
+        resource_package_id, _, _ = split_resource_id(resource_id)
+        if self.package_id_map.get(resource_package_id) != package_name:
+            return None
+
+        return resource_id
+
+    def reference_name(
+        self,
+        resource_id: int,
+        package_id: int,
+        reference_index: Optional['ResourceIndex'] = None,
+    ):
+        for index in (self, reference_index):
+            if index is None or resource_id not in index.names:
+                continue
+
+            name = index.names[resource_id]
+            resource_package_id, _, _ = split_resource_id(resource_id)
+            if resource_package_id == package_id:
+                return name
+
+            package_name = index.package_id_map.get(resource_package_id)
+            if package_name is None:
+                return name
+
+            return f'{package_name}:{name}'
+
+        return f'0x{resource_id:08x}'
+
+
+def index_value(
+    data_type: int,
+    data: int,
+    strings: Sequence[str],
+    styles: ARSCAllStyles,
+):
+    if data_type in REFERENCE_DATA_TYPES:
+        return IndexedValue(data_type, data, None)
+
+    value = decode_data(data_type, data, strings, styles=styles)
+    return IndexedValue(data_type, data, stringify_data(value, data_type))
+
+
+def build_resource_index(
+    strings: Sequence[str],
+    styles: ARSCAllStyles,
+    resources: ARSCResourcesMap,
+    package_id_map: Dict[int, str],
+):
+    index = ResourceIndex(package_id_map)
+
+    for resource_id, resource_configs_map in resources.items():
+        indexed_resources: List[IndexedResource] = []
+
+        for config_key, resource in resource_configs_map.items():
+            config = decode_config_key(config_key)
+
+            if isinstance(resource, ARSCResourceValue):
+                indexed_resource = IndexedResource(
+                    config,
+                    index_value(
+                        resource.data_type,
+                        resource.data,
+                        strings,
+                        styles,
+                    ),
+                    0,
+                    [],
+                )
+            elif isinstance(resource, ARSCResourceBag):
+                indexed_resource = IndexedResource(
+                    config,
+                    None,
+                    resource.parent_resource_id,
+                    [
+                        (
+                            item.resource_id,
+                            index_value(
+                                item.data_type,
+                                item.data,
+                                strings,
+                                styles,
+                            ),
+                        )
+                        for item in resource.items
+                    ],
+                )
+            else:
+                assert False, resource
+
+            indexed_resources.append(indexed_resource)
+
+        name = f'{resource.type_name}/{resource.key_name}'
+        index.names[resource_id] = name
+        index.ids[name] = resource_id
+        index.resources[resource_id] = indexed_resources
+
+        referenced_resource_ids: Set[int] = {
+            referenced_resource_id
+            for referenced_resource_id in resources.referenced_resource_ids(
+                [resource_id]
+            )
+            if referenced_resource_id
+            and referenced_resource_id != resource_id
+            and not is_resource_id_array_item(referenced_resource_id)
+        }
+        index.references[resource_id] = sorted(referenced_resource_ids)
+
+        for referenced_resource_id in referenced_resource_ids:
+            index.referenced_by.setdefault(referenced_resource_id, []).append(
+                resource_id
+            )
+
+    for referencing_resource_ids in index.referenced_by.values():
+        referencing_resource_ids.sort()
+
+    return index
+
+
+def format_indexed_value(
+    value: IndexedValue,
+    package_id: int,
+    index: ResourceIndex,
+    reference_index: Optional[ResourceIndex] = None,
+):
+    if value.text is not None:
+        return value.text
+
+    if value.data == Res_value.DATA_NULL_UNDEFINED:
+        return '@null'
+
+    if value.data == Res_value.DATA_NULL_EMPTY:
+        return '@empty'
+
+    sign = '@'
+    if value.data_type in (
+        Res_value.TYPE_ATTRIBUTE,
+        Res_value.TYPE_DYNAMIC_ATTRIBUTE,
+    ):
+        sign = '?'
+
+    name = index.reference_name(value.data, package_id, reference_index)
+    return f'{sign}{name}'
+
+
+def get_resource_index_path(cache_dir: Path, arsc: bytes | memoryview):
+    digest = hashlib.sha256(arsc).hexdigest()
+    return Path(cache_dir, f'{digest}.index')
+
+
+def save_resource_index(index_path: Path, index: ResourceIndex):
+    # Pickled as is rather than in a dedicated format, loading it back does
+    # not decode any value again
+    # Same as the reference tables, replace the file at once
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = index_path.with_name(f'{index_path.name}.{os.getpid()}.tmp')
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(
+            (RESOURCE_INDEX_VERSION, index),
+            f,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+    os.replace(tmp_path, index_path)
+
+
+def load_resource_index(index_path: Path) -> Optional[ResourceIndex]:
+    try:
+        with open(index_path, 'rb') as f:
+            data = pickle.load(f)
+    except Exception:
+        # Same as the reference tables, stale or corrupt indexes are built
+        # again
+        return None
+
+    if (
+        not isinstance(data, tuple)
+        or len(data) != 2
+        or data[0] != RESOURCE_INDEX_VERSION
+    ):
+        return None
+
+    _, index = data
+    if not isinstance(index, ResourceIndex):
+        return None
+
+    return index
@@ -1,18 +1,22 @@
 # SPDX-FileCopyrightText: The LineageOS Project
 # SPDX-License-Identifier: Apache-2.0
 
-import ctypes
-from typing import Dict, List, Optional, Set, Tuple
-
-from apk.arsc_decode import (
-    get_resource_by_id,
-    get_self_referencing_raw_resource,
+import re
+from typing import (
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
 )
+
+from apk.arsc_decode import get_self_referencing_raw_resource
 from apk.arsc_resources import (
-    ARSCResourceBag,
-    ARSCResourceBagItem,
     ARSCResourcesMap,
-    ARSCResourceValue,
+    ARSCResourceTable,
     to_resource_id,
 )
 from apk.parse import (
@@ -22,122 +26,130 @@ from apk.parse import (
 )
 from apk.resource_types import (
     APP_PACKAGE_ID,
+    RES_CHUNK_HEADER,
     RES_STRING_POOL_TYPE,
+    RES_TABLE_ENTRY_COMPACT,
+    RES_TABLE_MAP,
+    RES_TABLE_MAP_ENTRY,
     RES_TABLE_PACKAGE_TYPE,
     RES_TABLE_STAGED_ALIAS_TYPE,
     RES_TABLE_TYPE,
     RES_TABLE_TYPE_SPEC_TYPE,
     RES_TABLE_TYPE_TYPE,
+    RES_VALUE,
     SYS_PACKAGE_ID,
     Res_value,
     ResTable_entry,
     ResTable_header,
-    ResTable_map,
-    ResTable_map_entry,
     ResTable_package,
-    ResTable_sparseTypeEntry,
     ResTable_type,
     ResTable_typeSpec,
 )
 from apk.utils import u16_array_to_str
-from utils.struct_utils import cast_struct, read_struct
+from utils.struct_utils import read_struct
+from utils.tree_index import compile_name_patterns
 
 
 def parse_entry_offset(
-    table_package: ResTable_package,
-    table_type: ResTable_type,
-    type_names: List[str],
-    key_names: List[str],
-    package_name: str,
+    resources: ARSCResourcesMap,
+    resource_id: int,
+    config_index: int,
     data: memoryview,
     entry_offset: int,
-    entry_id: int,
 ):
-    assert isinstance(table_type.id, int)
-    type_name = type_names[table_type.id - 1]
-
-    entry, _ = read_struct(
-        ResTable_entry.Compact,
+    # Full and compact entries share the flags, the other fields are
+    # size, key for full entries and key, data for compact ones
+    first, flags, last = RES_TABLE_ENTRY_COMPACT.unpack_from(
         data,
         entry_offset,
     )
 
-    def _create(
-        key_id: int,
-        data_type: int,
-        data: int,
-    ):
-        assert isinstance(key_id, int)
-
-        return ARSCResourceValue(
-            package_id=table_package.id,
-            type_id=table_type.id,
-            entry_id=entry_id,
-            key_id=key_id,
-            type_name=type_name,
-            key_name=key_names[key_id],
-            data_type=data_type,
-            data=data,
-            config=table_type.config,
-        )
-
-    if entry.flags & ResTable_entry.FLAG_COMPACT:
-        assert not (entry.flags & ResTable_entry.FLAG_COMPLEX)
-
-        data_type = (entry.flags >> 8) & 0xFF
-        entry_data = entry.data
+    if flags & ResTable_entry.FLAG_COMPACT:
+        assert not (flags & ResTable_entry.FLAG_COMPLEX)
 
-        assert isinstance(entry.key, int)
+        data_type = (flags >> 8) & 0xFF
 
-        return _create(entry.key, data_type, entry_data)
-    elif entry.flags & ResTable_entry.FLAG_COMPLEX:
-        entry, _ = read_struct(ResTable_map_entry, data, entry_offset)
+        resources.add_value(resource_id, config_index, first, data_type, last)
+    elif flags & ResTable_entry.FLAG_COMPLEX:
+        size, _, key, parent, count = RES_TABLE_MAP_ENTRY.unpack_from(
+            data,
+            entry_offset,
+        )
 
-        items: List[ARSCResourceBagItem] = [None] * entry.count
-        map_entries_offset = entry_offset + entry.size
-        for i in range(entry.count):
-            map_entry, map_entries_offset = read_struct(
-                ResTable_map,
-                data,
-                map_entries_offset,
-            )
-            item = ARSCResourceBagItem(
-                resource_id=map_entry.name,
-                data_type=map_entry.value.dataType,
-                data=map_entry.value.data,
-            )
-            items[i] = item
-
-        assert isinstance(entry.key, int)
-
-        return ARSCResourceBag(
-            package_id=table_package.id,
-            type_id=table_type.id,
-            entry_id=entry_id,
-            key_id=entry.key,
-            type_name=type_name,
-            key_name=key_names[entry.key],
-            config=table_type.config,
-            parent_resource_id=entry.parent,
-            items=items,
+        map_items = RES_TABLE_MAP.iter_unpack(data, entry_offset + size, count)
+        items = (
+            (name, data_type, item_data)
+            for name, _, _, data_type, item_data in map_items
         )
+
+        resources.add_bag(resource_id, config_index, key, parent, items)
     else:
-        entry = cast_struct(ResTable_entry.Full, entry)
-        assert not entry.flags
+        assert not flags
 
-        entry_value_offset = entry_offset + entry.size
-        entry_value, _ = read_struct(
-            Res_value,
+        _, _, data_type, value_data = RES_VALUE.unpack_from(
             data,
-            entry_value_offset,
+            entry_offset + first,
         )
 
-        data_type = entry_value.dataType
-        entry_data = entry_value.data
+        resources.add_value(
+            resource_id,
+            config_index,
+            last,
+            data_type,
+            value_data,
+        )
 
-        assert isinstance(entry.key, int)
 
-        return _create(entry.key, data_type, entry_data)
+def parse_table_type_entries(
+    data: memoryview,
+    offset: int,
+    table_type: ResTable_type,
+    entry_ids: Optional[Set[int]] = None,
+) -> List[Tuple[int, int]]:
+    # Offset tables are read in bulk, only the ids and the offsets relative
+    # to the entries start of the present entries are returned
+    entries_offsets_start = offset + table_type.header.headerSize
+    entries_offsets_end = offset + table_type.entriesStart
+
+    if table_type.flags & ResTable_type.FLAG_SPARSE:
+        sparse_entries = data[entries_offsets_start:entries_offsets_end]
+        sparse_entries = sparse_entries.cast('H').tolist()
+
+        return [
+            (entry_id, relative_offset * 4)
+            for entry_id, relative_offset in zip(
+                sparse_entries[0::2],
+                sparse_entries[1::2],
+            )
+            if entry_ids is None or entry_id in entry_ids
+        ]
+
+    offsets_size = 4
+    offsets_format = 'I'
+    no_entry = ResTable_type.NO_ENTRY
+    multiplier = 1
+    if table_type.flags & ResTable_type.FLAG_OFFSET16:
+        offsets_size = 2
+        offsets_format = 'H'
+        no_entry = ResTable_type.NO_ENTRY16
+        multiplier = 4
+
+    entries_count = table_type.entryCount
+    offsets_end = entries_offsets_start + entries_count * offsets_size
+    offsets = data[entries_offsets_start:offsets_end].cast(offsets_format)
+
+    if entry_ids is not None:
+        return [
+            (entry_id, offsets[entry_id] * multiplier)
+            for entry_id in sorted(entry_ids)
+            if entry_id < entries_count and offsets[entry_id] != no_entry
+        ]
+
+    return [
+        (entry_id, relative_offset * multiplier)
+        for entry_id, relative_offset in enumerate(offsets.tolist())
+        if relative_offset != no_entry
+    ]
 
 
 def parse_table_type(
@@ -146,9 +158,7 @@ def parse_table_type(
     offset: int,
     size: int,
     resources: ARSCResourcesMap,
-    type_names: List[str],
-    key_names: List[str],
-    package_name: str,
+    type_entry_ids: Optional[Dict[int, Set[int]]] = None,
 ):
     table_type, _ = read_struct(
         ResTable_type,
@@ -159,63 +169,31 @@ def parse_table_type(
 
     assert table_type.reserved == 0
 
-    is_off16 = table_type.flags & ResTable_type.FLAG_OFFSET16
-    is_sparse = table_type.flags & ResTable_type.FLAG_SPARSE
+    entry_ids = None
+    if type_entry_ids is not None:
+        entry_ids = type_entry_ids.get(table_type.id)
+        if not entry_ids:
+            return
+
+    config_index = resources.add_config(table_type.config)
+    type_resource_id = to_resource_id(table_package.id, table_type.id, 0)
+
     entries_start_offset = offset + table_type.entriesStart
     entries_data = data[entries_start_offset:]
 
-    def _parse(entry_offset: int, entry_id: int):
-        resource = parse_entry_offset(
-            table_package,
-            table_type,
-            type_names,
-            key_names,
-            package_name,
+    for entry_id, entry_offset in parse_table_type_entries(
+        data,
+        offset,
+        table_type,
+        entry_ids,
+    ):
+        parse_entry_offset(
+            resources,
+            type_resource_id | entry_id,
+            config_index,
             entries_data,
             entry_offset,
-            entry_id,
         )
-        resource_configs_map = resources.setdefault(resource.resource_id, {})
-        assert resource.resource_id not in resource_configs_map, resource
-        resource_configs_map[resource.config_key] = resource
-
-    if is_sparse:
-        entries_offsets_start = offset + table_type.header.headerSize
-        entries_offsets_end = offset + table_type.entriesStart
-        entries_offsets_size = entries_offsets_end - entries_offsets_start
-        entry_size = ctypes.sizeof(ResTable_sparseTypeEntry)
-        entries_count = entries_offsets_size // entry_size
-
-        for _ in range(entries_count):
-            sparse_type_entry, entries_offsets_start = read_struct(
-                ResTable_sparseTypeEntry,
-                data,
-                entries_offsets_start,
-            )
-
-            _parse(sparse_type_entry.offset * 4, sparse_type_entry.idx)
-    else:
-        offsets_size = 4
-        no_entry = ResTable_type.NO_ENTRY
-        multiplier = 1
-        if is_off16:
-            no_entry = ResTable_type.NO_ENTRY16
-            offsets_size = 2
-            multiplier = 4
-
-        i = 0
-        entries_count = table_type.entryCount
-        entries_offsets_start = offset + table_type.header.headerSize
-
-        for relative_offset in iter_uint(
-            data,
-            entries_offsets_start,
-            entries_count,
-            offsets_size,
-        ):
-            if relative_offset != no_entry:
-                _parse(relative_offset * multiplier, i)
-            i += 1
 
 
 def parse_table_spec_type(
@@ -251,6 +229,7 @@ def parse_table_package(
     offset: int,
     resources: ARSCResourcesMap,
     flags: Dict[int, int],
+    package_type_entry_ids: Optional[Dict[int, Dict[int, Set[int]]]] = None,
 ):
     table_package, _ = read_struct(
         ResTable_package,
@@ -258,6 +237,10 @@ def parse_table_package(
         offset,
     )
 
+    type_entry_ids = None
+    if package_type_entry_ids is not None:
+        type_entry_ids = package_type_entry_ids.get(table_package.id, {})
+
     package_name = u16_array_to_str(table_package.name)
 
     # TODO: parse RES_TABLE_LIBRARY_TYPE
@@ -278,6 +261,8 @@ def parse_table_package(
         key_pool_chunk_start,
     )
 
+    resources.add_package(table_package.id, type_names, key_names)
+
     package_children_start = offset + table_package.header.headerSize
     package_chunk_end = offset + table_package.header.size
 
@@ -301,9 +286,7 @@ def parse_table_package(
                 chunk_offset,
                 chunk_header.headerSize,
                 resources,
-                type_names,
-                key_names,
-                package_name,
+                type_entry_ids,
             )
         elif chunk_header.type == RES_TABLE_TYPE_SPEC_TYPE:
             parse_table_spec_type(
@@ -322,7 +305,30 @@ def parse_table_package(
     return package_id_map
 
 
-def arsc_parse(data: bytes):
+def group_entry_ids(resource_ids: Iterable[int]):
+    package_type_entry_ids: Dict[int, Dict[int, Set[int]]] = {}
+
+    for resource_id in resource_ids:
+        type_entry_ids = package_type_entry_ids.setdefault(
+            (resource_id >> 24) & 0xFF,
+            {},
+        )
+        entry_ids = type_entry_ids.setdefault((resource_id >> 16) & 0xFF, set())
+        entry_ids.add(resource_id & 0xFFFF)
+
+    return package_type_entry_ids
+
+
+def arsc_parse(
+    data: bytes | memoryview,
+    resource_ids: Optional[Iterable[int]] = None,
+):
+    # If resource ids are passed, only their entries are decoded, the
+    # string pools and the flags are still parsed in full
+    package_type_entry_ids = None
+    if resource_ids is not None:
+        package_type_entry_ids = group_entry_ids(resource_ids)
+
     mm = memoryview(data)
     offset = 0
 
@@ -338,9 +344,9 @@ def arsc_parse(data: bytes):
         )
 
     num_res_table_package = 0
-    strings: Optional[List[str]] = None
+    strings: Optional[Sequence[str]] = None
     styles: Optional[List[List[Tuple[str, int, int]]]] = []
-    resources: ARSCResourcesMap = {}
+    resources = ARSCResourceTable()
     flags: Dict[int, int] = {}
     package_id_map: Dict[int, str] = {}
 
@@ -360,6 +366,7 @@ def arsc_parse(data: bytes):
                 chunk_offset,
                 resources,
                 flags,
+                package_type_entry_ids,
             )
             num_res_table_package += 1
         else:
@@ -371,19 +378,214 @@ def arsc_parse(data: bytes):
     return strings, styles, resources, flags, package_id_map
 
 
+def find_package_resource_ids(
+    data: memoryview,
+    offset: int,
+    type_pattern: Optional[re.Pattern[str]],
+    name_pattern: Optional[re.Pattern[str]],
+    resource_ids: Set[int],
+):
+    table_package, _ = read_struct(
+        ResTable_package,
+        data,
+        offset,
+    )
+
+    type_names, _ = parse_string_pool(
+        data,
+        offset + table_package.typeStrings,
+    )
+    key_names, _ = parse_string_pool(
+        data,
+        offset + table_package.keyStrings,
+    )
+
+    # Matched once per type, key and entry instead of once per config
+    type_matches: Dict[int, bool] = {}
+    key_matches: Dict[int, bool] = {}
+    type_checked_entry_ids: Dict[int, Set[int]] = {}
+
+    for chunk_offset, chunk_header in iter_child_chunks(
+        data,
+        offset + table_package.header.headerSize,
+        offset + table_package.header.size,
+    ):
+        if chunk_header.type != RES_TABLE_TYPE_TYPE:
+            continue
+
+        # The type id follows the chunk header, the types that do not match
+        # are skipped without reading the rest of their header
+        type_id = data[chunk_offset + RES_CHUNK_HEADER.size]
+        type_match = type_matches.get(type_id)
+        if type_match is None:
+            type_match = (
+                type_pattern is None
+                or type_pattern.match(type_names[type_id - 1]) is not None
+            )
+            type_matches[type_id] = type_match
+
+        if not type_match:
+            continue
+
+        table_type, _ = read_struct(
+            ResTable_type,
+            data,
+            chunk_offset,
+            chunk_header.headerSize,
+        )
+
+        checked_entry_ids = type_checked_entry_ids.setdefault(type_id, set())
+        entry_offsets = dict(
+            parse_table_type_entries(data, chunk_offset, table_type)
+        )
+        new_entry_ids = entry_offsets.keys() - checked_entry_ids
+        checked_entry_ids |= new_entry_ids
+
+        type_resource_id = to_resource_id(table_package.id, type_id, 0)
+        entries_start_offset = chunk_offset + table_type.entriesStart
+
+        for entry_id in new_entry_ids:
+            if name_pattern is None:
+                resource_ids.add(type_resource_id | entry_id)
+                continue
+
+            # Same fields as in parse_entry_offset(), the key is the first
+            # field of compact entries and the last one of full entries
+            first, flags, last = RES_TABLE_ENTRY_COMPACT.unpack_from(
+                data,
+                entries_start_offset + entry_offsets[entry_id],
+            )
+            key_id = first if flags & ResTable_entry.FLAG_COMPACT else last
+
+            key_match = key_matches.get(key_id)
+            if key_match is None:
+                key_match = name_pattern.match(key_names[key_id]) is not None
+                key_matches[key_id] = key_match
+
+            if key_match:
+                resource_ids.add(type_resource_id | entry_id)
+
+
+def find_resource_ids(
+    data: memoryview,
+    type_names: Optional[FrozenSet[str]] = None,
+    resource_names: Optional[FrozenSet[str]] = None,
+):
+    type_pattern = None
+    if type_names is not None:
+        type_pattern = compile_name_patterns(type_names)
+
+    name_pattern = None
+    if resource_names is not None:
+        name_pattern = compile_name_patterns(resource_names)
+
+    table_header, offset = read_struct(ResTable_header, data)
+
+    resource_ids: Set[int] = set()
+    for chunk_offset, chunk_header in iter_child_chunks(
+        data,
+        offset,
+        table_header.header.size,
+    ):
+        if chunk_header.type == RES_TABLE_PACKAGE_TYPE:
+            find_package_resource_ids(
+                data,
+                chunk_offset,
+                type_pattern,
+                name_pattern,
+                resource_ids,
+            )
+
+    return resource_ids
+
+
+def parse_resource_entries(
+    data: memoryview,
+    resources: ARSCResourcesMap,
+    resource_ids: Iterable[int],
+):
+    # Decode more entries into an already parsed table, the string pools and
+    # the flags are not parsed again
+    package_type_entry_ids = group_entry_ids(resource_ids)
+
+    table_header, offset = read_struct(ResTable_header, data)
+
+    for package_offset, package_header in iter_child_chunks(
+        data,
+        offset,
+        table_header.header.size,
+    ):
+        if package_header.type != RES_TABLE_PACKAGE_TYPE:
+            continue
+
+        table_package, _ = read_struct(ResTable_package, data, package_offset)
+
+        type_entry_ids = package_type_entry_ids.get(table_package.id)
+        if not type_entry_ids:
+            continue
+
+        for chunk_offset, chunk_header in iter_child_chunks(
+            data,
+            package_offset + table_package.header.headerSize,
+            package_offset + table_package.header.size,
+        ):
+            if chunk_header.type == RES_TABLE_TYPE_TYPE:
+                parse_table_type(
+                    table_package,
+                    data,
+                    chunk_offset,
+                    chunk_header.headerSize,
+                    resources,
+                    type_entry_ids,
+                )
+
+
+def arsc_parse_names(
+    data: bytes | memoryview,
+    type_names: Optional[FrozenSet[str]] = None,
+    resource_names: Optional[FrozenSet[str]] = None,
+):
+    # Decode the resources matching both the type and the resource name
+    # patterns, and the resources of the table they reference, transitively
+    mm = memoryview(data)
+    resource_ids = find_resource_ids(mm, type_names, resource_names)
+
+    parsed = arsc_parse(mm, resource_ids)
+    _, _, resources, flags, _ = parsed
+
+    found_resource_ids = resource_ids
+    new_resource_ids = resource_ids
+    while True:
+        # Flags cover all the entries of the table, references to other
+        # tables are left to the reference resources
+        new_resource_ids = {
+            resource_id
+            for resource_id in resources.referenced_resource_ids(
+                new_resource_ids
+            )
+            if resource_id in flags and resource_id not in found_resource_ids
+        }
+        if not new_resource_ids:
+            break
+
+        parse_resource_entries(mm, resources, new_resource_ids)
+        found_resource_ids = found_resource_ids | new_resource_ids
+
+    if found_resource_ids is resource_ids:
+        return parsed
+
+    # Referenced resources were appended as they were found, decode them
+    # all again in the order of the table
+    return arsc_parse(mm, found_resource_ids)
+
+
 def get_resources_referenced_names(
     resources: ARSCResourcesMap,
-    strings: List[str],
+    strings: Sequence[str],
 ):
     referenced_names: Set[str] = set()
 
-    for resource_id in sorted(resources.keys()):
-        resource = get_resource_by_id(
-            resource_id,
-            resources,
-            None,
-        )
-
+    for resource in resources.first_values_of_type(Res_value.TYPE_STRING):
         referenced_name = get_self_referencing_raw_resource(
             resource,
             strings,
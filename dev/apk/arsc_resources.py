@@ -1,11 +1,21 @@
 # SPDX-FileCopyrightText: The LineageOS Project
 # SPDX-License-Identifier: Apache-2.0
 
-from typing import Dict, List, Optional, Tuple
+from array import array
+from typing import (
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 
-from apk.resource_types import ResTable_config
+from apk.resource_types import Res_value, ResTable_config
 
-ARSCResourcesMap = Dict[int, Dict[bytes, 'ARSCResource']]
 ARSCStyles = List[Tuple[str, int, int]]
 ARSCAllStyles = List[ARSCStyles]
 
@@ -173,3 +183,312 @@ class ARSCResourceBag(ARSCResource):
             f'  ],\n'
             f'}}\n'
         )
+
+
+NO_ROW = -1
+
+REFERENCE_DATA_TYPES = {
+    Res_value.TYPE_REFERENCE,
+    Res_value.TYPE_ATTRIBUTE,
+    Res_value.TYPE_DYNAMIC_REFERENCE,
+    Res_value.TYPE_DYNAMIC_ATTRIBUTE,
+}
+
+
+class ARSCResourceTable:
+    # Resources are stored in parallel arrays, one row per resource config,
+    # bag items are flattened into their own arrays, the resource objects are
+    # only created when looked up
+    def __init__(self):
+        self.__configs: List[ResTable_config] = []
+        self.__config_indices: Dict[bytes, int] = {}
+        self.__type_names: Dict[int, Sequence[str]] = {}
+        self.__key_names: Dict[int, Sequence[str]] = {}
+
+        self.__resource_ids = array('I')
+        self.__config_index = array('I')
+        self.__key_ids = array('I')
+        self.__data_types = array('B')
+        # Data of values, parent resource id of bags
+        self.__data = array('I')
+        # Start of the items of bags, NO_ROW for values
+        self.__items_start = array('i')
+        self.__items_count = array('I')
+        # Next config of the same resource
+        self.__next_rows = array('i')
+
+        self.__item_resource_ids = array('I')
+        self.__item_data_types = array('B')
+        self.__item_data = array('I')
+
+        # First and last config of each resource, in insertion order
+        self.__first_rows: Dict[int, int] = {}
+        self.__last_rows: Dict[int, int] = {}
+
+        # References are decoded by looking up the same few resources
+        self.__first_resources: Dict[int, ARSCResource] = {}
+
+    def add_package(
+        self,
+        package_id: int,
+        type_names: Sequence[str],
+        key_names: Sequence[str],
+    ):
+        self.__type_names[package_id] = type_names
+        self.__key_names[package_id] = key_names
+
+    def add_config(self, config: ResTable_config):
+        config_key = bytes(config)
+
+        config_index = self.__config_indices.get(config_key)
+        if config_index is None:
+            config_index = len(self.__configs)
+            self.__configs.append(ResTable_config.from_buffer_copy(config_key))
+            self.__config_indices[config_key] = config_index
+
+        return config_index
+
+    def __add_row(
+        self,
+        resource_id: int,
+        config_index: int,
+        key_id: int,
+        data_type: int,
+        data: int,
+        items_start: int,
+        items_count: int,
+    ):
+        row = len(self.__resource_ids)
+
+        self.__resource_ids.append(resource_id)
+        self.__config_index.append(config_index)
+        self.__key_ids.append(key_id)
+        self.__data_types.append(data_type)
+        self.__data.append(data)
+        self.__items_start.append(items_start)
+        self.__items_count.append(items_count)
+        self.__next_rows.append(NO_ROW)
+
+        last_row = self.__last_rows.get(resource_id)
+        if last_row is None:
+            self.__first_rows[resource_id] = row
+        else:
+            self.__next_rows[last_row] = row
+        self.__last_rows[resource_id] = row
+
+    def add_value(
+        self,
+        resource_id: int,
+        config_index: int,
+        key_id: int,
+        data_type: int,
+        data: int,
+    ):
+        self.__add_row(
+            resource_id,
+            config_index,
+            key_id,
+            data_type,
+            data,
+            NO_ROW,
+            0,
+        )
+
+    def add_bag(
+        self,
+        resource_id: int,
+        config_index: int,
+        key_id: int,
+        parent_resource_id: int,
+        items: Iterable[Tuple[int, int, int]],
+    ):
+        items_start = len(self.__item_resource_ids)
+
+        for item_resource_id, item_data_type, item_data in items:
+            self.__item_resource_ids.append(item_resource_id)
+            self.__item_data_types.append(item_data_type)
+            self.__item_data.append(item_data)
+
+        self.__add_row(
+            resource_id,
+            config_index,
+            key_id,
+            0,
+            parent_resource_id,
+            items_start,
+            len(self.__item_resource_ids) - items_start,
+        )
+
+    def __resource(self, row: int) -> ARSCResource:
+        resource_id = self.__resource_ids[row]
+        package_id = resource_id >> 24
+        type_id = (resource_id >> 16) & 0xFF
+        key_id = self.__key_ids[row]
+        type_name = self.__type_names[package_id][type_id - 1]
+        key_name = self.__key_names[package_id][key_id]
+        config = self.__configs[self.__config_index[row]]
+
+        items_start = self.__items_start[row]
+        if items_start == NO_ROW:
+            return ARSCResourceValue(
+                package_id=package_id,
+                type_id=type_id,
+                entry_id=resource_id & 0xFFFF,
+                key_id=key_id,
+                type_name=type_name,
+                key_name=key_name,
+                config=config,
+                data_type=self.__data_types[row],
+                data=self.__data[row],
+            )
+
+        items_end = items_start + self.__items_count[row]
+        items = [
+            ARSCResourceBagItem(
+                resource_id=self.__item_resource_ids[i],
+                data_type=self.__item_data_types[i],
+                data=self.__item_data[i],
+            )
+            for i in range(items_start, items_end)
+        ]
+
+        return ARSCResourceBag(
+            package_id=package_id,
+            type_id=type_id,
+            entry_id=resource_id & 0xFFFF,
+            key_id=key_id,
+            type_name=type_name,
+            key_name=key_name,
+            config=config,
+            parent_resource_id=self.__data[row],
+            items=items,
+        )
+
+    def __iter_rows(self, resource_id: int):
+        row = self.__first_rows[resource_id]
+        while row != NO_ROW:
+            yield row
+            row = self.__next_rows[row]
+
+    def __len__(self):
+        return len(self.__first_rows)
+
+    def __contains__(self, resource_id: int):
+        return resource_id in self.__first_rows
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.__first_rows)
+
+    def keys(self):
+        return self.__first_rows.keys()
+
+    def __getitem__(self, resource_id: int) -> Dict[bytes, ARSCResource]:
+        resource_configs_map: Dict[bytes, ARSCResource] = {}
+        for row in self.__iter_rows(resource_id):
+            resource = self.__resource(row)
+            resource_configs_map[resource.config_key] = resource
+
+        return resource_configs_map
+
+    def items(self):
+        for resource_id in self.__first_rows:
+            yield resource_id, self[resource_id]
+
+    def first(self, resource_id: int) -> ARSCResource:
+        resource = self.__first_resources.get(resource_id)
+        if resource is None:
+            resource = self.__resource(self.__first_rows[resource_id])
+            self.__first_resources[resource_id] = resource
+
+        return resource
+
+    def first_values_of_type(
+        self,
+        data_type: int,
+    ) -> Generator[ARSCResourceValue, None, None]:
+        # Filter on the columns first, only the matching rows are built
+        items_start = self.__items_start
+        data_types = self.__data_types
+
+        for row in self.__first_rows.values():
+            if items_start[row] != NO_ROW or data_types[row] != data_type:
+                continue
+
+            resource = self.__resource(row)
+            assert isinstance(resource, ARSCResourceValue)
+            yield resource
+
+    def referenced_resource_ids(self, resource_ids: Iterable[int]):
+        # Resources referenced by values, parents and items of bags, in all
+        # configs of the given resources
+        referenced_resource_ids: Set[int] = set()
+
+        for resource_id in resource_ids:
+            if resource_id not in self.__first_rows:
+                continue
+
+            for row in self.__iter_rows(resource_id):
+                items_start = self.__items_start[row]
+                if items_start == NO_ROW:
+                    if self.__data_types[row] in REFERENCE_DATA_TYPES:
+                        referenced_resource_ids.add(self.__data[row])
+                    continue
+
+                # Parent, 0 if the bag has none
+                referenced_resource_ids.add(self.__data[row])
+
+                for i in range(
+                    items_start,
+                    items_start + self.__items_count[row],
+                ):
+                    referenced_resource_ids.add(self.__item_resource_ids[i])
+                    if self.__item_data_types[i] in REFERENCE_DATA_TYPES:
+                        referenced_resource_ids.add(self.__item_data[i])
+
+        return referenced_resource_ids
+
+    def first_configs(self):
+        # Resources of a reference table are only looked up by id, and only
+        # their first config is used
+        table = ARSCResourceTable()
+        table.__type_names = self.__type_names
+        table.__key_names = self.__key_names
+
+        config_indices: Dict[int, int] = {}
+
+        for row in self.__first_rows.values():
+            config_index = self.__config_index[row]
+            new_config_index = config_indices.get(config_index)
+            if new_config_index is None:
+                config = self.__configs[config_index]
+                new_config_index = table.add_config(config)
+                config_indices[config_index] = new_config_index
+
+            items_start = self.__items_start[row]
+            if items_start == NO_ROW:
+                table.add_value(
+                    self.__resource_ids[row],
+                    new_config_index,
+                    self.__key_ids[row],
+                    self.__data_types[row],
+                    self.__data[row],
+                )
+                continue
+
+            items_end = items_start + self.__items_count[row]
+            table.add_bag(
+                self.__resource_ids[row],
+                new_config_index,
+                self.__key_ids[row],
+                self.__data[row],
+                zip(
+                    self.__item_resource_ids[items_start:items_end],
+                    self.__item_data_types[items_start:items_end],
+                    self.__item_data[items_start:items_end],
+                ),
+            )
+
+        return table
+
+
+ARSCResourcesMap = ARSCResourceTable
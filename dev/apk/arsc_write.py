@@ -1,10 +1,14 @@
 # SPDX-FileCopyrightText: The LineageOS Project
 # SPDX-License-Identifier: Apache-2.0
 
+import io
+import multiprocessing
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Set
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
 
-from apk.arsc_config import decode_config
+from apk.arsc_config import decode_config_key
 from apk.arsc_decode import (
     decode_bag_items,
     decode_resource_reference,
@@ -22,7 +26,6 @@ from apk.arsc_resources import (
 )
 from apk.resource_types import (
     Res_value,
-    ResTable_config,
     # ResTable_typeSpec
 )
 
@@ -108,7 +111,7 @@ def get_bag_type_name(
 
 def resource_content_to_xml_str(
     resource: ARSCResource,
-    strings: List[str],
+    strings: Sequence[str],
     styles: ARSCAllStyles,
     package_id_map: Dict[int, str],
     resources: ARSCResourcesMap,
@@ -154,7 +157,7 @@ def resource_content_to_xml_str(
 
 def resource_to_xml_str(
     resource: ARSCResource,
-    strings: List[str],
+    strings: Sequence[str],
     styles: ARSCAllStyles,
     package_id_map: Dict[int, str],
     resources: ARSCResourcesMap,
@@ -250,8 +253,23 @@ def resource_to_xml_str(
     return resource_str
 
 
-def write_resources(
-    strings: List[str],
+def write_if_changed(file_path: Path, data: bytes):
+    # Keep the file and its mtime if the contents are the same, so that
+    # tools indexing the extracted resources by mtime skip it
+    try:
+        if file_path.stat().st_size == len(data):
+            if file_path.read_bytes() == data:
+                return
+    except FileNotFoundError:
+        pass
+
+    file_path.write_bytes(data)
+
+
+def write_config_resources(
+    config_key: bytes,
+    config_resources_map: Dict[str, List[ARSCResource]],
+    strings: Sequence[str],
     styles: ARSCAllStyles,
     package_id_map: Dict[int, str],
     resources: ARSCResourcesMap,
@@ -259,50 +277,155 @@ def write_resources(
     reference_flags: Dict[int, int],
     out_path: Path,
 ):
-    out_path.mkdir(parents=True, exist_ok=True)
+    config_str = decode_config_key(config_key)
 
-    grouped_resources = group_resources(resources)
+    values_name = 'values'
+    if config_str:
+        values_name += f'-{config_str}'
+
+    values_path = Path(out_path, values_name)
+    values_path.mkdir(parents=True, exist_ok=True)
+
+    written_paths = [values_path]
+
+    for type_name, type_resources in config_resources_map.items():
+        xml_name = type_name_to_xml_name(type_name)
+        xml_path = Path(values_path, xml_name)
+
+        o = io.StringIO()
+        o.write('<?xml version="1.0" encoding="utf-8"?>\n')
+        o.write('<resources>\n')
+
+        has_resources = False
+        for resource in type_resources:
+            resource_str = resource_to_xml_str(
+                resource,
+                strings,
+                styles,
+                package_id_map,
+                resources,
+                reference_resources,
+                reference_flags,
+            )
+            if not resource_str:
+                continue
+
+            o.write(resource_str)
+            has_resources = True
+
+        if not has_resources:
+            continue
+
+        o.write('</resources>\n')
+
+        write_if_changed(xml_path, o.getvalue().encode())
+        written_paths.append(xml_path)
+
+    return written_paths
+
+
+# Set by write_resources() before forking the workers, which inherit the
+# parsed table instead of receiving a pickled copy for each config
+_worker_resources: Optional[Tuple[Any, ...]] = None
+
+
+def _write_config_resources_worker(config_key: bytes):
+    assert _worker_resources is not None
+    (
+        grouped_resources,
+        strings,
+        styles,
+        package_id_map,
+        resources,
+        reference_resources,
+        reference_flags,
+        out_path,
+    ) = _worker_resources
+
+    return write_config_resources(
+        config_key,
+        grouped_resources[config_key],
+        strings,
+        styles,
+        package_id_map,
+        resources,
+        reference_resources,
+        reference_flags,
+        out_path,
+    )
 
-    for config_key, config_resources_map in grouped_resources.items():
-        config = ResTable_config.from_buffer_copy(config_key)
-        config_str = decode_config(config)
 
-        values_name = 'values'
-        if config_str:
-            values_name += f'-{config_str}'
+def write_resources(
+    strings: Sequence[str],
+    styles: ARSCAllStyles,
+    package_id_map: Dict[int, str],
+    resources: ARSCResourcesMap,
+    reference_resources: ARSCResourcesMap,
+    reference_flags: Dict[int, int],
+    out_path: Path,
+    jobs: int = 1,
+):
+    global _worker_resources
 
-        values_path = Path(out_path, values_name)
-        values_path.mkdir(parents=True, exist_ok=True)
+    out_path.mkdir(parents=True, exist_ok=True)
+
+    grouped_resources = group_resources(resources)
 
-        for type_name, type_resources in config_resources_map.items():
-            xml_name = type_name_to_xml_name(type_name)
-            xml_path = Path(values_path, xml_name)
+    written_paths: List[Path] = []
 
-            resource_strs: List[str] = []
-            for resource in type_resources:
-                resource_str = resource_to_xml_str(
-                    resource,
+    if (
+        jobs <= 1
+        or len(grouped_resources) <= 1
+        or 'fork' not in multiprocessing.get_all_start_methods()
+    ):
+        for config_key, config_resources_map in grouped_resources.items():
+            written_paths.extend(
+                write_config_resources(
+                    config_key,
+                    config_resources_map,
                     strings,
                     styles,
                     package_id_map,
                     resources,
                     reference_resources,
                     reference_flags,
+                    out_path,
                 )
-                if not resource_str:
-                    continue
-
-                resource_strs.append(resource_str)
-
-            if not resource_strs:
-                continue
+            )
+        return written_paths
+
+    # Start with the biggest configs, the default one usually holds most
+    # of the resources
+    config_keys = sorted(
+        grouped_resources,
+        key=lambda k: sum(map(len, grouped_resources[k].values())),
+        reverse=True,
+    )
 
-            with open(xml_path, 'w') as o:
-                o.write('<?xml version="1.0" encoding="utf-8"?>\n')
-                o.write('<resources>\n')
-                for resource_str in resource_strs:
-                    o.write(resource_str)
-                o.write('</resources>\n')
+    _worker_resources = (
+        grouped_resources,
+        strings,
+        styles,
+        package_id_map,
+        resources,
+        reference_resources,
+        reference_flags,
+        out_path,
+    )
+    try:
+        with ProcessPoolExecutor(
+            max_workers=min(jobs, len(config_keys)),
+            mp_context=multiprocessing.get_context('fork'),
+        ) as executor:
+            for config_written_paths in executor.map(
+                _write_config_resources_worker,
+                config_keys,
+            ):
+                written_paths.extend(config_written_paths)
+    finally:
+        _worker_resources = None
+
+    return written_paths
 
 
 def write_resources_public_xml(
@@ -315,14 +438,13 @@ def write_resources_public_xml(
     values_path.mkdir(parents=True, exist_ok=True)
     public_xml_path = Path(values_path, 'public.xml')
 
-    with public_xml_path.open('w', encoding='utf-8') as f:
-        f.write('<?xml version="1.0" encoding="utf-8"?>\n')
+    o = io.StringIO()
+    o.write('<?xml version="1.0" encoding="utf-8"?>\n')
 
-        if not resources:
-            f.write('<resources />\n')
-            return
-
-        f.write('<resources>\n')
+    if not resources:
+        o.write('<resources />\n')
+    else:
+        o.write('<resources>\n')
 
         # TODO: remove apktool compatibility
         # for resource_id in sorted(flags.keys()):
@@ -335,10 +457,37 @@ def write_resources_public_xml(
                 reference_resources,
             )
 
-            f.write(
+            o.write(
                 f'    <public type="{resource.type_name}" '
                 f'name="{resource.key_name}" '
                 f'id="0x{resource_id:08x}" />\n'
             )
 
-        f.write('</resources>\n')
+        o.write('</resources>\n')
+
+    write_if_changed(public_xml_path, o.getvalue().encode())
+
+    return [values_path, public_xml_path]
+
+
+def remove_stale_values(out_path: Path, written_paths: Iterable[Path]):
+    # Values directories are written in place to keep the unchanged files,
+    # remove the ones that are not part of the current resources
+    kept_paths = set(written_paths)
+
+    for values_path in out_path.glob('values*'):
+        if values_path not in kept_paths:
+            if values_path.is_dir():
+                shutil.rmtree(values_path)
+            else:
+                values_path.unlink()
+            continue
+
+        for file_path in values_path.iterdir():
+            if file_path in kept_paths:
+                continue
+
+            if file_path.is_dir():
+                shutil.rmtree(file_path)
+            else:
+                file_path.unlink()
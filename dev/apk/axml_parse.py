@@ -1,7 +1,7 @@
 # SPDX-FileCopyrightText: The LineageOS Project
 # SPDX-License-Identifier: Apache-2.0
 
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
 
 from apk.arsc_decode import decode_data, stringify_data
 from apk.arsc_resources import ARSCResourcesMap
@@ -24,23 +24,27 @@ from apk.resource_types import (
     RES_XML_RESOURCE_MAP_TYPE,
     RES_XML_START_ELEMENT_TYPE,
     RES_XML_START_NAMESPACE_TYPE,
+    RES_XML_TREE_ATTR_EXT,
+    RES_XML_TREE_ATTRIBUTE,
+    RES_XML_TREE_CDATA_EXT,
+    RES_XML_TREE_NAMESPACE_EXT,
     RES_XML_TYPE,
-    ResChunk_header,
-    ResXMLTree_attrExt,
-    ResXMLTree_attribute,
-    ResXMLTree_cdataExt,
-    ResXMLTree_endElementExt,
+    Res_value,
+    ResChunkHeader,
     ResXMLTree_header,
-    ResXMLTree_namespaceExt,
-    ResXMLTree_node,
 )
 
+# Data type, data and attribute resource id of decoded attribute values
+AXMLValueCache = Dict[Tuple[int, int, Optional[int]], str]
+# Namespace, name and value of attributes
+AXMLAttr = Tuple[Optional[str], str, str]
+
 
 class AXMLParseError(Exception):
     pass
 
 
-def decode_string(data: int, strings: List[str]):
+def decode_string(data: int, strings: Sequence[str]):
     if data == 0xFFFFFFFF:
         return None
 
@@ -50,7 +54,7 @@ def decode_string(data: int, strings: List[str]):
 def parse_resource_map(
     data: memoryview,
     offset: int,
-    chunk_header: ResChunk_header,
+    chunk_header: ResChunkHeader,
 ):
     ids_start = offset + chunk_header.headerSize
     ids_end = offset + chunk_header.size
@@ -74,136 +78,167 @@ def resource_id_for_attr(
 
 
 def parse_attr(
-    data: memoryview,
-    offset: int,
-    strings: List[str],
+    attr: Tuple[int, ...],
+    strings: Sequence[str],
     resources: Optional[ARSCResourcesMap],
     reference_resources: Optional[ARSCResourcesMap],
     resource_ids: Optional[List[int]],
     package_id_map: Optional[Dict[int, str]],
-):
-    attr, _ = read_struct(ResXMLTree_attribute, data, offset)
-    attr_uri = decode_string(attr.ns, strings)
-    attr_name = decode_string(attr.name, strings) or ''
+    value_cache: AXMLValueCache,
+) -> AXMLAttr:
+    (
+        attr_ns,
+        attr_name_index,
+        attr_raw_value_index,
+        _,
+        _,
+        attr_data_type,
+        attr_data,
+    ) = attr
+    attr_uri = decode_string(attr_ns, strings)
+    attr_name = decode_string(attr_name_index, strings) or ''
+
+    attr_raw_value = decode_string(attr_raw_value_index, strings)
+    if attr_raw_value is not None:
+        return (attr_uri, attr_name, attr_raw_value)
+
+    resource_id = resource_id_for_attr(attr_name_index, resource_ids)
+
+    # Strings point into the pool of each document, the other values only
+    # depend on the resources of the APK
+    value_key = None
+    if attr_data_type != Res_value.TYPE_STRING:
+        value_key = (attr_data_type, attr_data, resource_id)
+        attr_value_str = value_cache.get(value_key)
+        if attr_value_str is not None:
+            return (attr_uri, attr_name, attr_value_str)
+
+    attr_value = decode_data(
+        attr_data_type,
+        attr_data,
+        strings=strings,
+        resources=resources,
+        reference_resources=reference_resources,
+        reference_package_id=APP_PACKAGE_ID,
+        reference_resource_id=resource_id,
+        package_id_map=package_id_map,
+    )
+    attr_value_str = stringify_data(
+        attr_value,
+        attr_data_type,
+    )
 
-    attr_data_type = attr.typedValue.dataType
-    attr_data = attr.typedValue.data
+    if value_key is not None:
+        value_cache[value_key] = attr_value_str
 
-    resource_id = resource_id_for_attr(attr.name, resource_ids)
+    return (attr_uri, attr_name, attr_value_str)
 
-    attr_value_str = None
-    attr_raw_value = decode_string(attr.rawValue, strings)
-    if attr_raw_value is not None:
-        attr_value_str = attr_raw_value
-
-    if attr_value_str is None:
-        attr_value = decode_data(
-            attr_data_type,
-            attr_data,
-            strings=strings,
-            resources=resources,
-            reference_resources=reference_resources,
-            reference_package_id=APP_PACKAGE_ID,
-            reference_resource_id=resource_id,
-            package_id_map=package_id_map,
-        )
-        attr_value_str = stringify_data(
-            attr_value,
-            attr_data_type,
-        )
 
-    return (attr_uri, attr_name, attr_value_str)
+def iter_attrs(
+    data: memoryview,
+    offset: int,
+    count: int,
+    size: int,
+):
+    if size == RES_XML_TREE_ATTRIBUTE.size:
+        return RES_XML_TREE_ATTRIBUTE.iter_unpack(data, offset, count)
+
+    return (
+        RES_XML_TREE_ATTRIBUTE.unpack_from(data, attr_offset)
+        for attr_offset in iter_offsets(offset, count, size)
+    )
 
 
 def parse_xml_node(
     writer: AXMLWriter,
     data: memoryview,
     offset: int,
-    strings: List[str],
+    node_type: int,
+    strings: Sequence[str],
     resource_ids: Optional[List[int]],
     resources: Optional[ARSCResourcesMap],
     reference_resources: Optional[ARSCResourcesMap],
     package_id_map: Optional[Dict[int, str]],
+    value_cache: AXMLValueCache,
+    attr_cache: Dict[Tuple[int, ...], AXMLAttr],
 ):
-    node, _ = read_struct(
-        ResXMLTree_node,
-        data,
-        offset,
-    )
-    offset += node.header.headerSize
+    if node_type == RES_XML_START_ELEMENT_TYPE:
+        (
+            elem_ns,
+            elem_name_index,
+            attribute_start,
+            attribute_size,
+            attribute_count,
+            _,
+            _,
+            _,
+        ) = RES_XML_TREE_ATTR_EXT.unpack_from(data, offset)
+        elem_uri = decode_string(elem_ns, strings)
+        elem_name = decode_string(elem_name_index, strings) or ''
+
+        # Elements of a document repeat the same raw attributes
+        attrs: List[AXMLAttr] = []
+        for attr in iter_attrs(
+            data,
+            offset + attribute_start,
+            attribute_count,
+            attribute_size,
+        ):
+            parsed_attr = attr_cache.get(attr)
+            if parsed_attr is None:
+                parsed_attr = parse_attr(
+                    attr,
+                    strings,
+                    resources,
+                    reference_resources,
+                    resource_ids,
+                    package_id_map,
+                    value_cache,
+                )
+                attr_cache[attr] = parsed_attr
+
+            attrs.append(parsed_attr)
 
-    if node.header.type in (
+        writer.start_element(elem_uri, elem_name, attrs)
+    elif node_type == RES_XML_END_ELEMENT_TYPE:
+        writer.end_element()
+    elif node_type == RES_XML_CDATA_TYPE:
+        text_index, _, _, _, _ = RES_XML_TREE_CDATA_EXT.unpack_from(
+            data,
+            offset,
+        )
+        text = decode_string(text_index, strings) or ''
+        writer.text(text)
+    elif node_type in (
         RES_XML_START_NAMESPACE_TYPE,
         RES_XML_END_NAMESPACE_TYPE,
     ):
-        ext, _ = read_struct(
-            ResXMLTree_namespaceExt,
+        prefix_index, uri_index = RES_XML_TREE_NAMESPACE_EXT.unpack_from(
             data,
             offset,
         )
-        prefix = decode_string(ext.prefix, strings) or ''
-        uri = decode_string(ext.uri, strings) or ''
+        prefix = decode_string(prefix_index, strings) or ''
+        uri = decode_string(uri_index, strings) or ''
 
-        if node.header.type == RES_XML_START_NAMESPACE_TYPE:
+        if node_type == RES_XML_START_NAMESPACE_TYPE:
             writer.start_namespace(prefix, uri)
         else:
             writer.end_namespace(prefix, uri)
-
-    elif node.header.type == RES_XML_START_ELEMENT_TYPE:
-        ext, _ = read_struct(
-            ResXMLTree_attrExt,
-            data,
-            offset,
-        )
-        elem_uri = decode_string(ext.ns, strings)
-        elem_name = decode_string(ext.name, strings) or ''
-
-        attrs: List[Tuple[Optional[str], str, str]] = []
-        for attr_offset in iter_offsets(
-            offset + ext.attributeStart,
-            ext.attributeCount,
-            ext.attributeSize,
-        ):
-            attr = parse_attr(
-                data,
-                attr_offset,
-                strings,
-                resources,
-                reference_resources,
-                resource_ids,
-                package_id_map,
-            )
-
-            attrs.append(attr)
-
-        writer.start_element(elem_uri, elem_name, attrs)
-    elif node.header.type == RES_XML_END_ELEMENT_TYPE:
-        ext, _ = read_struct(
-            ResXMLTree_endElementExt,
-            data,
-            offset,
-        )
-
-        writer.end_element()
-    elif node.header.type == RES_XML_CDATA_TYPE:
-        ext, _ = read_struct(
-            ResXMLTree_cdataExt,
-            data,
-            offset,
-        )
-        text = decode_string(ext.data, strings) or ''
-        writer.text(text)
     else:
-        assert False, f'0x{node.header.type:x}'
+        assert False, f'0x{node_type:x}'
 
 
 def axml_parse(
-    data: bytes,
+    data: bytes | memoryview,
     resources: Optional[ARSCResourcesMap],
     reference_resources: Optional[ARSCResourcesMap],
     package_id_map: Optional[Dict[int, str]],
     writer: AXMLWriter,
+    value_cache: Optional[AXMLValueCache] = None,
 ):
+    if value_cache is None:
+        value_cache = {}
+
     mm = memoryview(data)
     offset = 0
 
@@ -220,8 +255,9 @@ def axml_parse(
 
     writer.start()
 
-    strings: Optional[List[str]] = None
+    strings: Optional[Sequence[str]] = None
     resource_ids: Optional[List[int]] = None
+    attr_cache: Dict[Tuple[int, ...], AXMLAttr] = {}
     for chunk_offset, chunk_header in iter_child_chunks(
         mm,
         offset,
@@ -232,12 +268,14 @@ def axml_parse(
                 mm,
                 chunk_offset,
             )
+            attr_cache.clear()
         elif chunk_header.type == RES_XML_RESOURCE_MAP_TYPE:
             resource_ids = parse_resource_map(
                 mm,
                 chunk_offset,
                 chunk_header,
             )
+            attr_cache.clear()
         elif (
             chunk_header.type >= RES_XML_FIRST_CHUNK_TYPE
             and chunk_header.type <= RES_XML_LAST_CHUNK_TYPE
@@ -246,12 +284,15 @@ def axml_parse(
             parse_xml_node(
                 writer,
                 mm,
-                chunk_offset,
+                chunk_offset + chunk_header.headerSize,
+                chunk_header.type,
                 strings,
                 resource_ids,
                 resources,
                 reference_resources,
                 package_id_map,
+                value_cache,
+                attr_cache,
             )
         else:
             assert False, f'0x{chunk_header.type:x}'
@@ -1,10 +1,16 @@
 # SPDX-FileCopyrightText: The LineageOS Project
 # SPDX-License-Identifier: Apache-2.0
 
+import re
 from typing import Dict, List, Optional, Set, TextIO, Tuple
 
+_ATTR_SPECIAL_RE = re.compile('[&"<>]')
+
 
 def _esc_attr(v: str) -> str:
+    if not _ATTR_SPECIAL_RE.search(v):
+        return v
+
     return (
         v.replace('&', '&amp;')
         .replace('"', '&quot;')
@@ -52,6 +58,7 @@ class AXMLWriter:
 
         self._ns_stack: List[Tuple[str, str]] = []
         self._uri_to_prefix: Dict[str, str] = {}
+        self._qnames: Dict[Tuple[Optional[str], str], str] = {}
         self._pending_xmlns: List[Tuple[str, str]] = []
 
         self._elem_stack: List[str] = []
@@ -67,14 +74,21 @@ class AXMLWriter:
         for p, u in self._ns_stack:
             m[u] = p
         self._uri_to_prefix = m
+        self._qnames.clear()
 
     def _qname(self, uri: Optional[str], local: str) -> str:
         if not uri:
             return local
+
+        key = (uri, local)
+        qname = self._qnames.get(key)
+        if qname is not None:
+            return qname
+
         pfx = self._uri_to_prefix.get(uri)
-        if pfx:
-            return f'{pfx}:{local}'
-        return local
+        qname = f'{pfx}:{local}' if pfx else local
+        self._qnames[key] = qname
+        return qname
 
     def _ensure_parent_tag_closed(self):
         if self._start_tag_open:
@@ -105,6 +119,11 @@ class AXMLWriter:
 
         return out
 
+    def _attr_sort_key(self, item: Tuple[Optional[str], str, str]):
+        a_uri, a_local, _ = item
+        # Put un-namespaced attrs before android: attrs, then sort by name.
+        return (0 if not a_uri and not self.xmlns_first else 1, a_local)
+
     def start_namespace(self, prefix: str, uri: str):
         if self._skip_depth > 0:
             return
@@ -142,19 +161,14 @@ class AXMLWriter:
 
         attrs = self._filter_attrs_for_element(local, attrs)
         if self.sort_attrs and self._depth != 0:
-
-            def attr_sort_key(item: Tuple[Optional[str], str, str]):
-                a_uri, a_local, _ = item
-                # Put un-namespaced attrs before android: attrs, then sort by name.
-                return (0 if not a_uri and not self.xmlns_first else 1, a_local)
-
-            attrs.sort(key=attr_sort_key)
+            attrs.sort(key=self._attr_sort_key)
 
         self._ensure_parent_tag_closed()
         self._maybe_indent()
 
         tag = self._qname(uri, local)
-        self._write(f'<{tag}')
+        # Build the whole start tag and write it at once
+        parts = [f'<{tag}']
         self._start_tag_open = True
         self._last_was_text = False
 
@@ -172,23 +186,26 @@ class AXMLWriter:
                 if (not is_first_attr or is_single_attr) and ns_uri.endswith(
                     'android'
                 ):
-                    self._write(self.newline)
-                    self._write(self.indent * self._depth + ' ')
+                    parts.append(self.newline)
+                    parts.append(self.indent * self._depth + ' ')
 
                 is_first_attr = False
-                self._write(f' xmlns:{ns_prefix}="{_esc_attr(ns_uri)}"')
+                parts.append(f' xmlns:{ns_prefix}="{_esc_attr(ns_uri)}"')
 
-        if self.xmlns_first:
+        if self.xmlns_first and self._pending_xmlns:
             _write_xmlns()
 
-        for a_uri, a_local, a_val in attrs:
+        if attrs:
             is_first_attr = False
-            aq = self._qname(a_uri, a_local)
-            self._write(f' {aq}="{_esc_attr(a_val)}"')
 
-        if not self.xmlns_first:
+        qname = self._qname
+        for a_uri, a_local, a_val in attrs:
+            parts.append(f' {qname(a_uri, a_local)}="{_esc_attr(a_val)}"')
+
+        if not self.xmlns_first and self._pending_xmlns:
             _write_xmlns()
 
+        self._write(''.join(parts))
         self._pending_xmlns.clear()
 
         self._elem_stack.append(tag)
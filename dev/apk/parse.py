@@ -1,12 +1,22 @@
 # SPDX-FileCopyrightText: The LineageOS Project
 # SPDX-License-Identifier: Apache-2.0
 
-from typing import Generator, List, Tuple
+from typing import (
+    Generator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+    cast,
+    overload,
+)
 
 from apk.arsc_resources import ARSCAllStyles
 from apk.resource_types import (
+    RES_CHUNK_HEADER,
+    RES_STRING_POOL_SPAN,
     RES_STRING_POOL_TYPE,
-    ResChunk_header,
     ResStringPool_header,
     ResStringPool_span,
 )
@@ -20,7 +30,7 @@ def iter_child_chunks(
     end_offset: int,
 ):
     while offset < end_offset:
-        chunk, _ = read_struct(ResChunk_header, data, offset)
+        chunk, _ = RES_CHUNK_HEADER.read(data, offset)
 
         yield offset, chunk
         offset += chunk.size
@@ -55,6 +65,66 @@ def iter_offsets(
         yield offset + i * size
 
 
+class StringPool(Sequence[str]):
+    # Strings are decoded on first access, most of the strings of large
+    # tables are never referenced by the extracted resources
+    def __init__(
+        self,
+        data: memoryview,
+        strings_start_offset: int,
+        strings_offsets: memoryview,
+        is_utf8: bool,
+    ):
+        self.__data = data
+        self.__strings_start_offset = strings_start_offset
+        self.__strings_offsets = strings_offsets
+        self.__read_string = read_utf8_string if is_utf8 else read_utf16_string
+        self.__strings: List[Optional[str]] = [None] * len(strings_offsets)
+
+    def __reduce__(self):
+        # The data cannot be pickled, send the decoded strings instead
+        return list, (self.decode_all(),)
+
+    def __len__(self):
+        return len(self.__strings)
+
+    def __decode(self, index: int):
+        string_offset = (
+            self.__strings_start_offset + self.__strings_offsets[index]
+        )
+        value = self.__read_string(self.__data, string_offset)
+        self.__strings[index] = value
+        return value
+
+    @overload
+    def __getitem__(self, index: int) -> str: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[str]: ...
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        value = self.__strings[index]
+        if value is None:
+            value = self.__decode(index)
+
+        return value
+
+    def __iter__(self):
+        for i in range(len(self.__strings)):
+            yield self[i]
+
+    def decode_all(self) -> List[str]:
+        strings = self.__strings
+        for i, value in enumerate(strings):
+            if value is None:
+                self.__decode(i)
+
+        return cast(List[str], strings[:])
+
+
 def parse_string_pool(data: memoryview, offset: int):
     string_pool_header, _ = read_struct(
         ResStringPool_header,
@@ -71,22 +141,14 @@ def parse_string_pool(data: memoryview, offset: int):
     strings_count = string_pool_header.stringCount
     strings_offsets_start = offset + string_pool_header.header.headerSize
     strings_start_offset = offset + string_pool_header.stringsStart
+    strings_offsets_end = strings_offsets_start + strings_count * 4
 
-    strings: List[str] = []
-    for relative_offset in iter_uint(
+    strings = StringPool(
         data,
-        strings_offsets_start,
-        strings_count,
-        4,
-    ):
-        string_offset = strings_start_offset + relative_offset
-
-        if is_utf8:
-            value = read_utf8_string(data, string_offset)
-        else:
-            value = read_utf16_string(data, string_offset)
-
-        strings.append(value)
+        strings_start_offset,
+        data[strings_offsets_start:strings_offsets_end].cast('I'),
+        is_utf8,
+    )
 
     styles_count = string_pool_header.styleCount
     styles_offsets_start = strings_offsets_start + strings_count * 4
@@ -103,16 +165,11 @@ def parse_string_pool(data: memoryview, offset: int):
 
         styles_local: List[Tuple[str, int, int]] = []
         while style_offset < string_pool_end:
-            style, style_offset = read_struct(
-                ResStringPool_span,
+            style, style_offset = RES_STRING_POOL_SPAN.read(
                 data,
                 style_offset,
             )
 
-            assert isinstance(style.name, int)
-            assert isinstance(style.firstChar, int)
-            assert isinstance(style.lastChar, int)
-
             if style.name == ResStringPool_span.END:
                 break
 
@@ -2,6 +2,9 @@
 # SPDX-License-Identifier: Apache-2.0
 
 from ctypes import Structure, Union, c_bool, c_uint8, c_uint16, c_uint32
+from typing import NamedTuple
+
+from utils.struct_utils import StructReader
 
 RES_NULL_TYPE = 0x0000
 RES_STRING_POOL_TYPE = 0x0001
@@ -623,3 +626,189 @@ class ResXMLTree_attribute(Structure):
         ('rawValue', c_uint32),
         ('typedValue', Res_value),
     ]
+
+
+# Named tuple layouts of the structures read in the hot paths, nested
+# structures are flattened into their fields
+
+
+class ResChunkHeader(NamedTuple):
+    type: int
+    headerSize: int
+    size: int
+
+
+RES_CHUNK_HEADER = StructReader(ResChunkHeader, '<HHI')
+
+
+class ResStringPoolSpan(NamedTuple):
+    name: int
+    firstChar: int
+    lastChar: int
+
+
+RES_STRING_POOL_SPAN = StructReader(ResStringPoolSpan, '<III')
+
+
+class ResTableEntryFull(NamedTuple):
+    size: int
+    flags: int
+    key: int
+
+
+RES_TABLE_ENTRY_FULL = StructReader(ResTableEntryFull, '<HHI')
+
+
+class ResTableEntryCompact(NamedTuple):
+    key: int
+    flags: int
+    data: int
+
+
+RES_TABLE_ENTRY_COMPACT = StructReader(ResTableEntryCompact, '<HHI')
+
+
+class ResTableMapEntry(NamedTuple):
+    size: int
+    flags: int
+    key: int
+    parent: int
+    count: int
+
+
+RES_TABLE_MAP_ENTRY = StructReader(ResTableMapEntry, '<HHIII')
+
+
+class ResValue(NamedTuple):
+    size: int
+    res0: int
+    dataType: int
+    data: int
+
+
+RES_VALUE = StructReader(ResValue, '<HBBI')
+
+
+class ResTableMap(NamedTuple):
+    name: int
+    # value: Res_value
+    size: int
+    res0: int
+    dataType: int
+    data: int
+
+
+RES_TABLE_MAP = StructReader(ResTableMap, '<IHBBI')
+
+
+class ResTableSparseTypeEntry(NamedTuple):
+    idx: int
+    offset: int
+
+
+RES_TABLE_SPARSE_TYPE_ENTRY = StructReader(ResTableSparseTypeEntry, '<HH')
+
+
+class ResXMLTreeNode(NamedTuple):
+    # header: ResChunk_header
+    type: int
+    headerSize: int
+    size: int
+    lineNumber: int
+    comment: int
+
+
+RES_XML_TREE_NODE = StructReader(ResXMLTreeNode, '<HHIII')
+
+
+class ResXMLTreeCdataExt(NamedTuple):
+    data: int
+    # typedData: Res_value
+    size: int
+    res0: int
+    dataType: int
+    typedData: int
+
+
+RES_XML_TREE_CDATA_EXT = StructReader(ResXMLTreeCdataExt, '<IHBBI')
+
+
+class ResXMLTreeNamespaceExt(NamedTuple):
+    prefix: int
+    uri: int
+
+
+RES_XML_TREE_NAMESPACE_EXT = StructReader(ResXMLTreeNamespaceExt, '<II')
+
+
+class ResXMLTreeEndElementExt(NamedTuple):
+    ns: int
+    name: int
+
+
+RES_XML_TREE_END_ELEMENT_EXT = StructReader(ResXMLTreeEndElementExt, '<II')
+
+
+class ResXMLTreeAttrExt(NamedTuple):
+    ns: int
+    name: int
+    attributeStart: int
+    attributeSize: int
+    attributeCount: int
+    idIndex: int
+    classIndex: int
+    styleIndex: int
+
+
+RES_XML_TREE_ATTR_EXT = StructReader(ResXMLTreeAttrExt, '<IIHHHHHH')
+
+
+class ResXMLTreeAttribute(NamedTuple):
+    ns: int
+    name: int
+    rawValue: int
+    # typedValue: Res_value
+    size: int
+    res0: int
+    dataType: int
+    data: int
+
+
+RES_XML_TREE_ATTRIBUTE = StructReader(ResXMLTreeAttribute, '<IIIHBBI')
+
+
+class ResTableConfig(NamedTuple):
+    size: int
+    mcc: int
+    mnc: int
+    language: bytes
+    country: bytes
+    orientation: int
+    touchscreen: int
+    density: int
+    keyboard: int
+    navigation: int
+    inputFlags: int
+    grammaticalInflection: int
+    screenWidth: int
+    screenHeight: int
+    sdkVersion: int
+    minorVersion: int
+    screenLayout: int
+    uiMode: int
+    smallestScreenWidthDp: int
+    screenWidthDp: int
+    screenHeightDp: int
+    localeScript: bytes
+    localeVariant: bytes
+    screenLayout2: int
+    colorMode: int
+    screenConfigPad2: int
+    localeScriptWasComputed: bool
+    localeNumberingSystem: bytes
+
+
+RES_TABLE_CONFIG = StructReader(
+    ResTableConfig,
+    '<IHH2s2sBBHBBBBHHHHBBHHH4s8sBBH?8s3x',
+)
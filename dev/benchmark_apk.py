@@ -0,0 +1,581 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: The LineageOS Project
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import annotations
+
+import io
+import json
+import zipfile
+from argparse import ArgumentParser, Namespace
+from dataclasses import asdict
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Callable, Dict, List
+
+from apk.apk_extract import extract_apk_resources, load_framework
+from apk.apk_generate import (
+    BAG_TYPE_NAMES,
+    VALUE_TYPE_NAMES,
+    CorpusOptions,
+    check_corpus_options,
+    generate_apk,
+    get_config_count,
+)
+from apk.arsc_parse import (
+    arsc_parse,
+    arsc_parse_names,
+    parse_table_type_entries,
+)
+from apk.arsc_write import write_resources, write_resources_public_xml
+from apk.axml_parse import AXMLParseError, AXMLValueCache, axml_parse
+from apk.axml_writer import AXMLWriter
+from apk.parse import iter_child_chunks
+from apk.resource_types import (
+    RES_TABLE_ENTRY_COMPACT,
+    RES_TABLE_PACKAGE_TYPE,
+    RES_TABLE_TYPE_TYPE,
+    RES_VALUE,
+    Res_value,
+    ResTable_entry,
+    ResTable_header,
+    ResTable_package,
+    ResTable_type,
+)
+from utils.benchmark import print_timing, print_timings, time_best
+from utils.struct_utils import read_struct
+
+
+def read_apk_arsc(apk_path: Path):
+    with zipfile.ZipFile(apk_path, 'r') as z:
+        return z.read('resources.arsc')
+
+
+def get_table_type_entry_offsets(data: memoryview):
+    entry_offsets: List[int] = []
+
+    table_header, offset = read_struct(ResTable_header, data)
+
+    for package_offset, package_header in iter_child_chunks(
+        data,
+        offset,
+        table_header.header.size,
+    ):
+        if package_header.type != RES_TABLE_PACKAGE_TYPE:
+            continue
+
+        table_package, _ = read_struct(ResTable_package, data, package_offset)
+
+        for type_offset, type_header in iter_child_chunks(
+            data,
+            package_offset + table_package.header.headerSize,
+            package_offset + table_package.header.size,
+        ):
+            if type_header.type != RES_TABLE_TYPE_TYPE:
+                continue
+
+            table_type, _ = read_struct(
+                ResTable_type,
+                data,
+                type_offset,
+                type_header.headerSize,
+            )
+
+            entries_start = type_offset + table_type.entriesStart
+            for _, relative_offset in parse_table_type_entries(
+                data,
+                type_offset,
+                table_type,
+            ):
+                entry_offsets.append(entries_start + relative_offset)
+
+    return entry_offsets
+
+
+def benchmark_structs(args: Namespace):
+    data = memoryview(read_apk_arsc(Path(args.apk)))
+    entry_offsets = get_table_type_entry_offsets(data)
+    entry_flags = ResTable_entry.FLAG_COMPACT | ResTable_entry.FLAG_COMPLEX
+
+    # Read the entry header and the value of simple entries, same as the
+    # parser does for each entry
+    def baseline():
+        values: List[int] = []
+        for entry_offset in entry_offsets:
+            entry, _ = read_struct(
+                ResTable_entry.Compact,
+                data,
+                entry_offset,
+            )
+            if entry.flags & entry_flags:
+                continue
+
+            full_entry, _ = read_struct(
+                ResTable_entry.Full,
+                data,
+                entry_offset,
+            )
+            value, _ = read_struct(
+                Res_value,
+                data,
+                entry_offset + full_entry.size,
+            )
+            values.append(value.data)
+        return values
+
+    def current():
+        values: List[int] = []
+        for entry_offset in entry_offsets:
+            size, flags, _ = RES_TABLE_ENTRY_COMPACT.unpack_from(
+                data,
+                entry_offset,
+            )
+            if flags & entry_flags:
+                continue
+
+            _, _, _, value_data = RES_VALUE.unpack_from(
+                data,
+                entry_offset + size,
+            )
+            values.append(value_data)
+        return values
+
+    if baseline() != current():
+        raise ValueError('Struct readers differ from the ctypes structures')
+
+    print(f'Reading {len(entry_offsets)} entries')
+    print_timings(
+        'structs',
+        time_best(baseline, args.repeat),
+        time_best(current, args.repeat),
+    )
+
+
+def benchmark_parse(args: Namespace):
+    data = read_apk_arsc(Path(args.apk))
+
+    print(f'Parsing {len(data)} bytes resource table')
+    print_timing(
+        'parse',
+        time_best(lambda: arsc_parse(data), args.repeat),
+    )
+
+    if args.type is not None or args.name is not None:
+        type_names = None
+        if args.type is not None:
+            type_names = frozenset(args.type)
+
+        resource_names = None
+        if args.name is not None:
+            resource_names = frozenset(args.name)
+
+        _, _, resources, _, _ = arsc_parse_names(
+            data,
+            type_names,
+            resource_names,
+        )
+
+        print(f'Parsing {len(resources)} matching and referenced resources')
+        print_timing(
+            'names parse',
+            time_best(
+                lambda: arsc_parse_names(data, type_names, resource_names),
+                args.repeat,
+            ),
+        )
+
+    if args.every is None:
+        return
+
+    _, _, resources, _, _ = arsc_parse(data)
+    resource_ids = sorted(resources.keys())[:: args.every]
+
+    print(f'Parsing {len(resource_ids)} of {len(resources)} resources')
+    print_timing(
+        'partial parse',
+        time_best(lambda: arsc_parse(data, resource_ids), args.repeat),
+    )
+
+
+def benchmark_extract(args: Namespace):
+    framework_resources, framework_flags = load_framework(Path(args.framework))
+
+    with TemporaryDirectory() as output_dir:
+
+        def extract():
+            extract_apk_resources(
+                Path(args.apk),
+                Path(output_dir),
+                framework_resources,
+                framework_flags,
+            )
+
+        # The first run starts with empty decode caches, the next ones
+        # match extracting more APKs in the same process
+        print_timing('first extract', time_best(extract, 1))
+        print_timing('extract', time_best(extract, args.repeat))
+
+
+def benchmark_axml(args: Namespace):
+    framework_resources, _ = load_framework(Path(args.framework))
+
+    with zipfile.ZipFile(Path(args.apk), 'r') as z:
+        _, _, resources, _, package_id_map = arsc_parse(
+            z.read('resources.arsc')
+        )
+        documents = [
+            z.read(name) for name in z.namelist() if name.endswith('.xml')
+        ]
+
+    def decode():
+        value_cache: AXMLValueCache = {}
+        for document in documents:
+            writer = AXMLWriter(io.StringIO(), pretty=True)
+            try:
+                axml_parse(
+                    document,
+                    resources,
+                    framework_resources,
+                    package_id_map,
+                    writer,
+                    value_cache,
+                )
+            except AXMLParseError:
+                pass
+
+    print(f'Decoding {len(documents)} XML documents')
+    print_timing('axml', time_best(decode, args.repeat))
+
+
+def get_corpus_options(args: Namespace):
+    options = CorpusOptions(
+        packages=args.packages,
+        value_types=args.value_types,
+        bag_types=args.bag_types,
+        configs=args.configs,
+        entries=args.entries,
+        bag_items=args.bag_items,
+        strings=args.strings,
+        utf8=not args.utf16,
+        seed=args.seed,
+    )
+    check_corpus_options(options)
+
+    return options
+
+
+def generate_corpus(options: CorpusOptions, output_path: Path):
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    apk_path = Path(output_path, 'app.apk')
+    framework_path = Path(output_path, 'framework-res.apk')
+
+    # Only the attrs used by the generated layouts are needed from the
+    # framework
+    generate_apk(apk_path, options)
+    generate_apk(
+        framework_path,
+        CorpusOptions(seed=options.seed),
+        'android',
+        0x01,
+    )
+
+    return apk_path, framework_path
+
+
+def benchmark_generate(args: Namespace):
+    options = get_corpus_options(args)
+    apk_path, framework_path = generate_corpus(options, Path(args.output))
+    print(f'Generated {apk_path} and {framework_path}')
+
+
+def benchmark_corpus(args: Namespace):
+    options = get_corpus_options(args)
+
+    baseline_path = Path(args.baseline) if args.baseline else None
+    if args.save and baseline_path is None:
+        raise ValueError('--save requires --baseline')
+
+    # Check the baseline before running the benchmarks
+    baseline_timings: Dict[str, float] = {}
+    if baseline_path is not None and baseline_path.exists():
+        try:
+            baseline = json.loads(baseline_path.read_text())
+            baseline_options = baseline['options']
+            baseline_timings = baseline['timings']
+        except (ValueError, KeyError, TypeError):
+            raise ValueError(f'{baseline_path} is not a valid baseline')
+
+        if baseline_options != asdict(options):
+            raise ValueError(
+                f'{baseline_path} was recorded with different corpus options'
+            )
+
+    with TemporaryDirectory() as tmp_dir:
+        apk_path, framework_path = generate_corpus(
+            options,
+            Path(tmp_dir, 'corpus'),
+        )
+
+        framework_resources, framework_flags = load_framework(framework_path)
+
+        with zipfile.ZipFile(apk_path, 'r') as z:
+            data = z.read('resources.arsc')
+            documents = [
+                z.read(name) for name in z.namelist() if name.endswith('.xml')
+            ]
+
+        strings, styles, resources, flags, package_id_map = arsc_parse(data)
+        assert styles is not None
+
+        def decode():
+            value_cache: AXMLValueCache = {}
+            for document in documents:
+                axml_parse(
+                    document,
+                    resources,
+                    framework_resources,
+                    package_id_map,
+                    AXMLWriter(io.StringIO(), pretty=True),
+                    value_cache,
+                )
+
+        write_runs: List[int] = [0]
+
+        def write():
+            # Write to a new directory each time, existing files with the
+            # same contents would be skipped
+            write_runs[0] += 1
+            output_path = Path(tmp_dir, f'write{write_runs[0]}')
+            write_resources(
+                strings,
+                styles,
+                package_id_map,
+                resources,
+                framework_resources,
+                framework_flags,
+                output_path,
+            )
+            write_resources_public_xml(
+                resources,
+                framework_resources,
+                flags,
+                output_path,
+            )
+
+        benchmarks: Dict[str, Callable[[], object]] = {
+            'parse': lambda: arsc_parse(data),
+            'decode': decode,
+            'write': write,
+        }
+
+        print(
+            f'Corpus of {len(resources)} resources, {len(data)} bytes '
+            f'resource table and {len(documents)} XML documents'
+        )
+
+        timings = {
+            name: time_best(fn, args.repeat) for name, fn in benchmarks.items()
+        }
+
+    for name, current in timings.items():
+        if name in baseline_timings:
+            print_timings(name, baseline_timings[name], current)
+        else:
+            print_timing(name, current)
+
+    if args.save:
+        assert baseline_path is not None
+        baseline_path.write_text(
+            json.dumps(
+                {
+                    'options': asdict(options),
+                    'timings': timings,
+                },
+                indent=2,
+            )
+        )
+
+
+def add_corpus_arguments(parser: ArgumentParser):
+    parser.add_argument(
+        '--packages',
+        type=int,
+        default=1,
+        help='Number of packages of the resource table',
+    )
+    parser.add_argument(
+        '--value-types',
+        type=int,
+        default=len(VALUE_TYPE_NAMES),
+        help=f'Number of value types, up to {len(VALUE_TYPE_NAMES)}',
+    )
+    parser.add_argument(
+        '--bag-types',
+        type=int,
+        default=len(BAG_TYPE_NAMES),
+        help=f'Number of bag types, up to {len(BAG_TYPE_NAMES)}',
+    )
+    parser.add_argument(
+        '--configs',
+        type=int,
+        default=7,
+        help=f'Number of configs, up to {get_config_count()}, the ones '
+        'after the 7th are locales',
+    )
+    parser.add_argument(
+        '--entries',
+        type=int,
+        default=200,
+        help='Number of entries of each type',
+    )
+    parser.add_argument(
+        '--bag-items',
+        type=int,
+        default=4,
+        help='Maximum number of items of each bag',
+    )
+    parser.add_argument(
+        '--strings',
+        type=int,
+        default=1000,
+        help='Number of text strings of each package',
+    )
+    parser.add_argument(
+        '--utf16',
+        action='store_true',
+        help='Encode the global string pool as UTF-16 instead of UTF-8',
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='Seed of the generated values',
+    )
+
+
+def benchmark_apk():
+    parser = ArgumentParser(
+        prog='benchmark_apk.py',
+        description='Benchmark the APK resource parsing hot paths',
+    )
+    parser.add_argument(
+        '-r',
+        '--repeat',
+        type=int,
+        default=5,
+        help='Number of runs, the best one is reported',
+    )
+
+    subparsers = parser.add_subparsers(required=True)
+
+    structs = subparsers.add_parser(
+        'structs',
+        help='Read the entries of the resource table against ctypes',
+    )
+    structs.add_argument(
+        'apk',
+        help='Path to the APK, eg: framework-res.apk',
+    )
+    structs.set_defaults(func=benchmark_structs)
+
+    parse = subparsers.add_parser(
+        'parse',
+        help='Parse the resource table',
+    )
+    parse.add_argument(
+        'apk',
+        help='Path to the APK, eg: framework-res.apk',
+    )
+    parse.add_argument(
+        '-e',
+        '--every',
+        type=int,
+        help='Also time a partial parse of every nth resource',
+    )
+    parse.add_argument(
+        '-t',
+        '--type',
+        action='append',
+        help='Also time a partial parse of the resources of this type, '
+        'can be a glob pattern and be passed multiple times',
+    )
+    parse.add_argument(
+        '-n',
+        '--name',
+        action='append',
+        help='Also time a partial parse of the resources with this name, '
+        'can be a glob pattern and be passed multiple times',
+    )
+    parse.set_defaults(func=benchmark_parse)
+
+    extract = subparsers.add_parser(
+        'extract',
+        help='Extract the resources of an APK',
+    )
+    extract.add_argument(
+        'apk',
+        help='Path to the APK',
+    )
+    extract.add_argument(
+        'framework',
+        help='Path to the framework-res.apk',
+    )
+    extract.set_defaults(func=benchmark_extract)
+
+    axml = subparsers.add_parser(
+        'axml',
+        help='Decode the binary XML documents of an APK',
+    )
+    axml.add_argument(
+        'apk',
+        help='Path to the APK',
+    )
+    axml.add_argument(
+        'framework',
+        help='Path to the framework-res.apk',
+    )
+    axml.set_defaults(func=benchmark_axml)
+
+    generate = subparsers.add_parser(
+        'generate',
+        help='Generate a synthetic APK and framework, to be passed to the '
+        'other benchmarks',
+    )
+    generate.add_argument(
+        'output',
+        help='Directory to write app.apk and framework-res.apk to',
+    )
+    add_corpus_arguments(generate)
+    generate.set_defaults(func=benchmark_generate)
+
+    corpus = subparsers.add_parser(
+        'corpus',
+        help='Parse, decode and write a synthetic APK',
+    )
+    corpus.add_argument(
+        '-b',
+        '--baseline',
+        metavar='PATH',
+        help='Path to the timings to compare against, recorded with the '
+        'same corpus options',
+    )
+    corpus.add_argument(
+        '-s',
+        '--save',
+        action='store_true',
+        help='Save the timings to the baseline path',
+    )
+    add_corpus_arguments(corpus)
+    corpus.set_defaults(func=benchmark_corpus)
+
+    args = parser.parse_args()
+
+    try:
+        args.func(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+if __name__ == '__main__':
+    benchmark_apk()
@@ -0,0 +1,570 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: The LineageOS Project
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import annotations
+
+import random
+import tempfile
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+from typing import List, Tuple
+
+from sepolicy.cil_policy import parse_cil_files
+from sepolicy.cil_rule import is_valid_cil_line
+from sepolicy.class_set import ClassSet
+from sepolicy.classmap import Classmap
+from sepolicy.conditional_type import ConditionalType
+from sepolicy.policy import ContextsType, PolicyMetadata
+from sepolicy.rule import (
+    Rule,
+    unpack_line,
+    unpack_line_generic,
+    unpack_lines,
+)
+from sepolicy.rule_container import LineMark, RuleContainer
+from sepolicy.snapshot import (
+    SNAPSHOT_HEADER,
+    PolicySnapshot,
+    get_sources_key,
+    load_snapshot,
+    save_snapshot,
+)
+from sepolicy.varargs import (
+    Ioctls,
+    OrderedPerms,
+    Perms,
+    Types,
+    TypeTransitionTag,
+)
+from utils.benchmark import print_timings, time_best
+from utils.frozendict import FrozenDict
+
+SYNTHETIC_CIL_LINES = [
+    '(type vendor_foo_{i})',
+    '(typeattribute vendor_foo_{i}_attr)',
+    '(typeattributeset vendor_foo_{i}_attr (vendor_foo_{i} domain))',
+    '(allow vendor_foo_{i} self (file (read write open getattr)))',
+    '(allow vendor_foo_{i} vendor_bar (dir (search)))',
+    '(allowx vendor_foo_{i} vendor_bar (ioctl chr_file ((range 0x10 0x20))))',
+    '(typetransition vendor_foo_{i} tmpfs file vendor_foo_{i}_tmpfs)',
+    '(typeattributeset base_typeattr_{i} (and (domain) (not (vendor_foo))))',
+]
+
+# Lines as split by the source rule and macro parsers, with the trailing
+# semicolon still attached
+SYNTHETIC_TE_LINES = [
+    'type vendor_foo_{i}, domain;',
+    'typeattribute vendor_foo_{i} mlstrustedsubject;',
+    'allow vendor_foo_{i} self:file {{ read write open getattr }};',
+    'allow vendor_foo_{i} vendor_bar:dir search;',
+    'allowxperm vendor_foo_{i} vendor_bar:chr_file ioctl {{ 0x10-0x20 }};',
+    'type_transition vendor_foo_{i} tmpfs:file vendor_foo_{i}_tmpfs;',
+    'genfscon sysfs /devices/foo_{i} u:object_r:sysfs_foo:s0',
+    '{{ getattr open read ioctl lock map watch watch_reads }}',
+]
+
+
+def read_benchmark_cil_lines(cil_paths: List[Path], num_lines: int):
+    if not cil_paths:
+        return [
+            SYNTHETIC_CIL_LINES[i % len(SYNTHETIC_CIL_LINES)].format(i=i)
+            for i in range(num_lines)
+        ]
+
+    lines: List[str] = []
+    for cil_path in cil_paths:
+        for line in cil_path.read_text().splitlines():
+            if is_valid_cil_line(line):
+                lines.append(line)
+
+    return lines
+
+
+def benchmark_unpack(args: Namespace):
+    cil_paths = [Path(p) for p in args.cil]
+    lines = read_benchmark_cil_lines(cil_paths, args.lines)
+
+    def baseline():
+        return [unpack_line_generic(line, '(', ')', ' ') for line in lines]
+
+    def current():
+        return unpack_lines(lines, '(', ')', ' ')
+
+    if baseline() != current():
+        raise ValueError('Scanner output differs from the generic parser')
+
+    print(f'Unpacking {len(lines)} lines')
+    print_timings(
+        'unpack',
+        time_best(baseline, args.repeat),
+        time_best(current, args.repeat),
+    )
+
+
+def benchmark_unpack_te(args: Namespace):
+    lines = [
+        SYNTHETIC_TE_LINES[i % len(SYNTHETIC_TE_LINES)].format(i=i)
+        for i in range(args.lines)
+    ]
+
+    def baseline():
+        return [
+            unpack_line_generic(f'{{{line}}}', '{', '}', ' \n:,', ';')
+            for line in lines
+        ]
+
+    # The source rule and macro parsers unpack their lines one at a time
+    def current():
+        return [
+            unpack_line(
+                line,
+                '{',
+                '}',
+                ' \n:,',
+                open_by_default=True,
+                ignored_chars=';',
+            )
+            for line in lines
+        ]
+
+    def batched():
+        return unpack_lines(
+            lines,
+            '{',
+            '}',
+            ' \n:,',
+            open_by_default=True,
+            ignored_chars=';',
+        )
+
+    if baseline() != current() or baseline() != batched():
+        raise ValueError('Unpacked TE lines differ from the generic parser')
+
+    baseline_time = time_best(baseline, args.repeat)
+
+    print(f'Unpacking {len(lines)} TE lines')
+    print_timings('unpack_line', baseline_time, time_best(current, args.repeat))
+    print_timings(
+        'unpack_lines',
+        baseline_time,
+        time_best(batched, args.repeat),
+    )
+
+
+def get_rule_check_values(rule: Rule):
+    # Rules only compare their hash values, also compare the names of their
+    # class sets and their expanded rules
+    return (
+        [type(part) for part in rule.parts],
+        [part.names for part in rule.parts if isinstance(part, ClassSet)],
+        type(rule.varargs),
+        rule.is_macro,
+        rule.expanded_rules,
+    )
+
+
+def check_rules_round_trip(
+    name: str,
+    rules: RuleContainer,
+    loaded_rules: RuleContainer,
+):
+    if list(rules) != list(loaded_rules):
+        raise ValueError(f'Loaded {name} differ from the saved ones')
+
+    for i, (rule, loaded_rule) in enumerate(zip(rules, loaded_rules)):
+        if get_rule_check_values(rule) != get_rule_check_values(loaded_rule):
+            raise ValueError(
+                f'Loaded {name} differ at {rule.rule_type} rule {i}'
+            )
+
+        if rules.marks(rule) != loaded_rules.marks(rule):
+            raise ValueError(
+                f'Loaded {name} marks differ at {rule.rule_type} rule {i}'
+            )
+
+
+def check_snapshot_round_trip(
+    snapshot: PolicySnapshot,
+    loaded_snapshot: PolicySnapshot,
+):
+    check_rules_round_trip('rules', snapshot.rules, loaded_snapshot.rules)
+    check_rules_round_trip(
+        'genfs rules',
+        snapshot.genfs_rules,
+        loaded_snapshot.genfs_rules,
+    )
+
+    if snapshot.contexts != loaded_snapshot.contexts:
+        raise ValueError('Loaded contexts differ from the saved ones')
+
+    if snapshot.conditional_types_map != loaded_snapshot.conditional_types_map:
+        raise ValueError('Loaded conditional types differ from the saved ones')
+
+    if snapshot.metadata != loaded_snapshot.metadata:
+        raise ValueError('Loaded metadata differs from the saved one')
+
+    classmap = snapshot.classmap
+    loaded_classmap = loaded_snapshot.classmap
+    if classmap is None or loaded_classmap is None:
+        if classmap is not loaded_classmap:
+            raise ValueError('Loaded classmap differs from the saved one')
+    elif list(classmap.classes()) != list(loaded_classmap.classes()) or any(
+        classmap.class_perms(c) != loaded_classmap.class_perms(c)
+        for c in classmap.classes()
+    ):
+        raise ValueError('Loaded classmap differs from the saved one')
+
+    if snapshot.policy_name != loaded_snapshot.policy_name:
+        raise ValueError('Loaded policy name differs from the saved one')
+
+    if snapshot.sources_key != loaded_snapshot.sources_key:
+        raise ValueError('Loaded sources key differs from the saved one')
+
+    if snapshot.parse_version != loaded_snapshot.parse_version:
+        raise ValueError('Loaded parse version differs from the saved one')
+
+
+def check_snapshot_rejected(snapshot_path: Path, data: bytes):
+    # Damaged files have to load as None, so that the policy is parsed again
+    header_size = SNAPSHOT_HEADER.size
+    corrupt_datas = [
+        data[:size] for size in range(0, len(data), max(len(data) // 64, 1))
+    ]
+    corrupt_datas.append(data + b'\0\0\0\0')
+    for offset in range(0, header_size, 4):
+        corrupt_data = bytearray(data)
+        corrupt_data[offset : offset + 4] = b'\xff\xff\xff\xff'
+        corrupt_datas.append(bytes(corrupt_data))
+    # Invalid UTF-8 in the sources and in the strings
+    for offset in (header_size, len(data) - 1):
+        corrupt_data = bytearray(data)
+        corrupt_data[offset] = 0xFF
+        corrupt_datas.append(bytes(corrupt_data))
+
+    for corrupt_data in corrupt_datas:
+        snapshot_path.write_bytes(corrupt_data)
+        if load_snapshot(snapshot_path) is not None:
+            raise ValueError('Damaged snapshot loaded')
+
+    snapshot_path.write_bytes(data)
+
+
+def generate_check_snapshot():
+    # One of each kind of value the snapshot stores
+    expanded_rule = Rule(
+        'allow',
+        ('vendor_foo', 'vendor_bar', 'file'),
+        Perms(['read', 'open'], False),
+    )
+
+    rules = RuleContainer()
+    rules.add(expanded_rule, [LineMark('vendor/foo.te', 3)])
+    rules.add(
+        Rule(
+            'allow',
+            (
+                ConditionalType(['domain'], ['vendor_foo'], False),
+                'vendor_bar',
+                ClassSet(['file_class_set'], ['file', 'dir']),
+            ),
+            Perms(['read', 'write', 'open', 'search'], True),
+        ),
+        [LineMark('vendor/foo.te', 4), LineMark('vendor/bar.te', 1)],
+    )
+    rules.add(
+        Rule(
+            'allowxperm',
+            ('vendor_foo', 'vendor_bar', 'chr_file', 'ioctl'),
+            Ioctls([(0x10, 0x20), (0x5401, 0x5401)]),
+        )
+    )
+    rules.add(
+        Rule(
+            'type_transition',
+            ('vendor_foo', 'tmpfs', 'file'),
+            TypeTransitionTag('vendor_foo_tmpfs'),
+        )
+    )
+    rules.add(Rule('type', ('vendor_foo',), Types(['domain', 'coredomain'])))
+    rules.add(Rule('common', ('file',), OrderedPerms(['open', 'read'])))
+    rules.add(
+        Rule(
+            'r_dir_file',
+            ('vendor_foo', 'vendor_bar'),
+            is_macro=True,
+            expanded_rules=frozenset([expanded_rule]),
+        ),
+        [LineMark('vendor/foo.te', 3)],
+    )
+
+    genfs_rules = RuleContainer()
+    genfs_rules.add(Rule('genfscon', ('sysfs', '/devices/foo', 'sysfs_foo')))
+
+    return PolicySnapshot(
+        rules,
+        genfs_rules,
+        {
+            ContextsType.FILE_CONTEXTS_NAME: [
+                ('/vendor/bin/foo', 'u:object_r:vendor_foo_exec:s0'),
+            ],
+            ContextsType.PROPERTY_CONTEXTS_NAME: [
+                ('vendor.foo.', 'u:object_r:vendor_foo_prop:s0', 'prefix'),
+            ],
+        },
+        conditional_types_map={
+            'base_typeattr_1': ConditionalType([], ['vendor_foo'], True),
+        },
+        metadata=PolicyMetadata(
+            '202404',
+            FrozenDict({'target_board_api_level': '202404'}),
+        ),
+        classmap=Classmap(
+            {
+                'file': ['read', 'write', 'open'],
+                'dir': ['read', 'search'],
+            }
+        ),
+        policy_name='vendor',
+        sources_key=(('/vendor/etc/selinux/vendor.cil', '1', '2'),),
+        parse_version='202404',
+    )
+
+
+def check_snapshot(args: Namespace):
+    snapshot = generate_check_snapshot()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        snapshot_path = Path(tmp_dir, 'policy.snapshot')
+        save_snapshot(snapshot_path, snapshot)
+
+        loaded_snapshot = load_snapshot(
+            snapshot_path,
+            snapshot.sources_key,
+            snapshot.parse_version,
+        )
+        if loaded_snapshot is None:
+            raise ValueError('Saved snapshot could not be loaded')
+
+        check_snapshot_round_trip(snapshot, loaded_snapshot)
+
+        stale_sources_key = (('/vendor/etc/selinux/vendor.cil', '1', '3'),)
+        if (
+            load_snapshot(
+                snapshot_path,
+                stale_sources_key,
+                snapshot.parse_version,
+            )
+            is not None
+        ):
+            raise ValueError('Snapshot loaded for different sources')
+
+        if load_snapshot(snapshot_path, snapshot.sources_key) is not None:
+            raise ValueError('Snapshot loaded for a different version')
+
+        check_snapshot_rejected(snapshot_path, snapshot_path.read_bytes())
+
+    print('Snapshot round trip OK')
+
+
+def benchmark_snapshot(args: Namespace):
+    cil_paths = [Path(p) for p in args.cil]
+    sources_key = get_sources_key(cil_paths)
+
+    def baseline():
+        return parse_cil_files(cil_paths, version=None, verbose=False)
+
+    rules, genfs_rules, classmap = baseline()
+    snapshot = PolicySnapshot(
+        rules,
+        genfs_rules,
+        classmap=classmap,
+        sources_key=sources_key,
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        snapshot_path = Path(tmp_dir, 'policy.snapshot')
+        save_snapshot(snapshot_path, snapshot)
+
+        def current():
+            return load_snapshot(snapshot_path, sources_key)
+
+        loaded_snapshot = current()
+        if loaded_snapshot is None:
+            raise ValueError('Saved snapshot could not be loaded')
+
+        check_snapshot_round_trip(snapshot, loaded_snapshot)
+
+        stale_sources_key = sources_key + (('stale', '0', '0'),)
+        if load_snapshot(snapshot_path, stale_sources_key) is not None:
+            raise ValueError('Snapshot loaded for different sources')
+
+        check_snapshot_rejected(snapshot_path, snapshot_path.read_bytes())
+
+        print(f'Loading {len(rules)} rules')
+        print_timings(
+            'snapshot',
+            time_best(baseline, args.repeat),
+            time_best(current, args.repeat),
+        )
+
+
+def generate_ioctl_groups(
+    num_groups: int,
+    num_rules: int,
+    num_ranges: int,
+):
+    # Vendor policies allow long lists of ioctls to the same device, split
+    # across many rules that end up merged together
+    rng = random.Random(0)
+    groups: List[List[Ioctls]] = []
+
+    for _ in range(num_groups):
+        base = rng.randrange(0, 0xFF00)
+        group: List[Ioctls] = []
+        for _ in range(num_rules):
+            ranges: List[Tuple[int, int]] = []
+            for _ in range(num_ranges):
+                start = base + rng.randrange(0, 0xFF)
+                ranges.append((start, start + rng.randrange(0, 4)))
+            group.append(Ioctls(ranges))
+        groups.append(group)
+
+    return groups
+
+
+def benchmark_ioctls(args: Namespace):
+    groups = generate_ioctl_groups(args.groups, args.rules, args.ranges)
+
+    def baseline():
+        results: List[Ioctls] = []
+        for group in groups:
+            merged = group[0]
+            for ioctls in group[1:]:
+                merged = Ioctls(merged.ranges + ioctls.ranges)
+            results.append(merged)
+        return results
+
+    def current():
+        return [Ioctls.union(group) for group in groups]
+
+    if baseline() != current():
+        raise ValueError('Batched union differs from the pairwise merges')
+
+    print(
+        f'Merging {len(groups)} groups of {args.rules} rules '
+        f'with {args.ranges} ranges'
+    )
+    print_timings(
+        'union',
+        time_best(baseline, args.repeat),
+        time_best(current, args.repeat),
+    )
+
+
+def benchmark_sepolicy():
+    parser = ArgumentParser(
+        prog='benchmark_sepolicy.py',
+        description='Benchmark the sepolicy hot paths against their baseline',
+    )
+    parser.add_argument(
+        '-r',
+        '--repeat',
+        type=int,
+        default=5,
+        help='Number of runs, the best one is reported',
+    )
+
+    subparsers = parser.add_subparsers(required=True)
+
+    unpack = subparsers.add_parser(
+        'unpack',
+        help='Unpack CIL lines into their nested parts',
+    )
+    unpack.add_argument(
+        '-c',
+        '--cil',
+        action='append',
+        default=[],
+        metavar='PATH',
+        help='Path to a CIL file to read lines from, can be passed multiple '
+        'times, synthetic lines are used if not passed',
+    )
+    unpack.add_argument(
+        '-n',
+        '--lines',
+        type=int,
+        default=200000,
+        help='Number of synthetic lines',
+    )
+    unpack.set_defaults(func=benchmark_unpack)
+
+    unpack_te = subparsers.add_parser(
+        'unpack-te',
+        help='Unpack TE rule and macro lines into their nested parts',
+    )
+    unpack_te.add_argument(
+        '-n',
+        '--lines',
+        type=int,
+        default=200000,
+        help='Number of synthetic lines',
+    )
+    unpack_te.set_defaults(func=benchmark_unpack_te)
+
+    snapshot = subparsers.add_parser(
+        'snapshot',
+        help='Check the round trip of a policy snapshot, and time loading it '
+        'against parsing the CIL files',
+    )
+    snapshot.add_argument(
+        '-c',
+        '--cil',
+        action='append',
+        required=True,
+        metavar='PATH',
+        help='Path to a CIL file to parse, can be passed multiple times, the '
+        'first one has to define the classes',
+    )
+    snapshot.set_defaults(func=benchmark_snapshot)
+
+    snapshot_check = subparsers.add_parser(
+        'snapshot-check',
+        help='Check the round trip of a snapshot holding every kind of '
+        'policy value, and that damaged snapshots are rejected',
+    )
+    snapshot_check.set_defaults(func=check_snapshot)
+
+    ioctls = subparsers.add_parser(
+        'ioctls',
+        help='Merge the ioctls of groups of xperm rules',
+    )
+    ioctls.add_argument(
+        '-g',
+        '--groups',
+        type=int,
+        default=2000,
+        help='Number of groups of rules to merge',
+    )
+    ioctls.add_argument(
+        '-n',
+        '--rules',
+        type=int,
+        default=50,
+        help='Number of rules in each group',
+    )
+    ioctls.add_argument(
+        '-k',
+        '--ranges',
+        type=int,
+        default=8,
+        help='Number of ranges in each rule',
+    )
+    ioctls.set_defaults(func=benchmark_ioctls)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    benchmark_sepolicy()
@@ -5,9 +5,10 @@
 from __future__ import annotations
 
 import shutil
+import traceback
 from argparse import ArgumentParser
 from pathlib import Path
-from typing import List
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
 from sepolicy.add_policy_provider import AddPolicyProvider
 from sepolicy.binary_compiled_policy_provider import (
@@ -35,12 +36,19 @@ from sepolicy.output import group_rules, output_grouped_rules
 from sepolicy.policy import (
     Policy,
     PolicyIndex,
+    PolicySourceOrigin,
+    PolicyType,
+    get_policy_type_dependents_predicate,
     get_policy_types,
+    is_policy_type_dump_dependent,
     source_cleanup,
 )
 from sepolicy.referenced_policy_provider import ReferencedPolicyProvider
 from sepolicy.source_cil_policy_provider import SourceCilPolicyProvider
 from sepolicy.source_te_policy_provider import SourceTePolicyProvider
+from utils.file_watcher import FileWatcher, is_path_under
+from utils.tree_index import tree_index
+from utils.utils import Color, color_print
 
 
 def to_paths(paths: List[str]) -> List[Path]:
@@ -71,6 +79,198 @@ def process_policy_output(
     )
 
 
+def select_dump(
+    policy_index: PolicyIndex,
+    dump_dir: Path,
+    verbose: bool,
+):
+    # Policies parsed from the source tree do not depend on the dump, keep
+    # them around so that they can be shared with the next dumps
+    policy_index.discard(is_policy_type_dump_dependent)
+
+    policy_index.register(
+        DumpCilPolicyProvider(
+            dump_root=dump_dir,
+            verbose=verbose,
+        )
+    )
+    policy_index.register(
+        DumpBinaryPolicyProvider(
+            dump_root=dump_dir,
+            verbose=verbose,
+        )
+    )
+
+
+def output_dump(
+    policy_index: PolicyIndex,
+    output_dir: Path,
+    affected: Optional[Callable[[PolicyType], bool]] = None,
+):
+    if affected is None:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    for policy_type in get_policy_types():
+        if policy_type.output is None:
+            continue
+
+        if affected is not None:
+            if not affected(policy_type):
+                continue
+
+            shutil.rmtree(
+                Path(output_dir, policy_type.output.relative_dir),
+                ignore_errors=True,
+            )
+
+        policy = policy_index.find(policy_type)
+        if not policy:
+            continue
+
+        process_policy_output(
+            policy,
+            output_dir,
+        )
+
+
+def decompile_dump(
+    policy_index: PolicyIndex,
+    dump_dir: Path,
+    output_dir: Path,
+    verbose: bool,
+):
+    print(f'Decompiling {dump_dir} to {output_dir}')
+
+    select_dump(policy_index, dump_dir, verbose)
+    output_dump(policy_index, output_dir)
+
+
+def get_dump_watch_paths(dump_dir: Path):
+    # Only the files read from the dump, not the whole partitions
+    paths: List[Path] = []
+    if not dump_dir.is_dir():
+        return paths
+
+    for partition_dir in sorted(dump_dir.iterdir()):
+        if not partition_dir.is_dir():
+            continue
+
+        paths.append(Path(partition_dir, 'etc/selinux'))
+        paths.append(Path(partition_dir, 'build.prop'))
+
+    return [p for p in paths if p.exists()]
+
+
+def get_changed_source_predicate(
+    changed: Set[Path],
+    extra_macros_paths: Dict[Optional[str], List[Path]],
+    extra_rules_paths: Dict[Optional[str], List[Path]],
+):
+    # Extra macros and rules are only read by the source policy types, either
+    # by all of them or by the one they are keyed by
+    changed_names: Set[Optional[str]] = set()
+
+    for extra_paths in (extra_macros_paths, extra_rules_paths):
+        for name, paths in extra_paths.items():
+            if any(is_path_under(p, paths) for p in changed):
+                changed_names.add(name)
+
+    if not changed_names:
+        return None
+
+    def is_changed(policy_type: PolicyType):
+        if not isinstance(policy_type.origin, PolicySourceOrigin):
+            return False
+
+        return None in changed_names or policy_type.name in changed_names
+
+    return get_policy_type_dependents_predicate(is_changed)
+
+
+def watch_dumps(
+    policy_index: PolicyIndex,
+    dump_output_dirs: List[Tuple[Path, Path]],
+    extra_macros_paths: Dict[Optional[str], List[Path]],
+    extra_rules_paths: Dict[Optional[str], List[Path]],
+    register_source_providers: Callable[[], None],
+    interval: float,
+    verbose: bool,
+):
+    extra_paths = [
+        p
+        for extra_paths in (extra_macros_paths, extra_rules_paths)
+        for paths in extra_paths.values()
+        for p in paths
+    ]
+
+    def get_watch_paths():
+        # Partitions added to the dumps after the start, such as a new vendor
+        # sepolicy dir, are watched from the next poll
+        watch_paths = extra_paths.copy()
+        for dump_dir, _ in dump_output_dirs:
+            watch_paths.extend(get_dump_watch_paths(dump_dir))
+        return watch_paths
+
+    watcher = FileWatcher(get_watch_paths)
+    # The dump providers of the last dump are registered
+    current_dump_dir: Optional[Path] = dump_output_dirs[-1][0]
+    # Dumps left behind by a failed rebuild, decompiled again in full on the
+    # next change
+    failed_dump_dirs: Set[Path] = set()
+
+    while True:
+        print('Watching for changes')
+        changed = watcher.wait(interval)
+
+        if verbose:
+            for changed_path in sorted(changed):
+                print(f'Changed: {changed_path}')
+
+        try:
+            affected = get_changed_source_predicate(
+                changed,
+                extra_macros_paths,
+                extra_rules_paths,
+            )
+            if affected is not None:
+                # Drop the parsed macros and texts cached by the providers
+                tree_index.revalidate()
+                register_source_providers()
+                discarded = policy_index.discard(affected)
+                print(f'Invalidated {discarded} policies')
+
+            for dump_dir, output_dir in dump_output_dirs:
+                # Only the watched files of the dump are reported
+                dump_changed = dump_dir in failed_dump_dirs or any(
+                    is_path_under(p, [dump_dir]) for p in changed
+                )
+                if not dump_changed and affected is None:
+                    continue
+
+                print(f'Decompiling {dump_dir} to {output_dir}')
+
+                if dump_changed or dump_dir != current_dump_dir:
+                    select_dump(policy_index, dump_dir, verbose)
+                    current_dump_dir = dump_dir
+
+                output_dump(
+                    policy_index,
+                    output_dir,
+                    affected=None if dump_changed else affected,
+                )
+                failed_dump_dirs.discard(dump_dir)
+        except Exception:
+            # Errors in the edited files are expected while watching, keep
+            # going until the next change fixes them
+            traceback.print_exc()
+            color_print('Failed to decompile', color=Color.RED)
+            failed_dump_dirs.update(
+                dump_dir for dump_dir, _ in dump_output_dirs
+            )
+            current_dump_dir = None
+
+
 def decompile_cil():
     parser = ArgumentParser(
         prog='decompile_cil.py',
@@ -89,9 +289,10 @@ def decompile_cil():
     parser.add_argument(
         '-d',
         '--dump',
-        action='store',
+        action='append',
         required=True,
-        help='Path to dump to extract selinux from',
+        help='Path to dump to extract selinux from, can be passed multiple '
+        'times to decompile multiple dumps in one run',
     )
     parser.add_argument(
         '--extra-macros',
@@ -110,49 +311,74 @@ def decompile_cil():
     parser.add_argument(
         '-o',
         '--output',
-        action='store',
+        action='append',
         required=True,
-        help='Output directory for the decompiled selinux',
+        help='Output directory for the decompiled selinux, must be passed '
+        'once for each dump',
+    )
+
+    parser.add_argument(
+        '--tree-index',
+        action='store',
+        metavar='PATH',
+        help='Path to the cached listing of the source trees, it is '
+        'revalidated using the directory mtimes and updated after the run',
+    )
+
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='Keep running and decompile again the outputs affected by '
+        'changes to the dumps, extra macros and cleanup rules',
+    )
+    parser.add_argument(
+        '--watch-interval',
+        type=float,
+        default=1.0,
+        metavar='SECONDS',
+        help='Interval between checks for changes in watch mode',
     )
 
     args = parser.parse_args()
 
+    if len(args.dump) != len(args.output):
+        parser.error('--dump and --output must be passed the same times')
+
     current_policy: bool = args.current
     verbose: bool = args.verbose
-    extra_macros_paths = {None: to_paths(args.extra_macros)}
-    extra_rules_paths = {source_cleanup.name: to_paths(args.cleanup_rules)}
-    output_dir = Path(args.output)
-    dump_dir = Path(args.dump)
+    extra_macros_paths: Dict[Optional[str], List[Path]] = {
+        None: to_paths(args.extra_macros),
+    }
+    extra_rules_paths: Dict[Optional[str], List[Path]] = {
+        source_cleanup.name: to_paths(args.cleanup_rules),
+    }
+    dump_output_dirs = list(zip(to_paths(args.dump), to_paths(args.output)))
+    tree_index_path = Path(args.tree_index) if args.tree_index else None
+
+    if tree_index_path is not None:
+        tree_index.load(tree_index_path)
 
     policy_index = PolicyIndex()
     policy_index.register(HardcodedPolicyProvider())
     policy_index.register(ReferencedPolicyProvider())
-    policy_index.register(
-        SourceTePolicyProvider(
-            extra_rules_paths=extra_rules_paths,
-            extra_macros_paths=extra_macros_paths,
-            current=current_policy,
-            verbose=verbose,
+
+    def register_source_providers():
+        policy_index.register(
+            SourceTePolicyProvider(
+                extra_rules_paths=extra_rules_paths,
+                extra_macros_paths=extra_macros_paths,
+                current=current_policy,
+                verbose=verbose,
+            )
         )
-    )
+
+    register_source_providers()
     policy_index.register(
         SourceCilPolicyProvider(
             current=current_policy,
             verbose=verbose,
         )
     )
-    policy_index.register(
-        DumpCilPolicyProvider(
-            dump_root=dump_dir,
-            verbose=verbose,
-        )
-    )
-    policy_index.register(
-        DumpBinaryPolicyProvider(
-            dump_root=dump_dir,
-            verbose=verbose,
-        )
-    )
     policy_index.register(AddPolicyProvider())
     policy_index.register(CleanupPolicyProvider())
     policy_index.register(
@@ -191,20 +417,26 @@ def decompile_cil():
         )
     )
 
-    shutil.rmtree(output_dir, ignore_errors=True)
-    output_dir.mkdir(parents=True, exist_ok=True)
-
-    for policy_type in get_policy_types():
-        if policy_type.output is None:
-            continue
+    for dump_dir, output_dir in dump_output_dirs:
+        decompile_dump(
+            policy_index,
+            dump_dir,
+            output_dir,
+            verbose=verbose,
+        )
 
-        policy = policy_index.find(policy_type)
-        if not policy:
-            continue
+    if tree_index_path is not None:
+        tree_index.save(tree_index_path)
 
-        process_policy_output(
-            policy,
-            output_dir,
+    if args.watch:
+        watch_dumps(
+            policy_index,
+            dump_output_dirs,
+            extra_macros_paths,
+            extra_rules_paths,
+            register_source_providers,
+            interval=args.watch_interval,
+            verbose=verbose,
         )
 
 
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: The LineageOS Project
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import annotations
+
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import List, Optional
+
+from sepolicy.cil_policy import parse_cil_files
+from sepolicy.diff import diff_rules, diff_summary, format_diff
+
+
+def to_paths(paths: List[str]) -> List[Path]:
+    return [Path(p) for p in paths]
+
+
+def diff_cil():
+    parser = ArgumentParser(
+        prog='diff_cil.py',
+        description='Diff the rules of two CIL policies',
+    )
+    parser.add_argument(
+        '--verbose',
+        action='store_true',
+        help='Verbose output',
+    )
+    parser.add_argument(
+        '--version',
+        action='store',
+        help='Policy version to strip from versioned types (eg: 202404)',
+    )
+    parser.add_argument(
+        '-a',
+        '--old',
+        action='append',
+        required=True,
+        metavar='PATH',
+        help='Path to the old CIL file, can be passed multiple times, the '
+        'first file must define the classes',
+    )
+    parser.add_argument(
+        '-b',
+        '--new',
+        action='append',
+        required=True,
+        metavar='PATH',
+        help='Path to the new CIL file, can be passed multiple times, the '
+        'first file must define the classes',
+    )
+
+    args = parser.parse_args()
+
+    verbose: bool = args.verbose
+    version: Optional[str] = args.version
+
+    old_rules, old_genfs_rules, _ = parse_cil_files(
+        to_paths(args.old),
+        version=version,
+        verbose=verbose,
+    )
+    new_rules, new_genfs_rules, _ = parse_cil_files(
+        to_paths(args.new),
+        version=version,
+        verbose=verbose,
+    )
+
+    diff = diff_rules(old_rules, new_rules)
+    genfs_diff = diff_rules(old_genfs_rules, new_genfs_rules)
+
+    diff.added.extend(genfs_diff.added)
+    diff.removed.extend(genfs_diff.removed)
+    diff.changed.extend(genfs_diff.changed)
+
+    print(format_diff(diff))
+
+    summary = diff_summary(diff)
+    print(', '.join(f'{k}: {v}' for k, v in summary.items()))
+
+    return 1 if diff else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(diff_cil())
@@ -144,6 +144,19 @@ def generate_rro_main():
         help='Print verbose output',
         action='store_true',
     )
+    parser.add_argument(
+        '--framework-cache',
+        help='Path to the directory where the parsed framework-res.apk is '
+        'cached, keyed by the hash of its resource table',
+        type=Path,
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        help='Number of APKs to extract in parallel, defaults to the number '
+        'of CPUs',
+        type=int,
+    )
 
     args = parser.parse_args()
     exclude_overlays = set(cast(List[str], args.exclude_overlay))
@@ -212,6 +225,8 @@ def generate_rro_main():
                 for apk_data in apks_data
             ],
             framework_path,
+            jobs=args.jobs,
+            cache_dir=args.framework_cache,
         )
 
     overlays: List[Overlay] = []
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: The LineageOS Project
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import annotations
+
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+from typing import Optional
+
+from apk.apk_extract import load_apk_resource_index
+from apk.arsc_decode import split_resource_id
+from apk.arsc_index import ResourceIndex, format_indexed_value
+from utils.tree_index import compile_name_patterns
+
+
+def find_resource_id(
+    args: Namespace,
+    index: ResourceIndex,
+    framework_index: Optional[ResourceIndex],
+):
+    for search_index in (index, framework_index):
+        if search_index is None:
+            continue
+
+        resource_id = search_index.find(args.name)
+        if resource_id is not None:
+            return resource_id
+
+    raise ValueError(f'Resource {args.name} not found')
+
+
+def query_values(
+    args: Namespace,
+    index: ResourceIndex,
+    framework_index: Optional[ResourceIndex],
+):
+    resource_id = find_resource_id(args, index, framework_index)
+    if resource_id not in index.resources and framework_index is not None:
+        index, framework_index = framework_index, None
+
+    package_id, _, _ = split_resource_id(resource_id)
+
+    def name(resource_id: int):
+        return index.reference_name(resource_id, package_id, framework_index)
+
+    print(f'0x{resource_id:08x} {name(resource_id)}')
+
+    for resource in index.resources.get(resource_id, []):
+        config = resource.config or 'default'
+
+        if resource.value is not None:
+            value = format_indexed_value(
+                resource.value,
+                package_id,
+                index,
+                framework_index,
+            )
+            print(f'  {config}: {value}')
+            continue
+
+        parent = ''
+        if resource.parent_resource_id:
+            parent = f' parent={name(resource.parent_resource_id)}'
+        print(f'  {config}:{parent}')
+
+        for item_resource_id, item_value in resource.items:
+            value = format_indexed_value(
+                item_value,
+                package_id,
+                index,
+                framework_index,
+            )
+            print(f'    {name(item_resource_id)}: {value}')
+
+
+def query_references(
+    args: Namespace,
+    index: ResourceIndex,
+    framework_index: Optional[ResourceIndex],
+):
+    resource_id = find_resource_id(args, index, framework_index)
+    package_id, _, _ = split_resource_id(resource_id)
+
+    referenced_by = index.referenced_by
+    if args.reverse:
+        referenced_by = index.references
+
+    for referencing_resource_id in referenced_by.get(resource_id, []):
+        name = index.reference_name(
+            referencing_resource_id,
+            package_id,
+            framework_index,
+        )
+        print(f'0x{referencing_resource_id:08x} {name}')
+
+
+def query_names(
+    args: Namespace,
+    index: ResourceIndex,
+    framework_index: Optional[ResourceIndex],
+):
+    pattern = compile_name_patterns(frozenset([args.pattern]))
+
+    for resource_id, name in index.names.items():
+        if pattern.match(name):
+            print(f'0x{resource_id:08x} {name}')
+
+
+def query_apk():
+    parser = ArgumentParser(
+        prog='query_apk.py',
+        description='Query the resources of an APK',
+    )
+    parser.add_argument(
+        '--cache',
+        action='store',
+        metavar='DIR',
+        help='Directory to cache the resource indexes in, keyed by the '
+        'contents of the resource table',
+    )
+    parser.add_argument(
+        '--framework',
+        action='store',
+        metavar='PATH',
+        help='Path to the framework-res.apk, used to name and look up '
+        'framework resources',
+    )
+    parser.add_argument(
+        'apk',
+        help='Path to the APK',
+    )
+
+    subparsers = parser.add_subparsers(required=True)
+
+    values = subparsers.add_parser(
+        'values',
+        help='Print the values of a resource across configs',
+    )
+    values.add_argument(
+        'name',
+        help='Resource name or id (eg: @bool/config_x, 0x7f010000)',
+    )
+    values.set_defaults(func=query_values)
+
+    references = subparsers.add_parser(
+        'references',
+        help='Print the resources referencing a resource',
+    )
+    references.add_argument(
+        'name',
+        help='Resource name or id (eg: @string/y, 0x01040000)',
+    )
+    references.add_argument(
+        '-r',
+        '--reverse',
+        action='store_true',
+        help='Print the resources referenced by the resource instead',
+    )
+    references.set_defaults(func=query_references)
+
+    names = subparsers.add_parser(
+        'names',
+        help='Print the ids of the resources matching a name',
+    )
+    names.add_argument(
+        'pattern',
+        help='Resource type/name, can be a glob pattern (eg: bool/config_*)',
+    )
+    names.set_defaults(func=query_names)
+
+    args = parser.parse_args()
+
+    cache_dir = Path(args.cache) if args.cache else None
+
+    index = load_apk_resource_index(Path(args.apk), cache_dir)
+
+    framework_index = None
+    if args.framework is not None:
+        framework_index = load_apk_resource_index(
+            Path(args.framework),
+            cache_dir,
+        )
+
+    try:
+        args.func(args, index, framework_index)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+if __name__ == '__main__':
+    query_apk()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: The LineageOS Project
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import annotations
+
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import List, Optional
+
+from sepolicy.cil_policy import parse_cil_files
+from sepolicy.query import RuleQuerier, RuleQuery
+from sepolicy.snapshot import (
+    PolicySnapshot,
+    get_sources_key,
+    load_snapshot,
+    save_snapshot,
+)
+
+
+def to_paths(paths: List[str]) -> List[Path]:
+    return [Path(p) for p in paths]
+
+
+def split_values(value: Optional[str]):
+    if value is None:
+        return None
+
+    return frozenset(v for v in value.split(',') if v)
+
+
+def query_sepolicy():
+    parser = ArgumentParser(
+        prog='query_sepolicy.py',
+        description='Query the rules of a CIL policy',
+    )
+    parser.add_argument(
+        '--verbose',
+        action='store_true',
+        help='Verbose output',
+    )
+    parser.add_argument(
+        '--version',
+        action='store',
+        help='Policy version to strip from versioned types (eg: 202404)',
+    )
+    parser.add_argument(
+        '-c',
+        '--cil',
+        action='append',
+        default=[],
+        metavar='PATH',
+        help='Path to the CIL file, can be passed multiple times, the '
+        'first file must define the classes',
+    )
+    parser.add_argument(
+        '--snapshot',
+        action='store',
+        metavar='PATH',
+        help='Path to the snapshot of the parsed rules, it is refreshed if '
+        'the CIL files or the version changed, or used as-is if no CIL file '
+        'is passed',
+    )
+    parser.add_argument(
+        '-t',
+        '--type',
+        action='store',
+        help='Comma-separated rule types (eg: allow,allowxperm)',
+    )
+    parser.add_argument(
+        '-s',
+        '--source',
+        action='store',
+        help='Comma-separated source types',
+    )
+    parser.add_argument(
+        '-d',
+        '--target',
+        action='store',
+        help='Comma-separated target types',
+    )
+    parser.add_argument(
+        '-k',
+        '--class',
+        action='store',
+        dest='class_name',
+        help='Comma-separated classes',
+    )
+    parser.add_argument(
+        '-p',
+        '--perm',
+        action='store',
+        help='Comma-separated permissions, any of them has to be allowed',
+    )
+    parser.add_argument(
+        '-x',
+        '--xperm',
+        action='store',
+        help='Extended permission (eg: 0x5401)',
+    )
+    parser.add_argument(
+        '-e',
+        '--expand',
+        action='store_true',
+        help='Also match rules on attributes containing the queried types',
+    )
+
+    args = parser.parse_args()
+
+    verbose: bool = args.verbose
+    cil_paths = to_paths(args.cil)
+    snapshot_path = Path(args.snapshot) if args.snapshot else None
+
+    if not cil_paths and snapshot_path is None:
+        parser.error('either --cil or --snapshot is required')
+
+    # Check the query before parsing the policy
+    try:
+        xperm = int(args.xperm, base=0) if args.xperm else None
+    except ValueError:
+        parser.error(f'Invalid extended permission: {args.xperm}')
+
+    query = RuleQuery(
+        rule_types=split_values(args.type),
+        sources=split_values(args.source),
+        targets=split_values(args.target),
+        classes=split_values(args.class_name),
+        perms=split_values(args.perm),
+        xperm=xperm,
+    )
+
+    sources_key = get_sources_key(cil_paths) if cil_paths else None
+
+    snapshot = None
+    if snapshot_path is not None:
+        # Snapshots parsed for another version are not reused either
+        snapshot = load_snapshot(snapshot_path, sources_key, args.version)
+        if snapshot is None and not cil_paths:
+            parser.error(
+                f'{snapshot_path} is not a valid snapshot, or was parsed '
+                'with another --version'
+            )
+
+    if snapshot is None:
+        assert sources_key is not None
+
+        rules, genfs_rules, classmap = parse_cil_files(
+            cil_paths,
+            version=args.version,
+            verbose=verbose,
+        )
+        snapshot = PolicySnapshot(
+            rules,
+            genfs_rules,
+            classmap=classmap,
+            sources_key=sources_key,
+            parse_version=args.version,
+        )
+
+        if snapshot_path is not None:
+            save_snapshot(snapshot_path, snapshot)
+
+    querier = RuleQuerier(snapshot.rules)
+    try:
+        rules = querier.query(query, expand=args.expand)
+    except ValueError as e:
+        parser.error(str(e))
+
+    for rule in sorted(map(str, rules)):
+        print(rule)
+
+
+if __name__ == '__main__':
+    query_sepolicy()
@@ -23,7 +23,7 @@ from sepolicy.cil_rule import (
     CIL_COMMENT_MARKER,
     CilRuleParser,
     CilRuleType,
-    unpack_cil_line,
+    unpack_cil_lines,
 )
 from sepolicy.classmap import Classmap
 from sepolicy.compile_utils import binary_to_cil_policy
@@ -285,7 +285,7 @@ def _parse_cil_lines(
     genfs_rules: RuleContainer,
     conditional_types_map: Dict[str, ConditionalType],
     reference_conditional_types_maps: List[Dict[str, ConditionalType]],
-    version: str,
+    version: Optional[str],
     classmap: Optional[Classmap] = None,
     allowed_types: Optional[FrozenSet[str]] = None,
     disallowed_types: Optional[FrozenSet[str]] = None,
@@ -332,7 +332,7 @@ def parse_cil_lines(
     conditional_types_map: Dict[str, ConditionalType],
     reference_conditional_types_maps: List[Dict[str, ConditionalType]],
     classmap: Optional[Classmap],
-    version: str,
+    version: Optional[str],
     name: str,
     verbose: bool,
 ):
@@ -395,7 +395,8 @@ def read_cil_lines(
 
     cil_data = cil_path.read_text()
 
-    line_parts_list: List[cil_line_type] = []
+    lines: List[str] = []
+    marks: List[Optional[LineMark]] = []
     current_mark: Optional[LineMark] = None
 
     for line in cil_data.splitlines():
@@ -410,15 +411,55 @@ def read_cil_lines(
                 current_mark = None
             continue
 
-        parts = unpack_cil_line(line)
+        lines.append(line)
+        marks.append(current_mark)
+
+    line_parts_list: List[cil_line_type] = []
+
+    # Unpack the whole file at once, most lines take the fast path
+    for line, parts, mark in zip(lines, unpack_cil_lines(lines), marks):
         if parts is None:
             continue
 
-        line_parts_list.append((line, parts, current_mark))
+        line_parts_list.append((line, parts, mark))
 
     return line_parts_list
 
 
+def parse_cil_files(
+    cil_paths: List[Path],
+    version: Optional[str],
+    verbose: bool,
+):
+    # Files are parsed in order into the same containers, the first one has
+    # to define the classes, and the later ones can reference the generated
+    # typeattributesets of the earlier ones (eg: plat_pub_versioned.cil
+    # followed by vendor_sepolicy.cil)
+    genfs_rules = RuleContainer()
+    rules = RuleContainer()
+    conditional_types_maps: List[Dict[str, ConditionalType]] = []
+    classmap: Optional[Classmap] = None
+
+    for cil_path in cil_paths:
+        conditional_types_map: Dict[str, ConditionalType] = {}
+
+        classmap = parse_cil_lines(
+            cil_path,
+            rules,
+            genfs_rules,
+            conditional_types_map,
+            reference_conditional_types_maps=conditional_types_maps[:],
+            classmap=classmap,
+            version=version,
+            name=cil_path.name,
+            verbose=verbose,
+        )
+
+        conditional_types_maps.append(conditional_types_map)
+
+    return rules, genfs_rules, classmap
+
+
 def decompile_binary_to_policy(
     binary_path: Path,
     policy_type: PolicyType,
@@ -14,6 +14,7 @@ from sepolicy.rule import (
     raw_part,
     raw_parts_list,
     unpack_line,
+    unpack_lines,
 )
 from sepolicy.varargs import Ioctls, OrderedPerms, Perms, TypeTransitionTag
 from utils.utils import Color, color_print
@@ -216,6 +217,23 @@ def unpack_cil_line(line: str):
     return parts
 
 
+def unpack_cil_lines(lines: List[str]) -> List[Optional[raw_parts_list]]:
+    valid_lines = [line for line in lines if is_valid_cil_line(line)]
+    parts_list = iter(unpack_lines(valid_lines, '(', ')', ' '))
+
+    # Keep the output aligned with the input lines
+    results: List[Optional[raw_parts_list]] = []
+    for line in lines:
+        if not is_valid_cil_line(line):
+            results.append(None)
+            continue
+
+        parts = next(parts_list)
+        results.append(parts if parts else None)
+
+    return results
+
+
 class CilRuleParser:
     def __init__(
         self,
@@ -11,9 +11,17 @@ class ClassSet:
         self.__hash_values = frozenset(values)
         self.__hash = hash(self.__hash_values)
 
+    @property
+    def names(self):
+        return self.__names
+
     def __iter__(self):
         return iter(self.__values)
 
+    def __reduce__(self):
+        # The cached hash is only valid for the current process
+        return ClassSet, (self.__names, self.__values)
+
     def __eq__(self, other: object):
         if not isinstance(other, ClassSet):
             return False
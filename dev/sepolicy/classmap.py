@@ -7,7 +7,7 @@ from collections import defaultdict
 from typing import Dict, List
 
 from sepolicy.rule_container import RuleContainer
-from sepolicy.varargs import OrderedPerms
+from sepolicy.varargs import OrderedPerms, perms_registry
 from utils.utils import split_normalize_text
 
 
@@ -121,6 +121,14 @@ def extract_classmap_from_rules(rules: RuleContainer):
 class Classmap:
     def __init__(self, class_perms_map: Dict[str, List[str]]):
         self.__class_perms_map = class_perms_map
+        self.__class_perms_masks: Dict[str, int] = {}
+
+        for perms in class_perms_map.values():
+            perms_registry.register(perms)
+
+    def __reduce__(self):
+        # Register the perms again in the process the classmap is sent to
+        return Classmap, (self.__class_perms_map,)
 
     @classmethod
     def from_text(cls, text: str):
@@ -130,6 +138,9 @@ class Classmap:
     def from_rules(cls, rules: RuleContainer):
         return cls(extract_classmap_from_rules(rules))
 
+    def classes(self):
+        return iter(self.__class_perms_map)
+
     def class_types(self, t: str):
         for key in self.__class_perms_map:
             if key.endswith(t):
@@ -140,3 +151,12 @@ class Classmap:
 
     def class_perms_set(self, class_name: str):
         return set(self.__class_perms_map[class_name])
+
+    def class_perms_mask(self, class_name: str):
+        mask = self.__class_perms_masks.get(class_name)
+        if mask is None:
+            perms = self.__class_perms_map[class_name]
+            mask = perms_registry.mask(perms)
+            self.__class_perms_masks[class_name] = mask
+
+        return mask
@@ -20,6 +20,14 @@ class ConditionalType:
         )
         self.__hash = hash(self.__hash_values)
 
+    def __reduce__(self):
+        # The cached hash is only valid for the current process
+        return ConditionalType, (
+            self.__positive,
+            self.__negative,
+            self.__is_all,
+        )
+
     @property
     def hash(self):
         return self.__hash
@@ -0,0 +1,226 @@
+# SPDX-FileCopyrightText: The LineageOS Project
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import (
+    DefaultDict,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from sepolicy.rule import (
+    ALLOW_RULE_TYPES,
+    IOCTL_RULE_TYPES,
+    Rule,
+    RuleType,
+    rule_part,
+)
+from sepolicy.rule_container import RuleContainer
+from sepolicy.varargs import Ioctls, Perms
+
+RuleKey = Tuple[str, Tuple[rule_part, ...]]
+# Either the merged perms, the merged ioctls, or the set of all the other
+# varargs found for the same rule key
+MergedVarargs = Hashable
+
+CLASS_RULE_TYPES = frozenset(
+    {
+        *ALLOW_RULE_TYPES,
+        *IOCTL_RULE_TYPES,
+        RuleType.TYPE_TRANSITION,
+    }
+)
+
+
+@dataclass
+class RuleChange:
+    old: Rule
+    new: Rule
+    added: Optional[str]
+    removed: Optional[str]
+
+
+@dataclass
+class PolicyDiff:
+    added: List[Rule] = field(default_factory=lambda: [])
+    removed: List[Rule] = field(default_factory=lambda: [])
+    changed: List[RuleChange] = field(default_factory=lambda: [])
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+
+def rule_key(rule: Rule) -> RuleKey:
+    return rule.rule_type, rule.parts
+
+
+def rule_class_name(rule: Rule) -> Optional[str]:
+    if rule.rule_type not in CLASS_RULE_TYPES:
+        return None
+
+    return str(rule.parts[2])
+
+
+def merge_varargs(rules: List[Rule]) -> MergedVarargs:
+    varargs = [rule.varargs for rule in rules]
+    first = varargs[0]
+
+    if isinstance(first, Perms):
+        merged_perms = first
+        for v in varargs[1:]:
+            assert isinstance(v, Perms)
+            merged_perms = merged_perms | v
+        return merged_perms
+
+    if isinstance(first, Ioctls):
+        ioctls_list: List[Ioctls] = []
+        for v in varargs:
+            assert isinstance(v, Ioctls)
+            ioctls_list.append(v)
+        return Ioctls.union(ioctls_list)
+
+    return frozenset(varargs)
+
+
+def group_rules_by_key(rules: RuleContainer):
+    # The same rule can be split across multiple CIL statements with
+    # different varargs, align them by the hashed (rule_type, parts) key
+    grouped: DefaultDict[RuleKey, List[Rule]] = defaultdict(list)
+    for rule in rules:
+        grouped[rule_key(rule)].append(rule)
+
+    return {
+        key: (key_rules, merge_varargs(key_rules))
+        for key, key_rules in grouped.items()
+    }
+
+
+def merged_rule(key: RuleKey, rules: List[Rule], varargs: MergedVarargs):
+    if isinstance(varargs, (Perms, Ioctls)):
+        return Rule(key[0], key[1], varargs)
+
+    assert len(rules) == 1
+    return rules[0]
+
+
+def varargs_difference(a: MergedVarargs, b: MergedVarargs) -> Optional[str]:
+    if isinstance(a, Perms) and isinstance(b, Perms):
+        perms = a - b
+        if not perms:
+            return None
+        return str(perms)
+
+    if isinstance(a, Ioctls) and isinstance(b, Ioctls):
+        ioctls = a - b
+        if ioctls == Ioctls([]):
+            return None
+        return str(ioctls)
+
+    return None
+
+
+def diff_rules(old: RuleContainer, new: RuleContainer):
+    old_grouped = group_rules_by_key(old)
+    new_grouped = group_rules_by_key(new)
+
+    diff = PolicyDiff()
+
+    for key, (old_rules, old_varargs) in old_grouped.items():
+        new_data = new_grouped.get(key)
+        if new_data is None:
+            diff.removed.extend(old_rules)
+            continue
+
+        new_rules, new_varargs = new_data
+        if old_varargs == new_varargs:
+            continue
+
+        old_rule = merged_rule(key, old_rules, old_varargs)
+        new_rule = merged_rule(key, new_rules, new_varargs)
+
+        # Rules without mergeable varargs are not comparable, treat them as
+        # replaced
+        if not isinstance(old_varargs, (Perms, Ioctls)):
+            diff.removed.extend(old_rules)
+            diff.added.extend(new_rules)
+            continue
+
+        diff.changed.append(
+            RuleChange(
+                old_rule,
+                new_rule,
+                added=varargs_difference(new_varargs, old_varargs),
+                removed=varargs_difference(old_varargs, new_varargs),
+            )
+        )
+
+    for key, (new_rules, _) in new_grouped.items():
+        if key not in old_grouped:
+            diff.added.extend(new_rules)
+
+    return diff
+
+
+def group_diff(diff: PolicyDiff):
+    # rule type -> class name -> lines
+    grouped: DefaultDict[
+        str,
+        DefaultDict[Optional[str], List[Tuple[str, str]]],
+    ] = defaultdict(lambda: defaultdict(list))
+
+    def add(rule: Rule, marker: str, text: str):
+        grouped[rule.rule_type][rule_class_name(rule)].append((marker, text))
+
+    for rule in diff.added:
+        add(rule, '+', str(rule))
+
+    for rule in diff.removed:
+        add(rule, '-', str(rule))
+
+    for change in diff.changed:
+        text = str(change.new)
+        if change.added is not None:
+            text += f'\n\t+ {change.added}'
+        if change.removed is not None:
+            text += f'\n\t- {change.removed}'
+        add(change.new, '~', text)
+
+    return grouped
+
+
+def format_diff(diff: PolicyDiff):
+    lines: List[str] = []
+    grouped = group_diff(diff)
+
+    for rule_type in sorted(grouped):
+        classes = grouped[rule_type]
+
+        for class_name in sorted(classes, key=lambda c: c or ''):
+            entries = classes[class_name]
+            entries.sort(key=lambda e: (e[1], e[0]))
+
+            if class_name is None:
+                lines.append(f'{rule_type}: {len(entries)}')
+            else:
+                lines.append(f'{rule_type} {class_name}: {len(entries)}')
+
+            for marker, text in entries:
+                lines.append(f'{marker} {text}')
+
+            lines.append('')
+
+    return '\n'.join(lines)
+
+
+def diff_summary(diff: PolicyDiff) -> Dict[str, int]:
+    return {
+        'added': len(diff.added),
+        'removed': len(diff.removed),
+        'changed': len(diff.changed),
+    }
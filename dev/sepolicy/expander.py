@@ -8,6 +8,7 @@ from typing import (
     Dict,
     FrozenSet,
     Iterator,
+    Optional,
     Set,
     Tuple,
     Union,
@@ -53,6 +54,7 @@ class Resolver:
         self.__expanded: Set[str] = set()
         self.__excluded: Dict[str, Set[str]] = defaultdict(set)
         self.__cache: Dict[Tuple[str, bool], FrozenSet[str]] = {}
+        self.__attributes_of: Optional[Dict[str, Set[str]]] = None
 
         for rule in rules:
             self.__add_rule(rule)
@@ -78,6 +80,19 @@ class Resolver:
     def is_attribute(self, name: str) -> bool:
         return name in self.__attributes
 
+    def attributes_of(self, name: str) -> FrozenSet[str]:
+        # Reverse of resolve(), all the attributes that fully expand to a set
+        # containing the given type
+        attributes_of = self.__attributes_of
+        if attributes_of is None:
+            attributes_of = defaultdict(set)
+            for attribute in self.__members:
+                for t in self.resolve(attribute, True):
+                    attributes_of[t].add(attribute)
+            self.__attributes_of = attributes_of
+
+        return frozenset(attributes_of.get(name, ()))
+
     def exclude_member(self, attribute: str, member: str) -> bool:
         # Drop a single member from an attribute's effective expansion,
         # mirroring how a recovery build (with the not_recovery()-guarded
@@ -87,6 +102,7 @@ class Resolver:
             return False
         excluded.add(member)
         self.__cache.clear()
+        self.__attributes_of = None
         return True
 
     def resolve(
@@ -10,6 +10,7 @@ from typing import (
     List,
     Set,
     Tuple,
+    Union,
 )
 
 from sepolicy.classmap import Classmap
@@ -21,10 +22,14 @@ from sepolicy.source_rule import (
     unpack_ioctls,
 )
 from sepolicy.varargs import Ioctls
-from utils.utils import Color, color_print
+from utils.utils import Color, color_print, process_map_chunks
 
 MACRO_DEFINITION_START = 'define(`'
 
+# Below this number of macros, parsing in the current process is faster than
+# sending the macro bodies and the parsed rules to worker processes
+PARALLEL_PARSE_MIN_MACROS = 2000
+
 
 def _macro_name_body(macro: str):
     if not macro.startswith(MACRO_DEFINITION_START):
@@ -109,17 +114,13 @@ def categorize_macros(expanded_macros: List[Tuple[str, str]]):
     return macros, class_sets, perms
 
 
-def parse_macros(
-    classmap: Classmap,
+def parse_macro_bodies(
     expanded_macros: List[Tuple[str, str]],
+    classmap: Classmap,
 ):
-    expanded_macro_rules: List[Tuple[str, List[Rule]]] = []
-    unqiue_macro_name_rules: Set[Tuple[str, FrozenSet[Rule]]] = set()
-    unique_macro_rules: Dict[FrozenSet[Rule], str] = {}
-    invalid_macro_names: Set[str] = set()
-    macro_names: Set[str] = set()
+    results: List[Union[List[Rule], Exception]] = []
 
-    for name, body in expanded_macros:
+    for _, body in expanded_macros:
         rules: List[Rule] = []
 
         parser = SourceRuleParser(
@@ -131,8 +132,40 @@ def parse_macros(
             for rule_text in split_normalize_rules_text(body):
                 parser.parse_line(rule_text)
         except (ValueError, AssertionError) as e:
+            results.append(e)
+            continue
+
+        results.append(rules)
+
+    return results
+
+
+def parse_macros(
+    classmap: Classmap,
+    expanded_macros: List[Tuple[str, str]],
+):
+    expanded_macro_rules: List[Tuple[str, List[Rule]]] = []
+    unqiue_macro_name_rules: Set[Tuple[str, FrozenSet[Rule]]] = set()
+    unique_macro_rules: Dict[FrozenSet[Rule], str] = {}
+    invalid_macro_names: Set[str] = set()
+    macro_names: Set[str] = set()
+
+    # Macro bodies are independent of each other, parse them in parallel and
+    # deduplicate them in order
+    parsed_macros = process_map_chunks(
+        parse_macro_bodies,
+        expanded_macros,
+        classmap,
+        min_items=PARALLEL_PARSE_MIN_MACROS,
+    )
+
+    for (name, _), rules in zip(expanded_macros, parsed_macros):
+        if isinstance(rules, Exception):
             if name not in invalid_macro_names:
-                color_print(f'Invalid macro {name}: {e}', color=Color.YELLOW)
+                color_print(
+                    f'Invalid macro {name}: {rules}',
+                    color=Color.YELLOW,
+                )
                 invalid_macro_names.add(name)
             continue
 
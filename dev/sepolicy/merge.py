@@ -102,13 +102,12 @@ def merge_ioctl_rules_same_class(rules: List[Rule]):
             group_rules = []
             return
 
-        merged_ioctls = None
+        group_ioctls: List[Ioctls] = []
         for rule in group_rules:
             assert isinstance(rule.varargs, Ioctls)
-            if merged_ioctls is None:
-                merged_ioctls = rule.varargs
-            else:
-                merged_ioctls = merged_ioctls.merge(rule.varargs)
+            group_ioctls.append(rule.varargs)
+
+        merged_ioctls = Ioctls.union(group_ioctls)
 
         base_rule = group_rules[0]
         group_rules = []
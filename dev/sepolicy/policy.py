@@ -4,9 +4,10 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from enum import StrEnum
-from typing import Dict, Iterator, List, Optional, Tuple, Type
+from functools import cache
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Type
 
 from sepolicy.classmap import Classmap
 from sepolicy.conditional_type import ConditionalType
@@ -815,6 +816,53 @@ def get_policy_type_by_name(policy_name: str):
     return policy_type_index[policy_name]
 
 
+def get_policy_type_sources(policy_type: PolicyType) -> Iterator[PolicyType]:
+    origin = policy_type.origin
+
+    for origin_field in fields(origin):
+        value = getattr(origin, origin_field.name)
+        if isinstance(value, PolicyType):
+            yield value
+        elif isinstance(value, tuple):
+            for v in value:
+                if isinstance(v, PolicyType):
+                    yield v
+
+
+@cache
+def is_policy_type_dump_dependent(policy_type: PolicyType) -> bool:
+    if isinstance(policy_type.origin, PolicyDumpOrigin):
+        return True
+
+    return any(
+        is_policy_type_dump_dependent(source)
+        for source in get_policy_type_sources(policy_type)
+    )
+
+
+def get_policy_type_dependents_predicate(
+    predicate: Callable[[PolicyType], bool],
+) -> Callable[[PolicyType], bool]:
+    # Matches the policy types matched by the predicate and all the policy
+    # types built on top of them
+    affected_map: Dict[PolicyType, bool] = {}
+
+    def is_affected(policy_type: PolicyType) -> bool:
+        affected = affected_map.get(policy_type)
+        if affected is not None:
+            return affected
+
+        affected = predicate(policy_type) or any(
+            is_affected(source)
+            for source in get_policy_type_sources(policy_type)
+        )
+        affected_map[policy_type] = affected
+
+        return affected
+
+    return is_affected
+
+
 @dataclass(frozen=True)
 class PolicyMetadata:
     version: str
@@ -958,6 +1006,16 @@ class PolicyIndex:
 
         raise ValueError(f'Failed to parse {policy_type.name}')
 
+    def discard(self, predicate: Callable[[PolicyType], bool]):
+        discarded_keys = [
+            key for key in self.__policies if predicate(key.policy_type)
+        ]
+
+        for key in discarded_keys:
+            del self.__policies[key]
+
+        return len(discarded_keys)
+
     def get(
         self,
         policy_type: PolicyType,
@@ -0,0 +1,162 @@
+# SPDX-FileCopyrightText: The LineageOS Project
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import (
+    Dict,
+    FrozenSet,
+    List,
+    Optional,
+    Set,
+)
+
+from sepolicy.conditional_type import ConditionalType
+from sepolicy.expander import Resolver
+from sepolicy.rule import (
+    ALLOW_RULE_TYPES,
+    IOCTL_RULE_TYPES,
+    Rule,
+    RuleType,
+    rule_part,
+)
+from sepolicy.rule_container import RuleContainer
+from sepolicy.varargs import Ioctls, Perms
+
+# Number of parts of each queryable rule type, needed to pick the match
+# index level
+QUERY_RULE_TYPES_PARTS: Dict[str, int] = {
+    **{rule_type: 3 for rule_type in ALLOW_RULE_TYPES},
+    **{rule_type: 4 for rule_type in IOCTL_RULE_TYPES},
+    RuleType.TYPE_TRANSITION: 4,
+}
+
+SELF_TYPE = 'self'
+
+
+@dataclass(frozen=True)
+class RuleQuery:
+    rule_types: Optional[FrozenSet[str]] = None
+    sources: Optional[FrozenSet[str]] = None
+    targets: Optional[FrozenSet[str]] = None
+    classes: Optional[FrozenSet[str]] = None
+    perms: Optional[FrozenSet[str]] = None
+    xperm: Optional[int] = None
+
+
+class RuleQuerier:
+    def __init__(self, rules: RuleContainer):
+        self.__rules = rules
+        self.__resolver = Resolver(rules)
+        self.__conditional_types: Optional[Set[ConditionalType]] = None
+
+    def __get_conditional_types(self):
+        conditional_types = self.__conditional_types
+        if conditional_types is not None:
+            return conditional_types
+
+        conditional_types = set()
+        for rule in self.__rules:
+            if rule.rule_type not in QUERY_RULE_TYPES_PARTS:
+                continue
+
+            for part in rule.parts[:2]:
+                if isinstance(part, ConditionalType):
+                    conditional_types.add(part)
+
+        self.__conditional_types = conditional_types
+        return conditional_types
+
+    def __expand_types(self, names: FrozenSet[str]):
+        # Match rules written for the given types, for the attributes they
+        # are part of, and for conditional types that contain them
+        keys: Set[rule_part] = set(names)
+        resolved: Set[str] = set()
+
+        for name in names:
+            keys.update(self.__resolver.attributes_of(name))
+            resolved.update(self.__resolver.resolve(name, True))
+
+        for conditional_type in self.__get_conditional_types():
+            expanded = self.__resolver.resolve_conditional(conditional_type)
+            if not expanded.isdisjoint(resolved):
+                keys.add(conditional_type)
+
+        return frozenset(keys)
+
+    def __match_rule_type(
+        self,
+        rule_type: str,
+        sources: Optional[FrozenSet[rule_part]],
+        targets: Optional[FrozenSet[rule_part]],
+        classes: Optional[FrozenSet[str]],
+    ):
+        num_parts = QUERY_RULE_TYPES_PARTS[rule_type]
+
+        keys = [rule_type, sources, targets, classes]
+        keys.extend([None] * (num_parts - 3))
+        # varargs
+        keys.append(None)
+
+        return self.__rules.match(keys)
+
+    @staticmethod
+    def __filter_varargs(rule: Rule, query: RuleQuery):
+        if query.perms is not None:
+            if not isinstance(rule.varargs, Perms):
+                return False
+
+            if not any(p in rule.varargs for p in query.perms):
+                return False
+
+        if query.xperm is not None:
+            if not isinstance(rule.varargs, Ioctls):
+                return False
+
+            if query.xperm not in rule.varargs:
+                return False
+
+        return True
+
+    def query(self, query: RuleQuery, expand: bool = False) -> List[Rule]:
+        sources: Optional[FrozenSet[rule_part]] = query.sources
+        targets: Optional[FrozenSet[rule_part]] = query.targets
+
+        if expand and query.sources is not None:
+            sources = self.__expand_types(query.sources)
+
+        if expand and query.targets is not None:
+            targets = self.__expand_types(query.targets) | {SELF_TYPE}
+
+        rule_types = query.rule_types
+        if rule_types is None:
+            rule_types = frozenset(QUERY_RULE_TYPES_PARTS)
+
+        results: List[Rule] = []
+
+        for rule_type in sorted(rule_types):
+            if rule_type not in QUERY_RULE_TYPES_PARTS:
+                raise ValueError(f'Unsupported rule type: {rule_type}')
+
+            for rule in self.__match_rule_type(
+                rule_type,
+                sources,
+                targets,
+                query.classes,
+            ):
+                if not self.__filter_varargs(rule, query):
+                    continue
+
+                # self only matches when the source is also a target
+                if (
+                    targets is not None
+                    and rule.parts[1] == SELF_TYPE
+                    and SELF_TYPE not in query.targets
+                    and rule.parts[0] not in targets
+                ):
+                    continue
+
+                results.append(rule)
+
+        return results
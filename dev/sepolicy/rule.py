@@ -6,14 +6,17 @@ from __future__ import annotations
 import re
 from functools import cache
 from typing import (
+    Callable,
     Dict,
     FrozenSet,
     Generator,
+    Iterable,
     List,
     Optional,
     Set,
     Tuple,
     Union,
+    cast,
 )
 
 from sepolicy.class_set import ClassSet
@@ -63,20 +66,28 @@ def is_type_generated(part: rule_part):
     return part.startswith('base_typeattr_')
 
 
-def unpack_line(
+@cache
+def _get_separators_table(
+    separators: str,
+    ignored_chars: str,
+) -> Optional[Dict[int, int]]:
+    chars = separators + ignored_chars
+    if not chars.strip(' '):
+        return None
+
+    return str.maketrans(chars, ' ' * len(chars))
+
+
+def unpack_line_generic(
     rule: str,
     open_char: str,
     close_char: str,
     separators: str,
-    open_by_default: bool = False,
     ignored_chars: str = '',
 ) -> raw_parts_list:
     stack: List[raw_parts_list] = []
     current: raw_parts_list = []
 
-    if open_by_default:
-        rule = f'{open_char}{rule}{close_char}'
-
     stack_append = stack.append
     stack_pop = stack.pop
 
@@ -106,6 +117,156 @@ def unpack_line(
     return current[0]
 
 
+_tokens_splitter = Callable[[str], raw_parts_list]
+
+# Characters other than the space that str.split() also splits on
+_SPLIT_WHITESPACE = '\t\n\r\x0b\x0c\x1c\x1d\x1e\x1f'
+
+
+def _split_spaces(text: str) -> raw_parts_list:
+    return list(filter(None, text.split(' ')))
+
+
+def _get_tokens_splitter(rules: List[str]) -> _tokens_splitter:
+    # Check the whole buffer at once, if only spaces separate the tokens,
+    # the faster whitespace split produces the same tokens
+    buffer = ''.join(rules)
+    if not buffer.isascii():
+        return _split_spaces
+
+    for c in _SPLIT_WHITESPACE:
+        if c in buffer:
+            return _split_spaces
+
+    return cast(_tokens_splitter, str.split)
+
+
+def _scan_line(
+    rule: str,
+    open_char: str,
+    close_char: str,
+    split: _tokens_splitter,
+) -> raw_parts_list:
+    # Most lines only close lists at their end, eg:
+    # (allow a b (file (read write))) or (typeattributeset a (b c)),
+    # build those from the inside out
+    body = rule.rstrip(close_char + ' ')
+    if close_char not in body:
+        segments = body.split(open_char)
+        depth = len(segments) - 1
+        if (
+            depth
+            and not segments[0]
+            and depth == rule.count(close_char, len(body))
+        ):
+            current = split(segments[depth])
+            for i in range(depth - 1, 0, -1):
+                parent = split(segments[i])
+                parent.append(current)
+                current = parent
+
+            return current
+
+    # Same result as the generic parser, but the text between two delimiters
+    # is split in one go instead of token by token
+    stack: List[raw_parts_list] = []
+    stack_append = stack.append
+    stack_pop = stack.pop
+
+    segments = rule.split(open_char)
+
+    first = segments[0]
+    if close_char in first:
+        # Unbalanced close char, fail the same way as the generic parser
+        stack_pop()
+
+    current = split(first)
+
+    for i in range(1, len(segments)):
+        segment = segments[i]
+        stack_append(current)
+
+        if close_char not in segment:
+            current = split(segment)
+            continue
+
+        pieces = segment.split(close_char)
+        current = split(pieces[0])
+        for j in range(1, len(pieces)):
+            last = stack_pop()
+            last.append(current)
+            current = last
+
+            piece = pieces[j]
+            if piece:
+                current.extend(split(piece))
+
+    if not current:
+        return []
+
+    assert isinstance(current[0], list)
+
+    return current[0]
+
+
+def unpack_lines(
+    rules: Iterable[str],
+    open_char: str,
+    close_char: str,
+    separators: str,
+    open_by_default: bool = False,
+    ignored_chars: str = '',
+) -> List[raw_parts_list]:
+    if open_by_default:
+        rules = [f'{open_char}{rule}{close_char}' for rule in rules]
+
+    if ' ' not in separators:
+        return [
+            unpack_line_generic(
+                rule,
+                open_char,
+                close_char,
+                separators,
+                ignored_chars,
+            )
+            for rule in rules
+        ]
+
+    # Map all the separators and ignored chars to spaces, leaving only the
+    # open and close chars as structure
+    table = _get_separators_table(separators, ignored_chars)
+    if table is None:
+        rules = list(rules)
+    else:
+        rules = [rule.translate(table) for rule in rules]
+
+    split = _get_tokens_splitter(rules)
+
+    return [_scan_line(rule, open_char, close_char, split) for rule in rules]
+
+
+def unpack_line(
+    rule: str,
+    open_char: str,
+    close_char: str,
+    separators: str,
+    open_by_default: bool = False,
+    ignored_chars: str = '',
+) -> raw_parts_list:
+    # The scanner only pays off when the checks and the translation are
+    # shared by many lines, tokenize single lines directly
+    if open_by_default:
+        rule = f'{open_char}{rule}{close_char}'
+
+    return unpack_line_generic(
+        rule,
+        open_char,
+        close_char,
+        separators,
+        ignored_chars,
+    )
+
+
 def flatten_parts(parts: raw_part) -> Generator[str, None, None]:
     if isinstance(parts, str):
         yield parts
@@ -325,6 +486,16 @@ class Rule:
         )
         self.__hash = hash(self.hash_values)
 
+    def __reduce__(self):
+        # The cached hash is only valid for the current process
+        return Rule, (
+            self.rule_type,
+            self.parts,
+            self.varargs,
+            self.is_macro,
+            self.expanded_rules,
+        )
+
     def __str__(self):
         return format_rule(self)
 
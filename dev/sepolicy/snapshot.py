@@ -0,0 +1,677 @@
+# SPDX-FileCopyrightText: The LineageOS Project
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import annotations
+
+import mmap
+import struct
+import sys
+from array import array
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import (
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from sepolicy.class_set import ClassSet
+from sepolicy.classmap import Classmap
+from sepolicy.conditional_type import ConditionalType
+from sepolicy.policy import (
+    ContextsType,
+    Policy,
+    PolicyMetadata,
+    get_policy_type_by_name,
+)
+from sepolicy.rule import Rule, rule_part
+from sepolicy.rule_container import LineMark, RuleContainer
+from sepolicy.varargs import (
+    Ioctls,
+    OrderedPerms,
+    Perms,
+    Types,
+    TypeTransitionTag,
+)
+from utils.frozendict import FrozenDict
+
+#
+# Snapshot layout, all integers are little-endian u32:
+#
+# header: magic, version, sources length, number of ints, strings length,
+#         number of strings
+# sources: UTF-8, NUL-separated parse version, then path, mtime and size of
+#          each source
+# ints: conditional types table, class sets table, varargs table, body
+# strings: UTF-8, NUL-separated
+#
+# The sources come first so that stale snapshots, or snapshots parsed with
+# another version, are rejected without reading the rest of the file.
+#
+# Strings, conditional types, class sets and varargs are deduplicated and
+# referenced by their index in their table. The ints are read straight from
+# the mapped file.
+#
+
+SNAPSHOT_MAGIC = b'SEPS'
+SNAPSHOT_VERSION = 3
+SNAPSHOT_HEADER = struct.Struct('<4sIIIII')
+
+NONE_REF = 0xFFFFFFFF
+
+PART_STR = 0
+PART_CONDITIONAL_TYPE = 1
+PART_CLASS_SET = 2
+PART_KIND_BITS = 2
+PART_KIND_MASK = (1 << PART_KIND_BITS) - 1
+
+VARARGS_PERMS = 0
+VARARGS_ORDERED_PERMS = 1
+VARARGS_IOCTLS = 2
+VARARGS_TYPE_TRANSITION_TAG = 3
+VARARGS_TYPES = 4
+
+varargs_type = Union[Perms, OrderedPerms, Ioctls, TypeTransitionTag, Types]
+
+SourcesKey = Tuple[Tuple[str, str, str], ...]
+
+
+def get_sources_key(paths: List[Path]) -> SourcesKey:
+    key: List[Tuple[str, str, str]] = []
+
+    for p in paths:
+        stat = p.stat()
+        mtime = str(stat.st_mtime_ns)
+        size = str(stat.st_size)
+        key.append((str(p.resolve()), mtime, size))
+
+    return tuple(key)
+
+
+@dataclass
+class PolicySnapshot:
+    rules: RuleContainer
+    genfs_rules: RuleContainer
+    contexts: Dict[ContextsType, List[Tuple[str, ...]]] = field(
+        default_factory=lambda: {}
+    )
+    conditional_types_map: Optional[Dict[str, ConditionalType]] = None
+    metadata: Optional[PolicyMetadata] = None
+    classmap: Optional[Classmap] = None
+    policy_name: Optional[str] = None
+    sources_key: SourcesKey = ()
+    # Version stripped from the versioned types while parsing, the rules
+    # differ between versions, so it is checked along with the sources
+    parse_version: Optional[str] = None
+
+    @classmethod
+    def from_policy(cls, policy: Policy, sources_key: SourcesKey = ()):
+        return cls(
+            policy.rules,
+            policy.genfs_rules,
+            policy.contexts,
+            conditional_types_map=policy.conditional_types_map,
+            metadata=policy.metadata,
+            classmap=policy.classmap,
+            policy_name=policy.name,
+            sources_key=sources_key,
+        )
+
+    def to_policy(self):
+        assert self.policy_name is not None
+
+        return Policy(
+            get_policy_type_by_name(self.policy_name),
+            self.rules,
+            self.genfs_rules,
+            self.contexts,
+            conditional_types_map=self.conditional_types_map,
+            metadata=self.metadata,
+            classmap=self.classmap,
+        )
+
+
+class SnapshotWriter:
+    def __init__(self):
+        self.__strings: Dict[str, int] = {}
+        self.__conditional_types: Dict[Hashable, int] = {}
+        self.__conditional_types_ints = array('I')
+        self.__class_sets: Dict[Hashable, int] = {}
+        self.__class_sets_ints = array('I')
+        self.__varargs: Dict[varargs_type, int] = {}
+        self.__varargs_ints = array('I')
+        self.__ints = array('I')
+
+    def __string(self, value: str):
+        index = self.__strings.get(value)
+        if index is None:
+            assert '\0' not in value, value
+            index = len(self.__strings)
+            self.__strings[value] = index
+        return index
+
+    def __strings_into(self, ints: array[int], values: Iterable[str]):
+        start = len(ints)
+        ints.append(0)
+        ints.extend(map(self.__string, values))
+        ints[start] = len(ints) - start - 1
+
+    def __conditional_type(self, value: ConditionalType):
+        key = (tuple(value.positive), tuple(value.negative), value.is_all)
+        index = self.__conditional_types.get(key)
+        if index is not None:
+            return index
+
+        ints = self.__conditional_types_ints
+        self.__strings_into(ints, value.positive)
+        self.__strings_into(ints, value.negative)
+        ints.append(int(value.is_all))
+
+        index = len(self.__conditional_types)
+        self.__conditional_types[key] = index
+        return index
+
+    def __class_set(self, value: ClassSet):
+        key = (tuple(value.names), tuple(value))
+        index = self.__class_sets.get(key)
+        if index is not None:
+            return index
+
+        ints = self.__class_sets_ints
+        self.__strings_into(ints, value.names)
+        self.__strings_into(ints, value)
+
+        index = len(self.__class_sets)
+        self.__class_sets[key] = index
+        return index
+
+    def __part(self, value: rule_part):
+        if isinstance(value, str):
+            index = self.__string(value)
+            kind = PART_STR
+        elif isinstance(value, ConditionalType):
+            index = self.__conditional_type(value)
+            kind = PART_CONDITIONAL_TYPE
+        elif isinstance(value, ClassSet):
+            index = self.__class_set(value)
+            kind = PART_CLASS_SET
+        else:
+            assert False, value
+
+        return (index << PART_KIND_BITS) | kind
+
+    def __varargs_ref(self, value: Optional[varargs_type]):
+        if value is None:
+            return NONE_REF
+
+        index = self.__varargs.get(value)
+        if index is not None:
+            return index
+
+        ints = self.__varargs_ints
+        if isinstance(value, Perms):
+            ints.append(VARARGS_PERMS)
+            ints.append(int(value.is_all))
+            self.__strings_into(ints, sorted(value))
+        elif isinstance(value, OrderedPerms):
+            ints.append(VARARGS_ORDERED_PERMS)
+            self.__strings_into(ints, value)
+        elif isinstance(value, Ioctls):
+            ints.append(VARARGS_IOCTLS)
+            ints.append(len(value.ranges))
+            for start, end in value.ranges:
+                ints.append(start)
+                ints.append(end)
+        elif isinstance(value, TypeTransitionTag):
+            ints.append(VARARGS_TYPE_TRANSITION_TAG)
+            ints.append(self.__string(str(value)))
+        elif isinstance(value, Types):
+            ints.append(VARARGS_TYPES)
+            self.__strings_into(ints, sorted(value))
+        else:
+            assert False, value
+
+        index = len(self.__varargs)
+        self.__varargs[value] = index
+        return index
+
+    def write_int(self, value: int):
+        self.__ints.append(value)
+
+    def write_str(self, value: str):
+        self.__ints.append(self.__string(value))
+
+    def write_optional_str(self, value: Optional[str]):
+        if value is None:
+            self.__ints.append(NONE_REF)
+        else:
+            self.write_str(value)
+
+    def write_strs(self, values: Iterable[str]):
+        self.__strings_into(self.__ints, values)
+
+    def write_conditional_type(self, value: ConditionalType):
+        self.__ints.append(self.__conditional_type(value))
+
+    def write_rule(self, rule: Rule):
+        ints = self.__ints
+        ints.append(self.__string(rule.rule_type))
+        ints.append(len(rule.parts))
+        ints.extend(map(self.__part, rule.parts))
+        ints.append(self.__varargs_ref(rule.varargs))
+
+        if not rule.is_macro:
+            ints.append(NONE_REF)
+            return
+
+        assert rule.expanded_rules is not None
+        ints.append(len(rule.expanded_rules))
+        for expanded_rule in rule.expanded_rules:
+            self.write_rule(expanded_rule)
+
+    def write_rules(self, rules: RuleContainer):
+        self.write_int(len(rules))
+        for rule in rules:
+            self.write_rule(rule)
+
+            marks = rules.marks(rule)
+            self.write_int(len(marks))
+            for mark in marks:
+                self.write_str(mark.path)
+                self.write_int(mark.line)
+
+    def data(
+        self,
+        sources_key: SourcesKey = (),
+        parse_version: Optional[str] = None,
+    ):
+        sources_values = [parse_version or '']
+        for source_key in sources_key:
+            sources_values.extend(source_key)
+        sources_data = '\0'.join(sources_values).encode()
+
+        ints = array('I')
+        ints.append(len(self.__conditional_types))
+        ints.extend(self.__conditional_types_ints)
+        ints.append(len(self.__class_sets))
+        ints.extend(self.__class_sets_ints)
+        ints.append(len(self.__varargs))
+        ints.extend(self.__varargs_ints)
+        ints.extend(self.__ints)
+
+        if sys.byteorder != 'little':
+            ints.byteswap()
+
+        strings_data = '\0'.join(self.__strings).encode()
+
+        header = SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC,
+            SNAPSHOT_VERSION,
+            len(sources_data),
+            len(ints),
+            len(strings_data),
+            len(self.__strings),
+        )
+
+        return b''.join((header, sources_data, ints.tobytes(), strings_data))
+
+
+class SnapshotReader:
+    def __init__(self, ints: Iterable[int], strings: List[str]):
+        self.__next: Callable[[], int] = iter(ints).__next__
+        self.__strings = strings
+
+        self.__conditional_types = self.__read_table(
+            self.__read_conditional_type
+        )
+        self.__class_sets = self.__read_table(self.__read_class_set)
+        self.__varargs = self.__read_table(self.__read_varargs)
+
+    def __read_table(self, read_fn: Callable[[], Hashable]):
+        count = self.__next()
+        return [read_fn() for _ in range(count)]
+
+    def __read_conditional_type(self):
+        positive = self.read_strs()
+        negative = self.read_strs()
+        is_all = bool(self.__next())
+        return ConditionalType(positive, negative, is_all)
+
+    def __read_class_set(self):
+        names = self.read_strs()
+        values = self.read_strs()
+        return ClassSet(names, values)
+
+    def __read_varargs(self) -> varargs_type:
+        kind = self.__next()
+
+        if kind == VARARGS_PERMS:
+            is_all = bool(self.__next())
+            return Perms(self.read_strs(), is_all)
+        elif kind == VARARGS_ORDERED_PERMS:
+            return OrderedPerms(self.read_strs())
+        elif kind == VARARGS_IOCTLS:
+            count = self.__next()
+            ranges = [(self.__next(), self.__next()) for _ in range(count)]
+            return Ioctls(ranges)
+        elif kind == VARARGS_TYPE_TRANSITION_TAG:
+            return TypeTransitionTag(self.read_str())
+        elif kind == VARARGS_TYPES:
+            return Types(self.read_strs())
+
+        raise ValueError(f'Invalid varargs kind: {kind}')
+
+    def __read_part(self) -> rule_part:
+        ref = self.__next()
+        index = ref >> PART_KIND_BITS
+        kind = ref & PART_KIND_MASK
+
+        if kind == PART_STR:
+            return self.__strings[index]
+        elif kind == PART_CONDITIONAL_TYPE:
+            return self.__conditional_types[index]
+        elif kind == PART_CLASS_SET:
+            return self.__class_sets[index]
+
+        raise ValueError(f'Invalid part kind: {kind}')
+
+    def read_int(self):
+        return self.__next()
+
+    def read_str(self):
+        return self.__strings[self.__next()]
+
+    def read_optional_str(self):
+        ref = self.__next()
+        if ref == NONE_REF:
+            return None
+        return self.__strings[ref]
+
+    def read_strs(self):
+        count = self.__next()
+        return [self.__strings[self.__next()] for _ in range(count)]
+
+    def read_conditional_type(self):
+        return self.__conditional_types[self.__next()]
+
+    def read_rule(self) -> Rule:
+        rule_type = self.read_str()
+        num_parts = self.__next()
+        parts = tuple(self.__read_part() for _ in range(num_parts))
+
+        varargs_ref = self.__next()
+        varargs = None
+        if varargs_ref != NONE_REF:
+            varargs = self.__varargs[varargs_ref]
+
+        num_expanded_rules = self.__next()
+        if num_expanded_rules == NONE_REF:
+            return Rule(rule_type, parts, varargs)
+
+        expanded_rules = frozenset(
+            self.read_rule() for _ in range(num_expanded_rules)
+        )
+        return Rule(
+            rule_type,
+            parts,
+            varargs,
+            is_macro=True,
+            expanded_rules=expanded_rules,
+        )
+
+    def read_rules(self):
+        rules = RuleContainer()
+
+        for _ in range(self.__next()):
+            rule = self.read_rule()
+            marks = [
+                LineMark(self.read_str(), self.__next())
+                for _ in range(self.__next())
+            ]
+            rules.add(rule, marks)
+
+        return rules
+
+
+def write_snapshot(writer: SnapshotWriter, snapshot: PolicySnapshot):
+    writer.write_optional_str(snapshot.policy_name)
+
+    writer.write_rules(snapshot.rules)
+    writer.write_rules(snapshot.genfs_rules)
+
+    writer.write_int(len(snapshot.contexts))
+    for contexts_type, entries in snapshot.contexts.items():
+        writer.write_str(contexts_type)
+        writer.write_int(len(entries))
+        for entry in entries:
+            writer.write_strs(entry)
+
+    conditional_types_map = snapshot.conditional_types_map
+    if conditional_types_map is None:
+        writer.write_int(NONE_REF)
+    else:
+        writer.write_int(len(conditional_types_map))
+        for name, conditional_type in conditional_types_map.items():
+            writer.write_str(name)
+            writer.write_conditional_type(conditional_type)
+
+    metadata = snapshot.metadata
+    if metadata is None:
+        writer.write_optional_str(None)
+    else:
+        writer.write_str(metadata.version)
+        writer.write_strs(metadata.variables.keys())
+        writer.write_strs(metadata.variables.values())
+
+    classmap = snapshot.classmap
+    if classmap is None:
+        writer.write_int(NONE_REF)
+    else:
+        class_names = list(classmap.classes())
+        writer.write_int(len(class_names))
+        for class_name in class_names:
+            writer.write_str(class_name)
+            writer.write_strs(classmap.class_perms(class_name))
+
+
+def read_snapshot(
+    reader: SnapshotReader,
+    sources_key: SourcesKey = (),
+    parse_version: Optional[str] = None,
+):
+    policy_name = reader.read_optional_str()
+
+    rules = reader.read_rules()
+    genfs_rules = reader.read_rules()
+
+    contexts: Dict[ContextsType, List[Tuple[str, ...]]] = {}
+    for _ in range(reader.read_int()):
+        contexts_type = ContextsType(reader.read_str())
+        contexts[contexts_type] = [
+            tuple(reader.read_strs()) for _ in range(reader.read_int())
+        ]
+
+    conditional_types_map = None
+    count = reader.read_int()
+    if count != NONE_REF:
+        conditional_types_map = {
+            reader.read_str(): reader.read_conditional_type()
+            for _ in range(count)
+        }
+
+    metadata = None
+    version = reader.read_optional_str()
+    if version is not None:
+        keys = reader.read_strs()
+        values = reader.read_strs()
+        metadata = PolicyMetadata(version, FrozenDict(dict(zip(keys, values))))
+
+    classmap = None
+    count = reader.read_int()
+    if count != NONE_REF:
+        classmap = Classmap(
+            {reader.read_str(): reader.read_strs() for _ in range(count)}
+        )
+
+    return PolicySnapshot(
+        rules,
+        genfs_rules,
+        contexts,
+        conditional_types_map=conditional_types_map,
+        metadata=metadata,
+        classmap=classmap,
+        policy_name=policy_name,
+        sources_key=sources_key,
+        parse_version=parse_version,
+    )
+
+
+def save_snapshot(snapshot_path: Path, snapshot: PolicySnapshot):
+    writer = SnapshotWriter()
+    write_snapshot(writer, snapshot)
+
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    snapshot_path.write_bytes(
+        writer.data(snapshot.sources_key, snapshot.parse_version)
+    )
+
+
+def load_snapshot(
+    snapshot_path: Path,
+    sources_key: Optional[SourcesKey] = None,
+    parse_version: Optional[str] = None,
+) -> Optional[PolicySnapshot]:
+    if not snapshot_path.exists():
+        return None
+
+    with open(snapshot_path, 'rb') as f:
+        if not snapshot_path.stat().st_size:
+            return None
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return _load_snapshot_data(
+                memoryview(data),
+                sources_key,
+                parse_version,
+            )
+
+
+def _read_sources_key(
+    sources_data: memoryview,
+) -> Tuple[Optional[str], SourcesKey]:
+    parse_version, *values = bytes(sources_data).decode().split('\0')
+    if len(values) % 3:
+        raise ValueError('Invalid snapshot sources')
+
+    sources_key = tuple(zip(values[0::3], values[1::3], values[2::3]))
+
+    return parse_version or None, sources_key
+
+
+def _read_snapshot_data(
+    data: memoryview,
+    sources_key: Optional[SourcesKey],
+    parse_version: Optional[str],
+) -> Optional[PolicySnapshot]:
+    if len(data) < SNAPSHOT_HEADER.size:
+        return None
+
+    (
+        magic,
+        version,
+        sources_len,
+        num_ints,
+        strings_len,
+        num_strings,
+    ) = SNAPSHOT_HEADER.unpack_from(data)
+
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        return None
+
+    sources_start = SNAPSHOT_HEADER.size
+    ints_start = sources_start + sources_len
+    ints_end = ints_start + num_ints * 4
+    strings_end = ints_end + strings_len
+    if strings_end != len(data):
+        return None
+
+    # Reject stale snapshots before reading the rules
+    snapshot_parse_version, snapshot_sources_key = _read_sources_key(
+        data[sources_start:ints_start]
+    )
+    if sources_key is not None and snapshot_sources_key != sources_key:
+        return None
+
+    if snapshot_parse_version != parse_version:
+        return None
+
+    strings: List[str] = []
+    if num_strings:
+        strings = bytes(data[ints_end:strings_end]).decode().split('\0')
+        if len(strings) != num_strings:
+            return None
+
+    with data[ints_start:ints_end] as ints_data:
+        if sys.byteorder == 'little':
+            with ints_data.cast('I') as ints:
+                reader = SnapshotReader(ints, strings)
+                return read_snapshot(
+                    reader,
+                    snapshot_sources_key,
+                    snapshot_parse_version,
+                )
+
+        ints = array('I', ints_data.tobytes())
+        ints.byteswap()
+        reader = SnapshotReader(ints, strings)
+        return read_snapshot(
+            reader,
+            snapshot_sources_key,
+            snapshot_parse_version,
+        )
+
+
+def _load_snapshot_data(
+    data: memoryview,
+    sources_key: Optional[SourcesKey],
+    parse_version: Optional[str],
+) -> Optional[PolicySnapshot]:
+    try:
+        return _read_snapshot_data(data, sources_key, parse_version)
+    except (
+        IndexError,
+        RuntimeError,
+        StopIteration,
+        ValueError,
+    ):
+        # Corrupt snapshots are treated the same as missing ones, the
+        # policy is parsed again and the snapshot rewritten
+        return None
+    finally:
+        # Allow the file to be unmapped
+        data.release()
+
+
+def save_policy_snapshot(
+    snapshot_path: Path,
+    policy: Policy,
+    sources_key: SourcesKey = (),
+):
+    snapshot = PolicySnapshot.from_policy(policy, sources_key)
+    save_snapshot(snapshot_path, snapshot)
+
+
+def load_policy_snapshot(
+    snapshot_path: Path,
+    sources_key: Optional[SourcesKey] = None,
+):
+    snapshot = load_snapshot(snapshot_path, sources_key)
+    if snapshot is None:
+        return None
+
+    return snapshot.to_policy()
@@ -30,7 +30,7 @@ from sepolicy.policy import (
 from sepolicy.rule_container import RuleContainer
 from sepolicy.rules import split_normalize_rules_text
 from sepolicy.source_macros import SourceMacros
-from sepolicy.source_rule import SourceRuleParser
+from sepolicy.source_rule import parse_source_lines_parallel
 from sepolicy.source_text import PolicyFileType, SourceText
 from utils.frozendict import FrozenDict
 from utils.utils import android_root, read_texts, split_normalize_text
@@ -98,16 +98,9 @@ def parse_source_rules(
         verbose=verbose,
     )
 
-    rules = RuleContainer()
-
-    parser = SourceRuleParser(
-        rules.add,
-        classmap,
+    return RuleContainer(
+        parse_source_lines_parallel(expanded_rules, classmap),
     )
-    for source_line in expanded_rules:
-        parser.parse_line(source_line)
-
-    return rules
 
 
 def parse_source_contexts(
@@ -4,7 +4,7 @@
 from __future__ import annotations
 
 from itertools import product
-from typing import Callable, Dict, List, Set, Tuple
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
 from sepolicy.classmap import Classmap
 from sepolicy.conditional_type import ConditionalType
@@ -16,7 +16,13 @@ from sepolicy.rule import (
     trim_contexts_label,
     unpack_line,
 )
-from sepolicy.varargs import Ioctls, Perms, TypeTransitionTag
+from sepolicy.varargs import (
+    Ioctls,
+    Perms,
+    TypeTransitionTag,
+    perms_registry,
+)
+from utils.utils import process_map_chunks
 
 
 def trim_ioctl(ioctl: int):
@@ -129,6 +135,10 @@ unknown_rule_types: Set[str] = set(
 
 ALL_PERMS_SET = {'*'}
 
+# Below this number of statements, parsing in the current process is faster
+# than sending the statements and the parsed rules to worker processes
+PARALLEL_PARSE_MIN_LINES = 20000
+
 
 class SourceRuleParser:
     def __init__(
@@ -235,23 +245,27 @@ class SourceRuleParser:
                 class_names = list(flatten_parts(parts[3]))
                 varargs = set(flatten_parts(parts[4]))
                 is_all = varargs == ALL_PERMS_SET
+                varargs_mask = 0 if is_all else perms_registry.mask(varargs)
 
                 class_varargs_map: Dict[str, Perms] = {}
 
                 for class_name in class_names:
-                    class_perms_set = self.classmap.class_perms_set(class_name)
+                    class_mask = self.classmap.class_perms_mask(class_name)
 
                     if negative_varargs:
-                        class_varargs = class_perms_set - varargs
+                        class_varargs = class_mask & ~varargs_mask
                         class_is_all = False
                     elif is_all:
-                        class_varargs = class_perms_set
+                        class_varargs = class_mask
                         class_is_all = True
                     else:
-                        class_varargs = varargs
-                        class_is_all = class_varargs == class_perms_set
+                        class_varargs = varargs_mask
+                        class_is_all = class_varargs == class_mask
 
-                    class_varargs_map[class_name] = Perms(class_varargs, class_is_all)
+                    class_varargs_map[class_name] = Perms.from_mask(
+                        class_varargs,
+                        class_is_all,
+                    )
 
                 for src, dst, class_name in product(srcs, dsts, class_names):
                     rule = Rule(
@@ -362,3 +376,32 @@ class SourceRuleParser:
                 self.add_rule(rule)
             case _:
                 assert False, line
+
+
+def parse_source_lines(lines: List[str], classmap: Classmap):
+    rules: List[Rule] = []
+
+    parser = SourceRuleParser(
+        rules.append,
+        classmap,
+    )
+    for line in lines:
+        parser.parse_line(line)
+
+    return rules
+
+
+def parse_source_lines_parallel(
+    lines: List[str],
+    classmap: Classmap,
+    jobs: Optional[int] = None,
+):
+    # After m4 expansion, top-level statements are independent of each other,
+    # parse them in chunks and keep the original order of the rules
+    return process_map_chunks(
+        parse_source_lines,
+        lines,
+        classmap,
+        min_items=PARALLEL_PARSE_MIN_LINES,
+        jobs=jobs,
+    )
@@ -3,12 +3,15 @@
 
 from __future__ import annotations
 
+import hashlib
 from collections import defaultdict
 from dataclasses import dataclass, field
 from enum import IntEnum
 from pathlib import Path
 from typing import DefaultDict, Dict, List, Optional, Set, Tuple, cast
 
+from utils.tree_index import tree_index
+
 
 class PolicyFileType(IntEnum):
     FLAGGING_MACROS = 0
@@ -65,6 +68,69 @@ POLICY_ORDER_MAP = {
 }
 
 
+# mtime and size of a file when it was read
+SourceFileStat = Tuple[int, int]
+
+
+class SourceFileStore:
+    def __init__(self):
+        # Only the last read of each path is kept, and contents are dropped
+        # once no path references them, so that files edited in watch mode
+        # do not pile up
+        self.__files: Dict[Path, Tuple[SourceFileStat, bytes]] = {}
+        self.__contents: Dict[bytes, str] = {}
+        self.__content_refs: Dict[bytes, int] = {}
+
+    def read(self, path: Path):
+        stat = path.stat()
+        file_stat = (stat.st_mtime_ns, stat.st_size)
+
+        old_file = self.__files.get(path)
+        if old_file is not None and old_file[0] == file_stat:
+            return self.__contents[old_file[1]]
+
+        data = path.read_bytes()
+        digest = hashlib.sha256(data).digest()
+
+        # Files with the same content share the same string, eg: the
+        # prebuilts of the public policy for each API level
+        text = self.__contents.get(digest)
+        if text is None:
+            # Same newline translation as Path.read_text()
+            text = data.decode()
+            if '\r' in text:
+                text = text.replace('\r\n', '\n').replace('\r', '\n')
+            self.__contents[digest] = text
+            self.__content_refs[digest] = 0
+
+        self.__content_refs[digest] += 1
+        self.__files[path] = (file_stat, digest)
+
+        if old_file is not None:
+            self.__release(old_file[1])
+
+        return text
+
+    def __release(self, digest: bytes):
+        refs = self.__content_refs[digest] - 1
+        if refs:
+            self.__content_refs[digest] = refs
+            return
+
+        del self.__content_refs[digest]
+        del self.__contents[digest]
+
+    def clear(self):
+        self.__files.clear()
+        self.__contents.clear()
+        self.__content_refs.clear()
+
+
+# Files are read once per process, the policy types of each partition only
+# hold references to the same texts
+source_file_store = SourceFileStore()
+
+
 @dataclass
 class SourceText:
     paths: DefaultDict[int, List[Path]] = field(
@@ -129,7 +195,7 @@ class SourceText:
         if disallowed_types is not None and order in disallowed_types:
             return
 
-        text = policy_path.read_text()
+        text = source_file_store.read(policy_path)
         self.texts[policy_path] = text
         self.paths[order].append(policy_path)
 
@@ -142,10 +208,8 @@ class SourceText:
         for dir_path in dir_paths:
             assert dir_path.is_dir(), f'{dir_path} is not a directory'
 
-            for file_path in sorted(dir_path.iterdir()):
-                if not file_path.is_file():
-                    continue
-
+            file_paths = tree_index.files(dir_path, recursive=False)
+            for file_path in sorted(map(Path, file_paths)):
                 self.__add_path(
                     file_path,
                     allowed_types=allowed_types,
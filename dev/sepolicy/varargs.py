@@ -4,6 +4,7 @@
 from __future__ import annotations
 
 import bisect
+from array import array
 from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 
@@ -31,19 +32,101 @@ def replace_perms(
     return perms
 
 
+class PermsRegistry:
+    def __init__(self):
+        self.__bits: Dict[str, int] = {}
+        self.__names: List[str] = []
+        self.__sorted_names: Dict[int, Tuple[str, ...]] = {}
+
+    def register(self, names: Iterable[str]):
+        bits = self.__bits
+        for name in names:
+            if name not in bits:
+                bits[name] = 1 << len(self.__names)
+                self.__names.append(name)
+
+    def bit(self, name: str):
+        return self.__bits.get(name, 0)
+
+    def mask(self, names: Iterable[str]):
+        bits = self.__bits
+        mask = 0
+
+        for name in names:
+            bit = bits.get(name)
+            if bit is None:
+                self.register((name,))
+                bit = bits[name]
+
+            mask |= bit
+
+        return mask
+
+    def sorted_names(self, mask: int) -> Tuple[str, ...]:
+        names = self.__sorted_names.get(mask)
+        if names is not None:
+            return names
+
+        all_names = self.__names
+        values: List[str] = []
+        index = 0
+        remaining = mask
+        while remaining:
+            if remaining & 1:
+                values.append(all_names[index])
+            remaining >>= 1
+            index += 1
+
+        names = tuple(sorted(values))
+        self.__sorted_names[mask] = names
+        return names
+
+
+# Bits are assigned in the order of the class definitions, masks are only
+# valid for the current process
+perms_registry = PermsRegistry()
+
+
 class Perms:
     __ALL = object()
 
     def __init__(self, values: Iterable[str], is_all: bool):
-        self.__values = frozenset(values)
+        self.__init_mask(perms_registry.mask(values), is_all)
+
+    def __init_mask(self, mask: int, is_all: bool):
+        self.__mask = mask
         self.__is_all = is_all
-        self.__hash = hash(Perms.__ALL if self.__is_all else self.__values)
+        self.__hash = hash(Perms.__ALL if self.__is_all else self.__mask)
+
+    @classmethod
+    def from_mask(cls, mask: int, is_all: bool):
+        perms = cls.__new__(cls)
+        perms.__init_mask(mask, is_all)
+        return perms
+
+    @property
+    def mask(self):
+        return self.__mask
+
+    @property
+    def is_all(self):
+        return self.__is_all
+
+    def __iter__(self):
+        return iter(perms_registry.sorted_names(self.__mask))
+
+    def __len__(self):
+        return self.__mask.bit_count()
+
+    def __reduce__(self):
+        # The cached hash and the mask are only valid for the current process
+        return Perms, (tuple(self), self.__is_all)
 
     def __contains__(self, value: str):
         if self.__is_all:
             return True
 
-        return value in self.__values
+        return bool(self.__mask & perms_registry.bit(value))
 
     def __eq__(self, other: object):
         if not isinstance(other, Perms):
@@ -52,9 +135,7 @@ class Perms:
         if self.__hash != other.__hash:
             return False
 
-        return (
-            self.__is_all == other.__is_all and self.__values == other.__values
-        )
+        return self.__is_all == other.__is_all and self.__mask == other.__mask
 
     def __hash__(self):
         return self.__hash
@@ -69,12 +150,21 @@ class Perms:
         if self.__is_all:
             return False
 
-        return self.__values <= other.__values
+        return not self.__mask & ~other.__mask
+
+    def __or__(self, other: Perms):
+        return Perms.from_mask(
+            self.__mask | other.__mask,
+            self.__is_all or other.__is_all,
+        )
+
+    def __sub__(self, other: Perms):
+        return Perms.from_mask(self.__mask & ~other.__mask, False)
 
     def __is_star(self):
         # fd, property_service are 1-perm, lockdown is 2-perm, avoid replacing
         # them
-        return self.__is_all and len(self.__values) > 2
+        return self.__is_all and len(self) > 2
 
     def format(
         self,
@@ -83,7 +173,7 @@ class Perms:
         if self.__is_star():
             return '*'
 
-        perms = sorted(self.__values)
+        perms = list(perms_registry.sorted_names(self.__mask))
         if class_perms is not None:
             perms = replace_perms(
                 perms,
@@ -109,6 +199,9 @@ class OrderedPerms:
     def __len__(self):
         return len(self.__values)
 
+    def __reduce__(self):
+        return OrderedPerms, (self.__values,)
+
     def __eq__(self, other: object):
         if not isinstance(other, OrderedPerms):
             return NotImplemented
@@ -130,6 +223,12 @@ class Types:
     def __contains__(self, t: str):
         return t in self.__values
 
+    def __iter__(self):
+        return iter(self.__values)
+
+    def __reduce__(self):
+        return Types, (self.__values,)
+
     def __eq__(self, other: object):
         if not isinstance(other, Types):
             return NotImplemented
@@ -153,6 +252,9 @@ class TypeTransitionTag:
         self.__value = value
         self.__hash = hash(value)
 
+    def __reduce__(self):
+        return TypeTransitionTag, (self.__value,)
+
     def __eq__(self, other: object):
         if not isinstance(other, TypeTransitionTag):
             return NotImplemented
@@ -168,34 +270,105 @@ class TypeTransitionTag:
 
 class Ioctls:
     def __init__(self, ranges: Iterable[Tuple[int, int]]):
-        self.__ranges = self._normalize_ranges(ranges)
-        self.__ranges_set = frozenset(self.__ranges)
-        self.__hash = hash(self.__ranges_set)
+        self.__init_ranges(self._normalize_ranges(ranges))
+
+    def __init_ranges(self, ranges: Tuple[Tuple[int, int], ...]):
+        self.__ranges = ranges
+        self.__hash = hash(ranges)
+        self.__starts: Optional[array[int]] = None
+
+    @classmethod
+    def __from_normalized(cls, ranges: Iterable[Tuple[int, int]]):
+        # Sweep results are already sorted, disjoint and non-adjacent
+        ioctls = cls.__new__(cls)
+        ioctls.__init_ranges(tuple(ranges))
+        return ioctls
+
+    def __reduce__(self):
+        return Ioctls, (self.__ranges,)
+
+    @property
+    def ranges(self):
+        return self.__ranges
 
     @staticmethod
     def _normalize_ranges(
         ranges: Iterable[Tuple[int, int]],
     ) -> Tuple[Tuple[int, int], ...]:
-        merged: List[Tuple[int, int]] = []
+        sorted_ranges = sorted(ranges)
+        if not sorted_ranges:
+            return ()
 
-        for start, end in sorted(ranges):
+        for start, end in sorted_ranges:
             if start > end:
                 raise ValueError(f'invalid range: ({start}, {end})')
 
-            if not merged:
-                merged.append((start, end))
+        return Ioctls.__coalesce(sorted_ranges)
+
+    @staticmethod
+    def __coalesce(
+        sorted_ranges: List[Tuple[int, int]],
+    ) -> Tuple[Tuple[int, int], ...]:
+        merged: List[Tuple[int, int]] = []
+        merged_append = merged.append
+
+        cur_start, cur_end = sorted_ranges[0]
+        for start, end in sorted_ranges:
+            if start <= cur_end + 1:
+                if end > cur_end:
+                    cur_end = end
                 continue
 
-            prev_start, prev_end = merged[-1]
-            if start <= prev_end + 1:
-                merged[-1] = (prev_start, max(prev_end, end))
-            else:
-                merged.append((start, end))
+            merged_append((cur_start, cur_end))
+            cur_start, cur_end = start, end
+
+        merged_append((cur_start, cur_end))
 
         return tuple(merged)
 
+    @classmethod
+    def union(cls, ioctls_list: Iterable[Ioctls]):
+        # Sort the ranges of the whole group once instead of merging pairs
+        # Only unions have a group form, the subset checks and differences
+        # done by format() depend on the ones before them, and stay pairwise
+        ranges: List[Tuple[int, int]] = []
+        for ioctls in ioctls_list:
+            ranges.extend(ioctls.__ranges)
+
+        if not ranges:
+            return cls.__from_normalized(())
+
+        ranges.sort()
+
+        return cls.__from_normalized(cls.__coalesce(ranges))
+
     def merge(self, other: Ioctls):
-        return Ioctls(self.__ranges + other.__ranges)
+        return Ioctls.union((self, other))
+
+    def __or__(self, other: Ioctls):
+        return Ioctls.union((self, other))
+
+    def __and__(self, other: Ioctls):
+        result: List[Tuple[int, int]] = []
+        a = self.__ranges
+        b = other.__ranges
+        i = j = 0
+
+        while i < len(a) and j < len(b):
+            a_start, a_end = a[i]
+            b_start, b_end = b[j]
+
+            start = a_start if a_start > b_start else b_start
+            end = a_end if a_end < b_end else b_end
+            if start <= end:
+                result.append((start, end))
+
+            if a_end < b_end:
+                i += 1
+            else:
+                j += 1
+
+        return Ioctls.__from_normalized(result)
 
     def invert(self, start: int = 0x0000, end: int = 0xFFFF):
         result: List[Tuple[int, int]] = []
@@ -212,10 +385,15 @@ class Ioctls:
         if cur <= end:
             result.append((cur, end))
 
-        return Ioctls(result)
+        return Ioctls.__from_normalized(result)
 
     def __contains__(self, value: int):
-        i = bisect.bisect_right(self.__ranges, value, key=lambda t: t[0]) - 1
+        starts = self.__starts
+        if starts is None:
+            starts = array('I', (start for start, _ in self.__ranges))
+            self.__starts = starts
+
+        i = bisect.bisect_right(starts, value) - 1
         if i >= 0:
             start, end = self.__ranges[i]
             return start <= value <= end
@@ -229,7 +407,7 @@ class Ioctls:
         if self.__hash != other.__hash:
             return False
 
-        return self.__ranges_set == other.__ranges_set
+        return self.__ranges == other.__ranges
 
     def __le__(self, other: Ioctls) -> bool:
         i = j = 0
@@ -280,7 +458,7 @@ class Ioctls:
             if cur <= a_end:
                 result.append((cur, a_end))
 
-        return Ioctls(result)
+        return Ioctls.__from_normalized(result)
 
     def __hash__(self):
         return self.__hash
@@ -0,0 +1,38 @@
+# SPDX-FileCopyrightText: The LineageOS Project
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import annotations
+
+import gc
+from time import perf_counter
+from typing import Callable
+
+
+def time_best(fn: Callable[[], object], repeat: int):
+    # Same as timeit, keep the collector from skewing the timings
+    gc_enabled = gc.isenabled()
+    gc.disable()
+
+    best = float('inf')
+    try:
+        for _ in range(repeat):
+            start = perf_counter()
+            fn()
+            best = min(best, perf_counter() - start)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    return best
+
+
+def print_timings(name: str, baseline: float, current: float):
+    speedup = baseline / current if current else float('inf')
+    print(
+        f'{name}: baseline {baseline * 1000:.1f}ms, '
+        f'current {current * 1000:.1f}ms, {speedup:.2f}x'
+    )
+
+
+def print_timing(name: str, current: float):
+    print(f'{name}: {current * 1000:.1f}ms')
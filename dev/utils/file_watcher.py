@@ -0,0 +1,83 @@
+# SPDX-FileCopyrightText: The LineageOS Project
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import annotations
+
+import os
+import time
+from os import path
+from pathlib import Path
+from typing import Callable, Dict, List, Set, Tuple
+
+# mtime, size
+file_state = Tuple[int, int]
+
+
+def is_path_under(file_path: Path, roots: List[Path]):
+    for root in roots:
+        if file_path == root or root in file_path.parents:
+            return True
+
+    return False
+
+
+class FileWatcher:
+    def __init__(self, get_paths: Callable[[], List[Path]]):
+        # The watched paths are listed again on every poll, to pick up the
+        # inputs created after the start
+        self.__get_paths = get_paths
+        self.__states = self.__scan()
+
+    @staticmethod
+    def __add_state(states: Dict[Path, file_state], file_path: str):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return
+
+        states[Path(file_path)] = (stat.st_mtime_ns, stat.st_size)
+
+    def __scan(self):
+        # Polled instead of using inotify, which has no binding in the
+        # standard library, only the watched inputs are walked
+        states: Dict[Path, file_state] = {}
+
+        for watched_path in self.__get_paths():
+            if watched_path.is_file():
+                self.__add_state(states, str(watched_path))
+                continue
+
+            for dir_path, _, file_names in os.walk(watched_path):
+                for file_name in file_names:
+                    self.__add_state(states, path.join(dir_path, file_name))
+
+        return states
+
+    def poll(self) -> Set[Path]:
+        states = self.__scan()
+        old_states = self.__states
+        self.__states = states
+
+        return {
+            file_path
+            for file_path in states.keys() | old_states.keys()
+            if states.get(file_path) != old_states.get(file_path)
+        }
+
+    def wait(self, interval: float) -> Set[Path]:
+        while True:
+            time.sleep(interval)
+
+            changed = self.poll()
+            if not changed:
+                continue
+
+            # Editors and build steps write multiple files in a row, wait for
+            # them to settle before reporting the changes
+            while True:
+                time.sleep(interval)
+                more_changed = self.poll()
+                if not more_changed:
+                    return changed
+
+                changed |= more_changed
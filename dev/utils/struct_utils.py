@@ -1,6 +1,7 @@
 # SPDX-FileCopyrightText: The LineageOS Project
 # SPDX-License-Identifier: Apache-2.0
 
+import struct
 from ctypes import (
     POINTER,
     Structure,
@@ -10,9 +11,11 @@ from ctypes import (
     pointer,
     sizeof,
 )
-from typing import Tuple, TypeVar
+from functools import partial
+from typing import Any, Callable, Generic, Iterator, Tuple, TypeVar
 
 T = TypeVar('T', bound=Structure)
+V = TypeVar('V', bound=tuple)
 
 
 def read_struct(
@@ -50,3 +53,48 @@ def read_struct(
 def cast_struct(dst_cls: type[T], src: Structure) -> T:
     assert sizeof(dst_cls) == sizeof(src)
     return cast(pointer(src), POINTER(dst_cls)).contents
+
+
+class StructReader(Generic[V]):
+    # Unpacks fields straight from the buffer, without the copy and the
+    # object construction of ctypes structures, hot paths should destructure
+    # the plain tuples of unpack_from() and iter_unpack() instead of building
+    # the named tuples of read()
+    def __init__(self, cls: type[V], fmt: str):
+        s = struct.Struct(fmt)
+        fields: Tuple[str, ...] = getattr(cls, '_fields')
+        assert len(fields) == len(s.unpack(bytes(s.size)))
+
+        self.size = s.size
+        self.unpack_from = s.unpack_from
+        self.__iter_unpack = s.iter_unpack
+        self.__make: Callable[[Tuple[Any, ...]], V] = partial(
+            tuple.__new__,
+            cls,
+        )
+
+    def __check_bounds(self, data: memoryview, offset: int, size: int):
+        new_offset = offset + size
+
+        if new_offset > len(data):
+            raise ValueError(
+                f'Out of bounds: offset={offset:x}, '
+                f'new_offset: {new_offset:x}, '
+                f'size: {size:x}, '
+                f'len: {len(data):x}'
+            )
+
+        return new_offset
+
+    def read(self, data: memoryview, offset: int = 0) -> Tuple[V, int]:
+        new_offset = self.__check_bounds(data, offset, self.size)
+        return self.__make(self.unpack_from(data, offset)), new_offset
+
+    def iter_unpack(
+        self,
+        data: memoryview,
+        offset: int,
+        count: int,
+    ) -> Iterator[Tuple[Any, ...]]:
+        new_offset = self.__check_bounds(data, offset, count * self.size)
+        return self.__iter_unpack(data[offset:new_offset])
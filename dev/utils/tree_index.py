@@ -0,0 +1,190 @@
+# SPDX-FileCopyrightText: The LineageOS Project
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import annotations
+
+import json
+import os
+import re
+from dataclasses import dataclass
+from fnmatch import translate
+from functools import cache
+from os import path
+from pathlib import Path
+from typing import (
+    Dict,
+    FrozenSet,
+    Generator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+TREE_INDEX_VERSION = 1
+
+# Directories that cannot be listed are rescanned on the next revalidation
+UNLISTED_MTIME = -1
+
+dir_path_type = Union[str, Path]
+
+
+@cache
+def compile_name_patterns(patterns: FrozenSet[str]) -> re.Pattern[str]:
+    # Match either the exact name or the glob, same as name == p or
+    # fnmatch(name, p)
+    return re.compile(
+        '|'.join(f'{re.escape(p)}\\Z|{translate(p)}' for p in sorted(patterns))
+    )
+
+
+@dataclass
+class IndexedDir:
+    mtime_ns: int
+    file_names: List[str]
+    dir_names: List[str]
+
+
+class TreeIndex:
+    def __init__(self):
+        self.__dirs: Dict[str, IndexedDir] = {}
+
+    @staticmethod
+    def __scan_dir(dir_path: str):
+        file_names: List[str] = []
+        dir_names: List[str] = []
+
+        try:
+            # Stat first, changes done while listing are caught by the next
+            # revalidation
+            mtime_ns = os.stat(dir_path).st_mtime_ns
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    # Same as os.walk(), symlinks to directories are not
+                    # followed, and are not files either
+                    if entry.is_dir(follow_symlinks=False):
+                        dir_names.append(entry.name)
+                    elif entry.is_file():
+                        file_names.append(entry.name)
+        except OSError:
+            return IndexedDir(UNLISTED_MTIME, [], [])
+
+        return IndexedDir(mtime_ns, file_names, dir_names)
+
+    def __get_dir(self, dir_path: str):
+        indexed_dir = self.__dirs.get(dir_path)
+        if indexed_dir is None:
+            indexed_dir = self.__scan_dir(dir_path)
+            self.__dirs[dir_path] = indexed_dir
+
+        return indexed_dir
+
+    def walk(
+        self,
+        root: dir_path_type,
+        recursive: bool = True,
+        skipped_directory_names: Optional[Set[str]] = None,
+    ) -> Generator[Tuple[str, List[str]], None, None]:
+        # Same top-down order as os.walk()
+        stack = [str(root)]
+
+        while stack:
+            dir_path = stack.pop()
+            indexed_dir = self.__get_dir(dir_path)
+
+            yield dir_path, indexed_dir.file_names
+
+            if not recursive:
+                continue
+
+            for dir_name in reversed(indexed_dir.dir_names):
+                if (
+                    skipped_directory_names is not None
+                    and dir_name in skipped_directory_names
+                ):
+                    continue
+
+                stack.append(path.join(dir_path, dir_name))
+
+    def files(
+        self,
+        root: dir_path_type,
+        patterns: Optional[FrozenSet[str]] = None,
+        recursive: bool = True,
+        skipped_directory_names: Optional[Set[str]] = None,
+    ) -> Generator[str, None, None]:
+        pattern = None
+        if patterns is not None:
+            pattern = compile_name_patterns(patterns)
+
+        for dir_path, file_names in self.walk(
+            root,
+            recursive=recursive,
+            skipped_directory_names=skipped_directory_names,
+        ):
+            for file_name in file_names:
+                if pattern is not None and pattern.match(file_name) is None:
+                    continue
+
+                yield path.join(dir_path, file_name)
+
+    def revalidate(self):
+        # The mtime of a directory only changes when its own entries change,
+        # only rescan those, new subdirectories are scanned when walked
+        for dir_path, indexed_dir in list(self.__dirs.items()):
+            try:
+                mtime_ns = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                del self.__dirs[dir_path]
+                continue
+
+            if mtime_ns != indexed_dir.mtime_ns:
+                self.__dirs[dir_path] = self.__scan_dir(dir_path)
+
+    def clear(self):
+        self.__dirs.clear()
+
+    def load(self, index_path: Path):
+        try:
+            data = json.loads(index_path.read_text())
+        except (OSError, ValueError):
+            return False
+
+        # A malformed index is the same as a missing one, the trees are
+        # listed again
+        try:
+            if data.get('version') != TREE_INDEX_VERSION:
+                return False
+
+            dirs: Dict[str, Tuple[int, List[str], List[str]]] = data['dirs']
+            loaded_dirs = {
+                dir_path: IndexedDir(mtime_ns, file_names, dir_names)
+                for dir_path, (mtime_ns, file_names, dir_names) in dirs.items()
+            }
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return False
+
+        self.__dirs = loaded_dirs
+        self.revalidate()
+
+        return True
+
+    def save(self, index_path: Path):
+        data = {
+            'version': TREE_INDEX_VERSION,
+            'dirs': {
+                dir_path: [
+                    indexed_dir.mtime_ns,
+                    indexed_dir.file_names,
+                    indexed_dir.dir_names,
+                ]
+                for dir_path, indexed_dir in self.__dirs.items()
+            },
+        }
+        index_path.write_text(json.dumps(data))
+
+
+# Shared by the sepolicy providers, which query the same source trees many
+# times per process, other callers walk the trees again on every call
+tree_index = TreeIndex()
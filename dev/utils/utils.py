@@ -5,13 +5,16 @@ from __future__ import annotations
 
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import contextmanager
 from enum import StrEnum
-from fnmatch import fnmatch
+from itertools import repeat
 from os import path
 from pathlib import Path
 from subprocess import PIPE, run
-from typing import Generator, List, Optional, Set
+from typing import Callable, Generator, List, Optional, Set, TypeVar
+
+from utils.tree_index import TreeIndex, compile_name_patterns
 
 script_dir = path.dirname(path.realpath(__file__))
 android_root = path.realpath(path.join(script_dir, '..', '..', '..', '..'))
@@ -21,26 +24,30 @@ def get_files_with_name(
     dir_path: str,
     name: str,
     skipped_directory_names: Optional[Set[str]] = None,
+    index: Optional[TreeIndex] = None,
 ):
-    for subdir_path, dir_names, file_names in os.walk(dir_path):
-        if skipped_directory_names is not None:
-            dir_names[:] = list(
-                filter(lambda n: n not in skipped_directory_names, dir_names)
-            )
-
+    # Without a shared index the tree is listed again on every call, so
+    # that callers editing it see their changes
+    if index is None:
+        index = TreeIndex()
+
+    for subdir_path, file_names in index.walk(
+        dir_path,
+        skipped_directory_names=skipped_directory_names,
+    ):
         for file_name in file_names:
             if file_name != name:
                 continue
 
-            android_bp_path = path.join(subdir_path, file_name)
-            if not path.isfile(android_bp_path):
-                continue
+            yield path.join(subdir_path, file_name)
 
-            yield android_bp_path
 
-
-def get_dirs_with_file(dir_path: str, name: str):
-    for file_path in get_files_with_name(dir_path, name):
+def get_dirs_with_file(
+    dir_path: str,
+    name: str,
+    index: Optional[TreeIndex] = None,
+):
+    for file_path in get_files_with_name(dir_path, name, index=index):
         yield path.dirname(file_path)
 
 
@@ -109,6 +116,42 @@ def split_normalize_text(text: str):
 
     return out
 
+
+T = TypeVar('T')
+A = TypeVar('A')
+R = TypeVar('R')
+
+
+def process_map_chunks(
+    fn: Callable[[List[T], A], List[R]],
+    items: List[T],
+    arg: A,
+    min_items: int,
+    jobs: Optional[int] = None,
+) -> List[R]:
+    # Split items into ordered chunks and process them in worker processes,
+    # fn must be a module-level function and its arguments and results must
+    # be picklable
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    if jobs <= 1 or len(items) < min_items:
+        return fn(items, arg)
+
+    # More chunks than workers to even out the load
+    chunk_size = -(-len(items) // (jobs * 4))
+    chunks = [
+        items[i : i + chunk_size] for i in range(0, len(items), chunk_size)
+    ]
+
+    results: List[R] = []
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for chunk_results in executor.map(fn, chunks, repeat(arg)):
+            results.extend(chunk_results)
+
+    return results
+
+
 @contextmanager
 def WorkingDirectory(dir_path: str) -> Generator[None, None, None]:
     cwd = os.getcwd()
@@ -127,19 +170,15 @@ def resolve_paths(
     recursive: bool,
     paths_name: str,
     verbose: bool,
+    index: Optional[TreeIndex] = None,
 ):
     resolved_paths: List[Path] = []
+    patterns = frozenset(names)
 
-    def add_path(mp: Path):
-        if not mp.is_file():
-            return
-
-        for name in names:
-            if mp.name == name or fnmatch(mp.name, name):
-                break
-        else:
-            return
+    if index is None:
+        index = TreeIndex()
 
+    def add_path(mp: Path):
         if verbose:
             print(f'Loading {paths_name}: {mp}')
 
@@ -147,18 +186,17 @@ def resolve_paths(
 
     for dir_path in dir_paths:
         if dir_path.is_file():
-            add_path(dir_path)
+            if compile_name_patterns(patterns).match(dir_path.name):
+                add_path(dir_path)
             continue
 
         assert dir_path.is_dir(), f'{dir_path} is not a file or directory'
 
-        if recursive:
-            for root, _, files in dir_path.walk():
-                for file in files:
-                    file_path = root / file
-                    add_path(file_path)
-        else:
-            for file_path in dir_path.iterdir():
-                add_path(file_path)
+        for file_path in index.files(
+            dir_path,
+            patterns=patterns,
+            recursive=recursive,
+        ):
+            add_path(Path(file_path))
 
     return resolved_paths